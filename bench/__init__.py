@@ -0,0 +1,3 @@
+# bench/__init__.py
+# Offline benchmark suite: recorded dealer pages, a local replay server,
+# a fake OpenAI endpoint and synthetic images. See bench/run_bench.py.
@@ -0,0 +1,331 @@
+# bench/corpus.py
+"""
+The page corpus the replay server serves.
+
+Layout (default bench/corpus/, not committed):
+    index.json            {"pages": {key: {"file", "content_type"}}, "dealers": {name: {"listings": [...]}},
+                           "collectors": {collector_id: [dataset records]}}
+    pages/<sha1>.html     recorded page bodies
+    images/img_<n>.jpg    synthetic listing photos, served for any image URL not in "pages"
+
+A key is the URL without scheme, with the query sorted, so
+`inventory.aspx?subtype=Sleeper&new=` and `inventory.aspx?new=&subtype=Sleeper`
+resolve to the same page.
+
+Two ways to fill it:
+    python -m bench.corpus --listings 20          # deterministic synthetic pages (default)
+    python -m bench.record --dealers jasper -n 20 # real pages from the live sites
+
+Synthetic pages carry the same selectors the scrapers look for
+(jasper a.page-next / div#photos, five_star elementor gallery, ftlgr
+div.vehicle-detail / img.mainimage, shanes div#listContainer / div.detail-wrapper,
+fyda div#main > div#content > div#template), padded to a realistic page weight.
+"""
+
+import os
+import io
+import json
+import random
+import shutil
+import hashlib
+import argparse
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+JASPER_INVENTORY = "https://www.jaspertrucks.com/inventory.aspx"
+JASPER_SUBTYPES = ("Non-Sleeper", "Sleeper")
+FIVE_STAR_INVENTORY = "https://www.5startrucksales.us/semi-trucks/"
+SHANES_INVENTORY = "https://www.shanesequipment.com/inventory/?/listings/search?ScopeCategoryIDs=27&Category=16013%7C16045&AccountCRMID=8589249&dlr=1&settingscrmid=5114963&lo=2"
+SHANES_COLLECTOR = "c_mcuwb7kgy0gbasps8"
+
+MAKES = {
+    "Freightliner": ["Cascadia", "Columbia", "M2 106"],
+    "Kenworth": ["T680", "W900", "T880"],
+    "Peterbilt": ["579", "389", "567"],
+    "Volvo": ["VNL 760", "VNL 860", "VNR 640"],
+    "International": ["LT625", "HX520", "RH613"],
+    "Mack": ["Anthem", "Pinnacle", "Granite"],
+}
+ENGINES = [("Detroit", "DD15", 505), ("Cummins", "X15", 565), ("PACCAR", "MX-13", 510), ("Volvo", "D13", 455)]
+TRANSMISSIONS = [("Eaton Fuller", "FO-16E318B-MXP", "Automatic", 10), ("Detroit", "DT12", "Automated Manual", 12),
+                 ("Eaton Fuller", "RTLO-18918B", "Manual", 18)]
+LOCATIONS = [("Jasper", "AL"), ("Louisville", "KY"), ("Dallas", "TX"), ("Columbus", "OH"), ("Fort Worth", "TX")]
+
+
+def page_key(url):
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    key = f"{parts.netloc.lower()}{parts.path or '/'}"
+    return f"{key}?{query}" if query else key
+
+
+class Corpus:
+
+    def __init__(self, root=DEFAULT_ROOT, fresh=False):
+        self.root = root
+        self.index = {"pages": {}, "dealers": {}}
+        path = os.path.join(root, "index.json")
+        if fresh:
+            shutil.rmtree(root, ignore_errors=True)
+        elif os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        self._images = None
+
+    def exists(self):
+        return bool(self.index["pages"])
+
+    def add_page(self, url, body, content_type="text/html; charset=utf-8"):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        key = page_key(url)
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + ".html"
+        os.makedirs(os.path.join(self.root, "pages"), exist_ok=True)
+        with open(os.path.join(self.root, "pages", name), "wb") as f:
+            f.write(body)
+        self.index["pages"][key] = {"file": name, "content_type": content_type}
+
+    def page(self, url):
+        """(body bytes, content type) for a recorded URL, or (None, None)."""
+        entry = self.index["pages"].get(page_key(url))
+        if not entry:
+            return None, None
+        with open(os.path.join(self.root, "pages", entry["file"]), "rb") as f:
+            return f.read(), entry["content_type"]
+
+    def set_listings(self, dealer, urls):
+        self.index["dealers"].setdefault(dealer, {})["listings"] = list(urls)
+
+    def listings(self, dealer):
+        return list(self.index["dealers"].get(dealer, {}).get("listings", []))
+
+    def set_collector(self, collector_id, records):
+        self.index.setdefault("collectors", {})[collector_id] = list(records)
+
+    def collector(self, collector_id):
+        """Dataset records of a Bright Data collector job, or None if not recorded."""
+        return self.index.get("collectors", {}).get(collector_id)
+
+    def image(self, url):
+        """Synthetic photo bytes for an image URL (same URL -> same image)."""
+        if self._images is None:
+            folder = os.path.join(self.root, "images")
+            self._images = sorted(os.path.join(folder, f) for f in os.listdir(folder)) if os.path.isdir(folder) else []
+        if not self._images:
+            return None
+        pick = int(hashlib.md5(url.encode("utf-8")).hexdigest(), 16) % len(self._images)
+        with open(self._images[pick], "rb") as f:
+            return f.read()
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(self.index, f, indent=1)
+
+
+# ---------------------------------------------------------------------------
+# Synthetic corpus
+# ---------------------------------------------------------------------------
+
+def make_images(folder, count=12, size=(1600, 1200), seed=7):
+    """Noisy gradient JPEGs, so file sizes and decode/encode costs look like real photos."""
+    from PIL import Image
+
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    for n in range(count):
+        base = Image.linear_gradient("L").resize(size).convert("RGB")
+        tint = Image.new("RGB", size, (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+        noise = Image.effect_noise(size, 48).convert("RGB")
+        img = Image.blend(Image.blend(base, tint, 0.5), noise, 0.25)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=85)
+        with open(os.path.join(folder, f"img_{n:02d}.jpg"), "wb") as f:
+            f.write(buf.getvalue())
+
+
+def fake_truck(rng, dealer, n):
+    make = rng.choice(sorted(MAKES))
+    engine = rng.choice(ENGINES)
+    trans = rng.choice(TRANSMISSIONS)
+    city, state = rng.choice(LOCATIONS)
+    miles = rng.randint(150_000, 900_000)
+    return {
+        "Stock Number": f"{dealer[:2].upper()}{10000 + n}",
+        "Year": str(rng.randint(2014, 2024)),
+        "Make": make,
+        "Model": rng.choice(MAKES[make]),
+        "VIN": "".join(rng.choice("ABCDEFGHJKLMNPRSTUVWXYZ0123456789") for _ in range(17)),
+        "Mileage": f"{miles:,}",
+        "ECM Mileage": f"{miles - rng.randint(0, 5000):,}",
+        "Price": f"${rng.randint(35, 160) * 1000:,}",
+        "Engine Make": engine[0],
+        "Engine Model": engine[1],
+        "Horsepower": f"{engine[2]} HP",
+        "Transmission": f"{trans[0]} {trans[1]}",
+        "Transmission Type": trans[2],
+        "Speeds": str(trans[3]),
+        "Axle Configuration": rng.choice(["Tandem", "Single"]),
+        "Truck Type": rng.choice(["Sleeper", "Non-Sleeper"]),
+        "Rear Axle Ratio": rng.choice(["2.28", "2.47", "3.36", "3.55"]),
+        "Wheelbase": f"{rng.randint(180, 250)} in",
+        "Front Axle Capacity": f"{rng.choice([12000, 13200, 14600])} lbs",
+        "Rear Axle Capacity": f"{rng.choice([40000, 46000])} lbs",
+        "Suspension": "Air Ride",
+        "Brakes": "Air",
+        "Location": f"{city}, {state}",
+    }
+
+
+def spec_table(truck):
+    rows = "".join(f"<tr><th>{k}:</th><td>{v}</td></tr>" for k, v in truck.items())
+    return f'<table class="specs">{rows}</table>'
+
+
+def page_shell(title, body, page_kb, rng):
+    """Wrap `body` in a site chrome (nav, footer, scripts) padded to about page_kb kilobytes."""
+    nav = "".join(f'<li><a href="/page-{i}">Menu item {i}</a></li>' for i in range(40))
+    head = f"<!DOCTYPE html><html><head><title>{title}</title><style>.x{{color:#333}}</style></head><body>"
+    head += f"<header><nav><ul>{nav}</ul></nav></header>"
+    tail = "<footer><p>Contact Us</p><p>1 Truck Way, Jasper, AL 35501</p></footer>"
+    filler_len = max(0, page_kb * 1024 - len(head) - len(body) - len(tail) - 64)
+    words = "lorem ipsum dolor sit amet truck trailer sleeper daycab axle engine".split()
+    filler = " ".join(rng.choice(words) for _ in range(filler_len // 6))
+    script = f"<script>var analytics = '{filler}';</script>"
+    return head + body + tail + script + "</body></html>"
+
+
+def _description(truck):
+    return " ".join(f"{k}: {v}." for k, v in truck.items())
+
+
+def build_jasper(corpus, count, page_kb, images, rng, per_page=12):
+    listings = []
+    ids = list(range(5000, 5000 + count))
+    split = {sub: ids[i::2] for i, sub in enumerate(JASPER_SUBTYPES)}
+    for subtype, sub_ids in split.items():
+        pages = [sub_ids[i:i + per_page] for i in range(0, len(sub_ids), per_page)] or [[]]
+        for page_num, chunk in enumerate(pages, start=1):
+            params = {"new": "", "subtype": subtype, "make": "", "model": "", "enginemake": "",
+                      "enginemodel": "", "lyear": "", "hyear": ""}
+            if page_num > 1:
+                params["Page"] = page_num
+            links = "".join(f'<a href="/inventory/SpecSheet_res/default.aspx?ID={i}">Unit {i}</a>' for i in chunk)
+            nxt = f'<a class="page-next" href="?Page={page_num + 1}">Next</a>' if page_num < len(pages) else ""
+            corpus.add_page(f"{JASPER_INVENTORY}?{urlencode(params)}", page_shell("Inventory", f"<div>{links}{nxt}</div>", page_kb, rng))
+    for n, vid in enumerate(ids):
+        truck = fake_truck(rng, "jasper", n)
+        url = f"https://www.jaspertrucks.com/inventory/SpecSheet_res/default.aspx?ID={vid}"
+        photos = "".join(f'<img src="/images/inventory/xl_{vid}_{k}.jpg">' for k in range(images))
+        text = truck.copy()
+        text["UNIT#"] = text.pop("Stock Number")
+        text["Serial No"] = text.pop("VIN")
+        corpus.add_page(url, page_shell(f"Unit {vid}", f'<div id="photos">{photos}</div>{spec_table(text)}', page_kb, rng))
+        corpus.add_page(f"https://www.jaspertrucks.com/inventory/SpecSheet_res/print.aspx?ID={vid}",
+                        page_shell(f"Print {vid}", spec_table(text) + f"<p>{_description(truck)}</p>", page_kb // 2, rng))
+        listings.append(url)
+    corpus.set_listings("jasper", listings)
+
+
+def build_five_star(corpus, count, page_kb, images, rng):
+    listings = []
+    for n in range(count):
+        truck = fake_truck(rng, "five_star", n)
+        slug = f"{truck['Year']}-{truck['Make']}-{truck['Model']}-{n}".lower().replace(" ", "-")
+        url = f"https://www.5startrucksales.us/trucks/{slug}/"
+        gallery = "".join(
+            f'<a class="e-gallery-item elementor-gallery-item" href="/wp-content/uploads/2025/01/{slug}-{k}.jpg"></a>'
+            for k in range(images))
+        body = f"<h1>{truck['Year']} {truck['Make']} {truck['Model']}</h1>{spec_table(truck)}{gallery}<h2>You may also like</h2>"
+        corpus.add_page(url, page_shell(slug, body, page_kb, rng))
+        listings.append(url)
+    links = "".join(f'<a href="{u}">truck</a>' for u in listings)
+    corpus.add_page(FIVE_STAR_INVENTORY, page_shell("Semi Trucks", f"<div>{links}</div>", page_kb, rng))
+    corpus.set_listings("five_star", listings)
+
+
+def build_ftlgr(corpus, count, page_kb, images, rng):
+    listings = []
+    for n in range(count):
+        vid = 70000 + n
+        truck = fake_truck(rng, "ftlgr", n)
+        url = f"https://www.ftlgr.com/trucks/?vid={vid}"
+        carousel = "".join(
+            f'<div class="carousel-item"><img class="thumb" src="/images/trucks/TH_{vid}_{k}.jpg"></div>'
+            for k in range(1, images))
+        body = (f'<img class="mainimage" src="/images/trucks/{vid}_0.jpg">{carousel}'
+                f'<div class="vehicle-detail">{spec_table(truck)}<p>{_description(truck)}</p></div>')
+        corpus.add_page(url, page_shell(f"Truck {vid}", body, page_kb, rng))
+        listings.append(url)
+    # Discovery is Selenium-driven (paginated clicks); the listing set is replayed from here
+    corpus.set_listings("ftlgr", listings)
+
+
+def build_shanes(corpus, count, page_kb, images, rng):
+    listings, records = [], []
+    for n in range(count):
+        truck = fake_truck(rng, "shanes", n)
+        path = f"/inventory/listing/{230000 + n}"
+        url = f"https://www.shanesequipment.com{path}"
+        body = f'<div class="detail-wrapper"><h1>{truck["Year"]} {truck["Make"]}</h1>{spec_table(truck)}</div>'
+        corpus.add_page(url, page_shell("Listing", body, page_kb, rng))
+        listings.append(url)
+        records.append({"url": url, "stock_number": truck["Stock Number"], "price": truck["Price"],
+                        "title": f'{truck["Year"]} {truck["Make"]} {truck["Model"]}', "mileage": truck["Mileage"]})
+    links = "".join(f'<a href="{u.replace("https://www.shanesequipment.com", "")}">listing</a>' for u in listings)
+    corpus.add_page(SHANES_INVENTORY, page_shell("Search", f'<div id="listContainer">{links}</div>', page_kb, rng))
+    corpus.set_listings("shanes_equipment", listings)
+    corpus.set_collector(SHANES_COLLECTOR, records)
+
+
+def build_fyda(corpus, count, page_kb, images, rng):
+    listings = []
+    for n in range(count):
+        truck = fake_truck(rng, "fyda", n)
+        url = f"https://www.fydafreightliner.com/{truck['Year']}-{truck['Make']}--xInventoryDetail?id={880000 + n}".replace(" ", "-")
+        body = f'<div id="main"><div id="content"><div id="template">{spec_table(truck)}</div></div></div>'
+        corpus.add_page(url, page_shell("Detail", body, page_kb, rng))
+        listings.append(url)
+    # Discovery and detail pages are Selenium-driven; replayed from here
+    corpus.set_listings("fyda", listings)
+
+
+BUILDERS = {
+    "jasper": build_jasper,
+    "five_star": build_five_star,
+    "ftlgr": build_ftlgr,
+    "fyda": build_fyda,
+    "shanes_equipment": build_shanes,
+}
+
+
+def build_synthetic(root=DEFAULT_ROOT, listings=10, images=6, page_kb=80, image_size=(1600, 1200), seed=42):
+    corpus = Corpus(root, fresh=True)
+    rng = random.Random(seed)
+    for name, build in BUILDERS.items():
+        build(corpus, listings, page_kb, images, rng)
+    make_images(os.path.join(root, "images"), size=image_size, seed=seed)
+    corpus.index["synthetic"] = {"listings": listings, "images": images, "page_kb": page_kb,
+                                 "image_size": list(image_size), "seed": seed}
+    corpus.save()
+    print(f"[bench] Synthetic corpus: {len(corpus.index['pages'])} pages, {listings} listings/dealer -> {root}")
+    return Corpus(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the synthetic benchmark corpus.")
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    parser.add_argument("--listings", "-n", type=int, default=10, help="Listings per dealer")
+    parser.add_argument("--images", type=int, default=6, help="Photos per listing")
+    parser.add_argument("--page-kb", type=int, default=80, help="Approximate size of each HTML page")
+    parser.add_argument("--image-size", default="1600x1200")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    w, h = (int(v) for v in args.image_size.lower().split("x"))
+    build_synthetic(args.root, args.listings, args.images, args.page_kb, (w, h), args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# bench/fake_openai.py
+"""
+Deterministic stand-in for /v1/chat/completions.
+
+The answer is a JSON object built from the prompt, so the scrapers' parsing,
+normalization and diagram code run on realistic input:
+  - diagram prompts list `field name: "..."` entries -> those fields are answered
+  - anything else is treated as vehicle extraction -> core.output_fields.vehicle_attributes,
+    with values read from "Label: value" pairs in the page text when present
+  - a packed prompt (core/openai_pack.py: listings under "### id: <n>" lines) gets
+    {"items": [...]} with one such answer per listing
+Same messages in -> same content, latency and token counts out.
+"""
+
+import re
+import json
+import time
+import random
+import hashlib
+
+from core.output_fields import vehicle_attributes
+
+# vehicle field -> labels used on the synthetic (and most real) spec sheets
+TEXT_LABELS = {
+    "Stock Number": ["Stock Number", "UNIT#"],
+    "VehicleVIN": ["VIN", "Serial No"],
+    "Vehicle Year": ["Year"],
+    "OS - Vehicle Year": ["Year"],
+    "OS - Vehicle Make": ["Make"],
+    "Vehicle model - new": ["Model"],
+    "Odometer Miles": ["Mileage"],
+    "ECM Miles": ["ECM Mileage"],
+    "Vehicle Price": ["Price"],
+    "OS - Engine Make": ["Engine Make"],
+    "Engine Model": ["Engine Model"],
+    "Engine Horsepower": ["Horsepower"],
+    "Transmission Model": ["Transmission"],
+    "OS - Transmission Type": ["Transmission Type"],
+    "OS - Transmission Speeds": ["Speeds"],
+    "Rear Axle Ratio": ["Rear Axle Ratio"],
+    "Wheelbase": ["Wheelbase"],
+    "Front Axle Capacity": ["Front Axle Capacity"],
+    "Rear Axle Capacity": ["Rear Axle Capacity"],
+    "Location": ["Location"],
+}
+FIXED_VALUES = {
+    "OS - Vehicle Type": "Semi-tractor truck",
+    "OS - Vehicle Class": "Class 8",
+    "OS - Vehicle Condition": "Pre-Owned",
+    "OS - Fuel Type": "Diesel",
+    "OS - Brake System Type": "Air",
+    "OS - Front Suspension Type": "Air Ride",
+    "OS - Rear Suspension Type": "Air Ride",
+    "OS - Number of Front Axles": "1",
+}
+DIAGRAM_DEFAULTS = {
+    "Brake Type": "Air", "Dual Tires": "Yes", "Lift Axle": "No", "Power Axle": "Yes",
+    "Steer Axle": "No", "Tire Size": "295/75R22.5", "Wheel Material": "Aluminum",
+}
+FIELD_NAME_RE = re.compile(r'field name:\s*"([^"]+)"')
+PACKED_ITEM_RE = re.compile(r'^### id: (\S+)\n', re.MULTILINE)
+
+
+def _lookup(text, labels):
+    for label in labels:
+        m = re.search(re.escape(label) + r":?\s+([^:]+?)(?=\s+[A-Z][A-Za-z#. ]{1,24}:|\.?\s*$|\.\s)", text)
+        if m:
+            return m.group(1).strip().rstrip(".")
+    return ""
+
+
+def _vehicle_answer(text):
+    answer = {}
+    for field in vehicle_attributes:
+        if field in ("Original info description", "original_image_url"):
+            continue
+        answer[field] = FIXED_VALUES.get(field) or _lookup(text, TEXT_LABELS.get(field, []))
+    state = answer.get("Location", "").rsplit(",", 1)[-1].strip()
+    answer["U.S. State"] = answer["U.S. State (text)"] = state
+    answer["OS - Sleeper or Day Cab"] = "Day Cab" if "Non-Sleeper" in text else "Sleeper Cab"
+    answer["OS - Axle Configuration"] = "4 x 2" if "Axle Configuration: Single" in text else "6 x 4"
+    return answer
+
+
+def _diagram_answer(fields):
+    answer = {}
+    for field in fields:
+        position, _, kind = field.partition(" ")
+        answer[field] = DIAGRAM_DEFAULTS.get(kind, "")
+        if position.startswith("F") and kind == "Steer Axle":
+            answer[field] = "Yes"
+    return answer
+
+
+def answer(request):
+    """Answer content for a chat request, with no latency: usable as an in-process stub backend
+    (LLM_BACKEND=stub LLM_BACKEND_STUB_HANDLER=bench.fake_openai:answer)."""
+    messages = request.get("messages", [])
+    system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    user = " ".join(m.get("content", "") for m in messages if m.get("role") != "system")
+    fields = FIELD_NAME_RE.findall(system)
+    parts = PACKED_ITEM_RE.split(user)
+    if len(parts) > 1:
+        # ['', id, text, id, text, ...]
+        content = {"items": [dict(id=i, **(_diagram_answer(fields) if fields else _vehicle_answer(text)))
+                             for i, text in zip(parts[1::2], parts[2::2])]}
+    else:
+        content = _diagram_answer(fields) if fields else _vehicle_answer(user)
+    return json.dumps(content)
+
+
+class FakeOpenAI:
+    """
+    `latency_ms` +- `jitter_ms` (deterministic per prompt) before each answer.
+    A random `tail_pct` % of calls (not of prompts, so a retried prompt is usually
+    fast again) take `tail_ms` more, like the occasional stuck OpenAI request.
+    Batch lines (wait=False) are answered straight away and counted in `batched` too.
+    """
+
+    def __init__(self, latency_ms=300, jitter_ms=100, model="gpt-3.5-turbo", tail_pct=0.0, tail_ms=0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.model = model
+        self.tail_pct = tail_pct
+        self.tail_ms = tail_ms
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.batched = 0
+        self.slow = 0
+
+    def complete(self, request, wait=True):
+        messages = request.get("messages", [])
+        system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        user = " ".join(m.get("content", "") for m in messages if m.get("role") != "system")
+        digest = hashlib.sha1((system + user).encode("utf-8")).hexdigest()
+
+        content = answer(request)
+
+        jitter = (int(digest[:8], 16) % (2 * self.jitter_ms + 1)) - self.jitter_ms if self.jitter_ms else 0
+        if wait:
+            delay = max(0, self.latency_ms + jitter)
+            if self.tail_pct and self.random.random() * 100 < self.tail_pct:
+                delay += self.tail_ms
+                self.slow += 1
+            time.sleep(delay / 1000.0)
+        else:
+            self.batched += 1
+        self.calls += 1
+
+        prompt_tokens = (len(system) + len(user)) // 4
+        return {
+            "id": f"chatcmpl-bench-{digest[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", self.model),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                      "total_tokens": prompt_tokens + len(content) // 4},
+        }
@@ -0,0 +1,124 @@
+# bench/record.py
+"""
+Record real dealer pages into the benchmark corpus.
+
+Runs each scraper's own discovery, page fetch and image-URL extraction against
+the live sites (with the normal proxy/Bright Data env), and stores every HTML /
+JSON response under its URL. Web Unlocker calls are stored under the page URL
+they asked for, so the replay server can answer them the same way; a
+collector job's dataset is stored under its collector id. Photos are
+not recorded; the replay server serves the synthetic ones.
+
+    python -m bench.record --dealers jasper,five_star -n 20
+    python -m bench.record --dealers ftlgr,fyda -n 10 --browser   # needs Chrome
+
+ftlgr discovery and everything fyda does go through Selenium, so those dealers
+are only recorded with --browser.
+"""
+
+import os
+import sys
+import json
+import argparse
+from urllib.parse import urlsplit, parse_qs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests.adapters
+
+from bench.corpus import Corpus, DEFAULT_ROOT
+
+BROWSER_DEALERS = ("ftlgr", "fyda")
+RECORD_TYPES = ("text/html", "application/json", "text/plain")
+
+
+def install_recorder(corpus):
+    original_send = requests.adapters.HTTPAdapter.send
+    jobs = {}  # collector job id -> collector id
+
+    def send(self, request, **kwargs):
+        resp = original_send(self, request, **kwargs)
+        content_type = resp.headers.get("Content-Type", "")
+        if resp.status_code != 200 or not content_type.startswith(RECORD_TYPES):
+            return resp
+        parts = urlsplit(request.url)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        if parts.path.startswith("/dca/trigger"):
+            jobs[resp.json().get("collection_id")] = query.get("collector")
+        elif parts.path.startswith("/dca/dataset"):
+            data = resp.json()
+            if isinstance(data, list) and jobs.get(query.get("id")):
+                corpus.set_collector(jobs[query["id"]], data)
+        elif "/unlocker/" in parts.path and request.body:
+            body = request.body.decode("utf-8") if isinstance(request.body, bytes) else request.body
+            page_url = json.loads(body).get("url")
+            html = resp.json().get("response", {}).get("body", "")
+            if page_url and html:
+                corpus.add_page(page_url, html)
+        else:
+            corpus.add_page(request.url, resp.content, content_type)
+        return resp
+
+    requests.adapters.HTTPAdapter.send = send
+
+
+def record_browser_page(module, url, corpus):
+    driver = module.get_driver()
+    try:
+        driver.get(url)
+        corpus.add_page(url, driver.page_source)
+    finally:
+        driver.quit()
+
+
+def record_dealer(name, limit, corpus, browser=False):
+    from scrapers import registry
+    from core.image_utils import extract_image_urls_from_page
+
+    spec = registry.get_spec(name)
+    if name in BROWSER_DEALERS and not browser:
+        print(f"[record] {name}: needs Selenium, skipped (use --browser)")
+        return
+    module = registry.load(name)
+    urls = getattr(module, spec["listings"])()[:limit]
+    corpus.set_listings(name, urls)
+    print(f"[record] {name}: {len(urls)} listings")
+    for url in urls:
+        if spec["fetch"] == "browser":
+            record_browser_page(module, url, corpus)
+        else:
+            module.get_vehicle_page_html(url)
+        if spec["images"] and spec["fetch"] != "browser":
+            try:
+                extract_image_urls_from_page(url, dealer=name)
+            except Exception as e:
+                print(f"[record] {name}: image page failed for {url}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record live dealer pages into the benchmark corpus.")
+    parser.add_argument("--dealers", "-d", default="jasper,five_star,shanes_equipment")
+    parser.add_argument("--limit", "-n", type=int, default=10, help="Listings per dealer")
+    parser.add_argument("--corpus", default=DEFAULT_ROOT)
+    parser.add_argument("--fresh", action="store_true", help="Start a new corpus instead of adding to it")
+    parser.add_argument("--browser", action="store_true", help="Also record the Selenium dealers (ftlgr, fyda)")
+    args = parser.parse_args()
+
+    from pipeline.orchestrator import parse_dealers
+
+    corpus = Corpus(args.corpus, fresh=args.fresh)
+    corpus.index.pop("synthetic", None)
+    install_recorder(corpus)
+    os.makedirs("results", exist_ok=True)  # some scrapers drop debug HTML there
+    for name in parse_dealers(args.dealers):
+        try:
+            record_dealer(name, args.limit, corpus, browser=args.browser)
+        except Exception as e:
+            print(f"[record] {name} failed: {e}")
+        corpus.save()
+    print(f"[record] Corpus now has {len(corpus.index['pages'])} pages -> {args.corpus}")
+
+
+if __name__ == "__main__":
+    main()
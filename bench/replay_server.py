@@ -0,0 +1,245 @@
+# bench/replay_server.py
+"""
+Local HTTP server that replays the corpus and answers as OpenAI.
+
+    GET  /<host>/<path>?<query>           -> recorded page (or a synthetic photo for image URLs),
+                                             with an ETag; a matching If-None-Match gets a 304
+    POST /api.brightdata.com/unlocker/... -> {"response": {"body": <recorded page of payload["url"]>}}
+    POST /api.brightdata.com/dca/trigger?collector=<id>  -> {"collection_id": "<id>-<n>"}
+    GET  /api.brightdata.com/dca/dataset?id=<job>        -> 202 on the first poll, then the
+                                                            collector's recorded dataset
+    POST /v1/chat/completions             -> bench.fake_openai
+    POST /v1/files                        -> {"id": "file-<n>"} (multipart upload of a batch input file)
+    POST /v1/batches                      -> {"id": "batch_<n>", "status": "validating"}
+    GET  /v1/batches/<id>                 -> "in_progress" on the first poll, then "completed" with an
+                                             output_file_id; every line answered by bench.fake_openai
+    GET  /v1/files/<id>/content           -> the uploaded or output JSONL
+
+install_requests_redirect() makes every `requests` call in the process (the
+scrapers, core.image_utils) go to this server instead of the real host, with
+proxies dropped, so the scraper code runs unmodified.
+
+Standalone:
+    python -m bench.replay_server --port 8765 --llm-latency-ms 300
+"""
+
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from email.parser import BytesParser
+from email import policy
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests.adapters
+
+from bench.corpus import Corpus, DEFAULT_ROOT, IMAGE_EXTENSIONS
+from bench.fake_openai import FakeOpenAI
+
+LOCAL_HOSTS = ("127.0.0.1", "localhost")
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="text/html; charset=utf-8", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _original_url(self):
+        host, _, rest = self.path.lstrip("/").partition("/")
+        return f"https://{host}/{rest}"
+
+    def _page(self, url):
+        server = self.server
+        if server.page_latency_ms:
+            time.sleep(server.page_latency_ms / 1000.0)
+        body, content_type = server.corpus.page(url)
+        if body is None and urlsplit(url).path.lower().endswith(IMAGE_EXTENSIONS):
+            body, content_type = server.corpus.image(url), "image/jpeg"
+        return body, content_type
+
+    def _query(self):
+        return {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+
+    def _dataset(self):
+        """Bright Data collector job: pending on the first poll, like the real API, then the dataset."""
+        server, job = self.server, self._query().get("id", "")
+        with server.lock:
+            collector = server.jobs.get(job)
+            polls = server.polls[job] = server.polls.get(job, 0) + 1
+        records = server.corpus.collector(collector) if collector else None
+        if records is None:
+            self._send(404, b"unknown collection", "text/plain")
+        elif polls == 1:
+            self._send(202, json.dumps({"status": "building"}).encode("utf-8"), "application/json")
+        else:
+            self._send(200, json.dumps(records).encode("utf-8"), "application/json")
+
+    def _upload(self, body):
+        """Multipart POST /v1/files: keep the "file" part."""
+        head = f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode("latin-1")
+        message = BytesParser(policy=policy.default).parsebytes(head + body)
+        data = b""
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                data = part.get_payload(decode=True)
+        with self.server.lock:
+            file_id = f"file-{len(self.server.files) + 1}"
+            self.server.files[file_id] = data
+        self._send(200, json.dumps({"id": file_id, "object": "file", "purpose": "batch", "bytes": len(data)})
+                   .encode("utf-8"), "application/json")
+
+    def _create_batch(self, payload):
+        server = self.server
+        with server.lock:
+            batch_id = f"batch_{len(server.batches) + 1}"
+            server.batches[batch_id] = {"id": batch_id, "object": "batch", "status": "validating",
+                                        "input_file_id": payload.get("input_file_id"),
+                                        "endpoint": payload.get("endpoint"), "polls": 0}
+        self._send(200, json.dumps(server.batches[batch_id]).encode("utf-8"), "application/json")
+
+    def _batch(self, batch_id):
+        """Batch status: in progress on the first poll, then answered all at once."""
+        server = self.server
+        with server.lock:
+            batch = server.batches.get(batch_id)
+            if batch is not None:
+                batch["polls"] += 1
+        if batch is None:
+            return self._send(404, b"unknown batch", "text/plain")
+        if batch["polls"] == 1:
+            batch["status"] = "in_progress"
+        elif batch["status"] != "completed":
+            out = []
+            for line in server.files.get(batch["input_file_id"], b"").decode("utf-8").splitlines():
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                answer = server.llm.complete(request["body"], wait=False)
+                out.append({"id": f"req-{len(out) + 1}", "custom_id": request["custom_id"], "error": None,
+                            "response": {"status_code": 200, "request_id": answer["id"], "body": answer}})
+            with server.lock:
+                output_id = f"file-{len(server.files) + 1}"
+                server.files[output_id] = "".join(json.dumps(o) + "\n" for o in out).encode("utf-8")
+            batch.update(status="completed", output_file_id=output_id,
+                         request_counts={"total": len(out), "completed": len(out), "failed": 0})
+        self._send(200, json.dumps(batch).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        if self.path.startswith("/api.brightdata.com/dca/dataset"):
+            return self._dataset()
+        if self.path.startswith("/v1/batches/"):
+            return self._batch(self.path.rsplit("/", 1)[-1])
+        if self.path.startswith("/v1/files/") and self.path.endswith("/content"):
+            data = self.server.files.get(self.path.split("/")[3])
+            if data is None:
+                return self._send(404, b"unknown file", "text/plain")
+            return self._send(200, data, "application/jsonl")
+        body, content_type = self._page(self._original_url())
+        if body is None:
+            self.server.misses.append(self._original_url())
+            self._send(404, b"not in corpus")
+        else:
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+            if self.headers.get("If-None-Match") == etag:
+                self.server.not_modified += 1
+                self._send(304, headers={"ETag": etag})
+            else:
+                self._send(200, body, content_type, {"ETag": etag})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if self.path.startswith("/v1/files"):
+            return self._upload(body)
+        payload = json.loads(body or b"{}")
+        if self.path.startswith("/v1/batches"):
+            self._create_batch(payload)
+        elif self.path.startswith("/api.brightdata.com/dca/trigger"):
+            collector = self._query().get("collector", "")
+            with self.server.lock:
+                job = f"{collector}-{len(self.server.jobs) + 1}"
+                self.server.jobs[job] = collector
+            self._send(200, json.dumps({"collection_id": job}).encode("utf-8"), "application/json")
+        elif self.path.startswith("/v1/chat/completions"):
+            answer = self.server.llm.complete(payload)
+            self._send(200, json.dumps(answer).encode("utf-8"), "application/json")
+        elif self.path.startswith("/api.brightdata.com/unlocker"):
+            body, _ = self._page(payload.get("url", ""))
+            if body is None:
+                self.server.misses.append(payload.get("url", ""))
+            result = {"response": {"status_code": 200 if body else 404, "body": (body or b"").decode("utf-8", "replace")}}
+            self._send(200, json.dumps(result).encode("utf-8"), "application/json")
+        else:
+            self._send(404, b"unknown endpoint")
+
+
+def start_server(corpus, llm=None, port=0, page_latency_ms=0):
+    """Start in a daemon thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), ReplayHandler)
+    server.daemon_threads = True
+    server.corpus = corpus
+    server.llm = llm or FakeOpenAI()
+    server.page_latency_ms = page_latency_ms
+    server.misses = []
+    server.not_modified = 0
+    server.lock = threading.Lock()
+    server.jobs = {}    # collector job id -> collector id
+    server.polls = {}
+    server.files = {}   # OpenAI file id -> bytes (batch inputs and outputs)
+    server.batches = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def install_requests_redirect(base_url):
+    """Send every non-local `requests` call to the replay server at base_url."""
+    original_send = requests.adapters.HTTPAdapter.send
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        if parts.hostname not in LOCAL_HOSTS:
+            request.url = f"{base_url}/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else "")
+            kwargs["proxies"] = {}
+        return original_send(self, request, **kwargs)
+
+    requests.adapters.HTTPAdapter.send = send
+    return original_send
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the benchmark corpus and fake OpenAI.")
+    parser.add_argument("--corpus", default=DEFAULT_ROOT)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-latency-ms", type=int, default=300)
+    parser.add_argument("--llm-jitter-ms", type=int, default=100)
+    parser.add_argument("--page-latency-ms", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = Corpus(args.corpus)
+    if not corpus.exists():
+        sys.exit(f"No corpus at {args.corpus}; run `python -m bench.corpus` first.")
+    server, base = start_server(corpus, FakeOpenAI(args.llm_latency_ms, args.llm_jitter_ms),
+                                args.port, args.page_latency_ms)
+    print(f"[bench] Replaying {len(corpus.index['pages'])} pages on {base} (OPENAI_API_BASE={base}/v1)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
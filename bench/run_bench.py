@@ -0,0 +1,247 @@
+# bench/run_bench.py
+"""
+End-to-end offline benchmark: discovery -> fetch -> extraction -> normalization ->
+diagram -> images/watermark -> reconciliation -> zip, against the local replay
+server and fake OpenAI, timed with core.metrics.
+
+    python -m bench.run_bench                                   # all dealers, corpus defaults
+    python -m bench.run_bench -d jasper,five_star --llm-latency-ms 800
+    python -m bench.run_bench --rebuild --listings 40 --images 8
+    python -m bench.run_bench --compare bench/results/20250101-120000_ab12cd3.json
+
+Each run is saved to bench/results/<timestamp>_<commit>.json (config, commit,
+wall time, per-stage summary) so runs on different commits can be compared.
+The pipeline runs in a scratch directory; the repo's results/ is never touched.
+
+Selenium-only steps (ftlgr/fyda discovery, fyda detail pages and photos) need a
+live Chrome, so they are replayed from the corpus instead: those dealers measure
+everything after the browser.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import datetime
+import subprocess
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.corpus import Corpus, DEFAULT_ROOT, build_synthetic
+from bench.fake_openai import FakeOpenAI
+from bench.replay_server import start_server, install_requests_redirect
+
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+# dealer -> steps that need Chrome and are served from the corpus instead
+BROWSER_REPLAY = {"ftlgr": ("listings",), "fyda": ("listings", "page", "images")}
+
+
+def git_commit():
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, text=True).strip()
+        return sha, bool(dirty)
+    except Exception:
+        return "unknown", False
+
+
+def prepare_env(base_url, workdir, rate_limit=False):
+    """Point OpenAI and the proxy settings at the replay server (before the scrapers are imported)."""
+    os.environ.update({
+        "RATE_LIMIT": "1" if rate_limit else "0",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_API_BASE": f"{base_url}/v1",
+        "BRIGHTDATA_PROXY_USER": "bench",
+        "BRIGHTDATA_PROXY_PASS": "bench",
+        "BRIGHTDATA_PROXY_HOST": "127.0.0.1",
+        "BRIGHTDATA_PROXY_PORT": "9",
+        "BRIGHTDATA_API_KEY": "bench",
+        "JOURNAL_DIR": os.path.join(workdir, "journal"),
+        "INVENTORY_DIR": os.path.join(workdir, "inventory"),
+        "SHANES_COLLECTOR_POLL": "0.1",
+        "LLM_BATCH_POLL": "0.1",
+        "HTTP_CACHE_DIR": os.path.join(workdir, "http_cache"),
+        "IMAGE_STORE_DIR": os.path.join(workdir, "image_store"),
+    })
+    os.environ.pop("BRIGHTDATA_FIVESTAR_PROXY_USER", None)
+
+
+def replay_page_text(url):
+    import requests
+    from core import htmlparse
+
+    resp = requests.get(url, timeout=30)
+    resp.raise_for_status()
+    section = htmlparse.first(resp.text, "//div[@id='template']", hint='id="template"')
+    if section is None:
+        section = htmlparse.first(resp.text, "//body")
+    return htmlparse.text(section)
+
+
+def replay_browser_dealers(corpus, names):
+    from scrapers import registry
+
+    for name in names:
+        steps = BROWSER_REPLAY.get(name, ())
+        if not steps:
+            continue
+        spec = registry.get_spec(name)
+        module = registry.load(name)
+        if "listings" in steps:
+            setattr(module, spec["listings"], lambda name=name: corpus.listings(name))
+            if spec.get("stream"):
+                setattr(module, spec["stream"], lambda name=name: iter(corpus.listings(name)))
+        if "page" in steps:
+            module.get_vehicle_page_html = replay_page_text
+        if "images" in steps:
+            registry.SCRAPERS[name] = dict(spec, images=False)
+
+
+def count_rows(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        return max(0, sum(1 for _ in csv.reader(f)) - 1)
+
+
+def run(args):
+    corpus = Corpus(args.corpus)
+    if args.rebuild or not corpus.exists():
+        w, h = (int(v) for v in args.image_size.lower().split("x"))
+        corpus = build_synthetic(args.corpus, args.listings, args.images, args.page_kb, (w, h))
+
+    llm = FakeOpenAI(args.llm_latency_ms, args.llm_jitter_ms, tail_pct=args.llm_tail_pct, tail_ms=args.llm_tail_ms)
+    server, base_url = start_server(corpus, llm, page_latency_ms=args.page_latency_ms)
+    workdir = tempfile.mkdtemp(prefix="colton-bench-")
+    shutil.copytree(os.path.join(ROOT, "data", "raw"), os.path.join(workdir, "data", "raw"))
+    prepare_env(base_url, workdir, args.rate_limit)
+    install_requests_redirect(base_url)
+    os.chdir(workdir)
+
+    import openai
+    openai.api_key, openai.api_base = "bench", f"{base_url}/v1"
+    from core import metrics
+    from pipeline.orchestrator import run_dealers, parse_dealers
+    from pipeline.zip_only import write_results_zip
+    from core.openai_utils import llm_stats
+
+    names = parse_dealers(args.dealers)
+    log_path = os.path.join(workdir, "bench.log")
+    print(f"[bench] dealers={names} llm={args.llm_latency_ms}+-{args.llm_jitter_ms}ms workdir={workdir}")
+
+    started = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log, \
+         (contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(log)):
+        replay_browser_dealers(corpus, names)
+        outputs = run_dealers(names, limit=args.limit, engine=args.engine)
+        with metrics.stage("zip", "all") as rec:
+            with open("bench.zip", "wb") as f:
+                write_results_zip(f, [("results", "results"), ("myresults", "myresults")])
+            rec["bytes"] = os.path.getsize("bench.zip")
+    wall = time.perf_counter() - started
+
+    recs = metrics.records()
+    commit, dirty = git_commit()
+    result = {
+        "label": args.label,
+        "commit": commit,
+        "dirty": dirty,
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "keep", "verbose")},
+        "corpus": corpus.index.get("synthetic", "recorded"),
+        "wall_s": round(wall, 3),
+        "llm_calls": llm.calls,
+        "llm_batched": llm.batched,
+        "llm_slow": llm.slow,
+        "llm_tiers": llm_stats(),
+        "replay_misses": sorted(set(server.misses))[:50],
+        "rows": {name: count_rows(os.path.join("results", name, "vehicleinfo.csv")) for name in names},
+        "completed": sorted(outputs),
+        "summary": metrics.summarize(recs),
+    }
+    server.shutdown()
+    os.chdir(ROOT)
+    if args.keep:
+        print(f"[bench] Kept scratch dir {workdir} (log: {log_path})")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def save(result):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(RESULTS_DIR, f"{stamp}_{result['commit']}{'-dirty' if result['dirty'] else ''}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def compare(old, new):
+    """Per-stage p50 / p90 / total deltas between two saved results."""
+    def pct(a, b):
+        return f"{(b - a) / a * 100:+.0f}%" if a else "n/a"
+
+    lines = [f"{'stage':<14}{'p50 old':>10}{'p50 new':>10}{'':>7}{'p90 old':>10}{'p90 new':>10}{'':>7}{'total old':>11}{'total new':>11}{'':>7}"]
+    stages = sorted(set(old["summary"]) | set(new["summary"]))
+    for stage in stages:
+        a, b = old["summary"].get(stage, {}), new["summary"].get(stage, {})
+        row = f"{stage:<14}"
+        for key, width in (("p50_s", 10), ("p90_s", 10), ("total_s", 11)):
+            va, vb = a.get(key, 0), b.get(key, 0)
+            row += f"{va:>{width}}{vb:>{width}}{pct(va, vb):>7}"
+        lines.append(row)
+    lines.append(f"{'wall':<14}{'':>54}{old['wall_s']:>11}{new['wall_s']:>11}{pct(old['wall_s'], new['wall_s']):>7}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark.")
+    parser.add_argument("--dealers", "-d", default="all")
+    parser.add_argument("--limit", type=int, default=None, help="Only process the first N discovered listings per dealer")
+    parser.add_argument("--corpus", default=DEFAULT_ROOT)
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate the synthetic corpus with the options below")
+    parser.add_argument("--listings", "-n", type=int, default=10, help="(synthetic) listings per dealer")
+    parser.add_argument("--images", type=int, default=6, help="(synthetic) photos per listing")
+    parser.add_argument("--page-kb", type=int, default=80, help="(synthetic) HTML page weight")
+    parser.add_argument("--image-size", default="1600x1200", help="(synthetic) photo size WxH")
+    parser.add_argument("--llm-latency-ms", type=int, default=300)
+    parser.add_argument("--llm-jitter-ms", type=int, default=100)
+    parser.add_argument("--llm-tail-pct", type=float, default=0.0, help="Share of LLM calls (%%) that are slow")
+    parser.add_argument("--llm-tail-ms", type=int, default=5000, help="Extra latency of a slow LLM call")
+    parser.add_argument("--page-latency-ms", type=int, default=0, help="Added to every replayed page")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="Keep core.ratelimit's per-site pacing (off by default: the replay server is local)")
+    parser.add_argument("--engine", choices=("pool", "staged", "batch"), default="pool", help="Orchestrator engine")
+    parser.add_argument("--label", default="", help="Free text stored with the result")
+    parser.add_argument("--compare", help="Earlier result JSON to compare against")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory and log")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Show scraper output instead of logging it")
+    args = parser.parse_args()
+
+    result = run(args)
+    path = save(result)
+    from core.metrics import format_summary
+
+    print(f"\n=== BENCH {result['commit']}{' (dirty)' if result['dirty'] else ''}: wall {result['wall_s']}s, "
+          f"{result['llm_calls']} LLM calls, rows {result['rows']} ===")
+    print(format_summary(result["summary"]))
+    if result["replay_misses"]:
+        print(f"[bench] {len(result['replay_misses'])} URL(s) not in the corpus, e.g. {result['replay_misses'][0]}")
+    print(f"[bench] Saved {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        print(f"\n=== vs {os.path.basename(args.compare)} ({old['commit']}) ===")
+        print(compare(old, result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# core/concurrency.py
+
+import os
+import threading
+from contextlib import contextmanager
+
+# How many of each kind of work may run at once across ALL dealers in a process.
+# http    = plain requests fetches (pages, images, Web Unlocker calls)
+# llm     = OpenAI calls
+# browser = live Selenium/Chrome sessions (each one is ~300 MB on Fargate)
+DEFAULT_LIMITS = {"http": 8, "llm": 4, "browser": 2}
+
+
+class ResourceBudget:
+    """
+    Shared caps on concurrent HTTP, LLM and browser work.
+
+        with budget.slot("llm"):
+            extract_vehicle_info(text)
+    """
+
+    def __init__(self, limits=None):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self._semaphores = {kind: threading.BoundedSemaphore(n) for kind, n in self.limits.items()}
+
+    @classmethod
+    def from_env(cls):
+        """Read BUDGET_HTTP / BUDGET_LLM / BUDGET_BROWSER (falls back to DEFAULT_LIMITS)."""
+        limits = {}
+        for kind in DEFAULT_LIMITS:
+            value = os.environ.get(f"BUDGET_{kind.upper()}")
+            if value:
+                limits[kind] = int(value)
+        return cls(limits)
+
+    @contextmanager
+    def slot(self, kind):
+        semaphore = self._semaphores[kind]
+        semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    @property
+    def total(self):
+        return sum(self.limits.values())
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_budget():
+    """Process-wide ResourceBudget, built from env on first use."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = ResourceBudget.from_env()
+        return _budget
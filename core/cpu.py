@@ -0,0 +1,232 @@
+# core/cpu.py
+"""
+Process pool for the CPU-bound steps of a listing (page HTML -> text, and
+make_extracted_info_compliant's difflib scoring), so they run on every vCPU
+instead of holding the GIL that the fetch / OpenAI threads need.
+
+    text = cpu.run(htmlparse.section_text, html, DETAIL_WRAPPER, "detail-wrapper")
+    compliant = cpu.run(module.make_extracted_info_compliant, extracted)
+
+`fn` must be a module-level function (it is pickled by name and imported in the
+worker). run() blocks the calling thread and returns fn's result, or raises
+its exception, exactly as calling fn directly would.
+
+Calls from all threads are gathered into batches (up to CPU_BATCH calls, or
+whatever arrived within CPU_BATCH_WAIT_MS) and each batch is one pool task, so a
+burst of small normalizations does not pay one process round trip each. Page
+text of CPU_SHM_MIN bytes or more is handed over through shared memory rather
+than being pickled down the pool's pipe.
+
+With one CPU, CPU_POOL=0, a function that cannot be pickled, or a pool that
+broke, the call simply runs in the calling thread.
+
+Environment:
+    CPU_POOL=0          run everything in-thread
+    CPU_WORKERS         worker processes (default: number of CPUs; fewer than 2 means no pool)
+    CPU_BATCH           calls per pool task (default 8)
+    CPU_BATCH_WAIT_MS   how long a batch waits to fill (default 2)
+    CPU_SHM_MIN         page size that goes through shared memory (default 65536)
+"""
+
+import os
+import time
+import queue
+import pickle
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+BATCH = int(os.environ.get("CPU_BATCH", "8"))
+BATCH_WAIT_S = float(os.environ.get("CPU_BATCH_WAIT_MS", "2")) / 1000
+SHM_MIN = int(os.environ.get("CPU_SHM_MIN", "65536"))
+
+_stats = {"tasks": 0, "batches": 0, "inline": 0, "shared_bytes": 0}
+_stats_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+_disabled = False
+_picklable = {}
+
+
+def _count(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def stats():
+    """Calls sent to the pool, batches they went in, calls run in-thread, bytes passed via shared memory."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def workers():
+    if os.environ.get("CPU_POOL", "1") == "0":
+        return 0
+    n = int(os.environ.get("CPU_WORKERS", "0")) or os.cpu_count() or 1
+    return n if n >= 2 else 0
+
+
+# -- worker side --
+
+class _SharedText:
+    """A str argument parked in a shared memory block (name, length of its UTF-8 bytes)."""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def load(self):
+        # the parent owns the block and unlinks it once the batch is back
+        shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            return bytes(shm.buf[:self.size]).decode("utf-8")
+        finally:
+            shm.close()
+
+
+def _run_batch(calls):
+    """Runs in a worker: [(fn, args)] -> [(ok, result or exception)]."""
+    out = []
+    for fn, args in calls:
+        try:
+            args = tuple(a.load() if isinstance(a, _SharedText) else a for a in args)
+            out.append((True, fn(*args)))
+        except Exception as e:
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(f"{type(e).__name__}: {e}")
+            out.append((False, e))
+    return out
+
+
+# -- caller side --
+
+class _Pool:
+
+    def __init__(self, n):
+        self.executor = ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn"))
+        self.inbox = queue.Queue()
+        threading.Thread(target=self._dispatch, daemon=True, name="cpu-batcher").start()
+
+    def submit(self, fn, args):
+        fut = Future()
+        self.inbox.put((fn, args, fut))
+        return fut
+
+    def _dispatch(self):
+        while True:
+            batch = [self.inbox.get()]
+            deadline = time.monotonic() + BATCH_WAIT_S
+            while len(batch) < BATCH:
+                try:
+                    batch.append(self.inbox.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._send(batch)
+
+    def _send(self, batch):
+        blocks = []
+        try:
+            calls = [(fn, self._share(args, blocks)) for fn, args, _ in batch]
+            task = self.executor.submit(_run_batch, calls)
+        except Exception as e:
+            self._release(blocks)
+            for _, _, fut in batch:
+                fut.set_exception(_PoolError(e))
+            return
+        _count("tasks", len(batch))
+        _count("batches")
+
+        def done(task):
+            self._release(blocks)
+            try:
+                results = task.result()
+            except Exception as e:
+                for _, _, fut in batch:
+                    fut.set_exception(_PoolError(e))
+                return
+            for (_, _, fut), result in zip(batch, results):
+                fut.set_result(result)
+
+        task.add_done_callback(done)
+
+    @staticmethod
+    def _share(args, blocks):
+        shared = []
+        for a in args:
+            if isinstance(a, str) and len(a) >= SHM_MIN:
+                data = a.encode("utf-8")
+                shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+                shm.buf[:len(data)] = data
+                blocks.append(shm)
+                _count("shared_bytes", len(data))
+                a = _SharedText(shm.name, len(data))
+            shared.append(a)
+        return tuple(shared)
+
+    @staticmethod
+    def _release(blocks):
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+class _PoolError(Exception):
+    """The pool itself failed (broken worker, unpicklable argument), not the function."""
+
+
+def _get_pool():
+    global _pool
+    if _disabled:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            n = workers()
+            if not n:
+                return None
+            _pool = _Pool(n)
+            log.info("cpu pool started", workers=n, batch=BATCH)
+        return _pool
+
+
+def _can_send(fn):
+    if fn not in _picklable:
+        try:
+            pickle.loads(pickle.dumps(fn))
+            _picklable[fn] = True
+        except Exception:
+            _picklable[fn] = False
+    return _picklable[fn]
+
+
+def run(fn, *args):
+    """fn(*args), in a worker process when the pool is on."""
+    global _disabled
+    pool = _get_pool()
+    if pool is None or not _can_send(fn):
+        _count("inline")
+        return fn(*args)
+    try:
+        ok, value = pool.submit(fn, args).result()
+    except _PoolError as e:
+        log.warning("cpu pool failed; running in-thread from now on", fn=getattr(fn, "__qualname__", fn), error=str(e))
+        _disabled = True
+        _count("inline")
+        return fn(*args)
+    if ok:
+        return value
+    raise value
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.executor.shutdown(wait=True)
+            _pool = None
@@ -0,0 +1,142 @@
+# core/htmlparse.py
+"""
+Shared HTML parsing for the scrapers and core.image_utils, on lxml.
+
+    root = htmlparse.document(html)                      # whole page, parsed once
+    el = htmlparse.first(html, DETAIL, hint='class="detail-wrapper"')
+    htmlparse.text(el)                                   # same as bs4 el.get_text(" ", strip=True)
+
+Selectors are XPath strings; each is compiled once per thread and reused, so the
+per-page cost is the parse itself (lxml's C parser, several times faster than
+bs4's html.parser on these pages).
+
+A page is parsed once however many consumers ask for it: the last few parse
+results are kept, keyed by the page text, so e.g. Five Star's detail text and
+its gallery (same cached response) share one tree. With `hint`, the parse
+starts at the first occurrence of that string in the raw HTML (the tag holding
+it), skipping the page head, menus and inline scripts in front of the target
+element. If the selector finds nothing in that partial tree the whole page is
+parsed, so a hint is only ever an optimization.
+
+Trees are shared between threads: treat them as read-only.
+"""
+
+import threading
+from collections import OrderedDict
+
+import lxml.html
+from lxml import etree
+
+# bs4's get_text leaves these out, so do we
+SKIP_TEXT = frozenset(("script", "style", "template"))
+CACHE_SIZE = 8
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_local = threading.local()
+
+
+def xpath(expr):
+    """Compiled XPath for `expr` (one per thread: compiled expressions are not shared)."""
+    compiled = getattr(_local, "xpaths", None)
+    if compiled is None:
+        compiled = _local.xpaths = {}
+    if expr not in compiled:
+        compiled[expr] = etree.XPath(expr, smart_strings=False)
+    return compiled[expr]
+
+
+def has_class(name):
+    """XPath predicate body matching a whole class token, like CSS `.name`."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _parse(html):
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # str with an <?xml encoding=...?> declaration
+        return lxml.html.document_fromstring(html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+    except etree.ParserError:
+        # nothing to parse (empty or whitespace-only page)
+        return None
+
+
+def _start(html, hint):
+    """Offset of the tag holding the first occurrence of `hint`, or 0."""
+    at = html.find(hint)
+    if at <= 0:
+        return 0
+    tag = html.rfind("<", 0, at)
+    return tag if tag > 0 else 0
+
+
+def document(html, hint=None):
+    """Parsed root of `html` (from the tag holding `hint` on, if given). None for an empty page."""
+    if not html:
+        return None
+    start = _start(html, hint) if hint else 0
+    key = (html, start)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    root = _parse(html[start:] if start else html)
+    with _cache_lock:
+        _cache[key] = root
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return root
+
+
+def select(html, expr, hint=None):
+    """Every element matching XPath `expr`; `html` may be page text or an element."""
+    if not isinstance(html, str):
+        return xpath(expr)(html) if html is not None else []
+    if hint:
+        root = document(html, hint)
+        found = xpath(expr)(root) if root is not None else []
+        if found:
+            return found
+    root = document(html)
+    return xpath(expr)(root) if root is not None else []
+
+
+def first(html, expr, hint=None):
+    found = select(html, expr, hint)
+    return found[0] if found else None
+
+
+def _strings(el, skip):
+    if el.text:
+        yield el.text
+    for child in el:
+        if isinstance(child.tag, str) and child.tag not in skip:
+            yield from _strings(child, skip)
+        if child.tail:
+            yield child.tail
+
+
+def text(el, sep=" ", skip=()):
+    """
+    Text under `el`, each piece stripped and empty ones dropped, joined with `sep`.
+    Elements whose tag is in `skip` are left out, without touching the shared tree.
+    """
+    if el is None:
+        return ""
+    skip = SKIP_TEXT.union(skip)
+    return sep.join(s for s in (piece.strip() for piece in _strings(el, skip)) if s)
+
+
+def section_text(html, expr, hint=None, sep=" "):
+    """
+    text() of the first match of `expr` in page `html`, or None if nothing matches.
+    One picklable call, so core.cpu can run it in a worker process.
+    """
+    el = first(html, expr, hint)
+    return text(el, sep) if el is not None else None
+
+
+def to_html(el):
+    """Serialized markup of `el` (for debug dumps)."""
+    return lxml.html.tostring(el, encoding="unicode", pretty_print=True) if el is not None else ""
@@ -0,0 +1,300 @@
+# core/image_store.py
+"""
+Content-addressed store for listing photos, shared by every dealer and run.
+
+    image_store/
+        urls/<sha1(url)[:2]>/<sha1(url)>.json   {"url", "sha", "etag", "last_modified", "size", "dhash",
+                                                 "stored", "fetched"}
+        blobs/<sha[:2]>/<sha><ext>              original photo, stored once per distinct content
+        marked/<sha[:2]>/<sha>-<wm><ext>        watermarked output for one watermark image
+
+download_images / watermark_images in core.image_utils go through here:
+  * a URL seen before is revalidated with If-None-Match / If-Modified-Since
+    (or, when the site sends no validators, a HEAD whose Content-Length matches
+    the stored size), so an unchanged photo costs no download. A photo replaced
+    by one of the same byte size passes that HEAD, so without validators it is
+    downloaded again anyway once IMAGE_STORE_RECHECK_DAYS have passed;
+  * the same bytes under several URLs are stored and watermarked once;
+  * within one gallery, photos with the same perceptual hash (dHash) and aspect
+    ratio are kept once, the largest copy winning (Five Star's full-size links vs
+    <img> fallbacks). Flat images (almost no bits set) only dedupe on exact bytes;
+  * a photo already watermarked with the same watermark is linked, not re-rendered.
+Files in results/ are hard links into the store (copies where links are not possible).
+recording() notes which store file each of those links came from, and relink()
+puts them back, which is how an unchanged listing (pipeline/inventory.py) gets
+its photos in a fresh results/ without any request.
+
+prune() keeps a persistent store from growing forever: URL records not
+revalidated for IMAGE_STORE_KEEP_DAYS are dropped, then every blob and
+watermarked file no remaining record points to. maybe_prune() runs it at most
+once a day; run_scraper and the orchestrator call it at the end of a run.
+
+Environment:
+    IMAGE_STORE=0            old behaviour: download and watermark everything
+    IMAGE_STORE_DIR          where the store lives (default ./image_store; a persistent
+                             volume keeps the savings between tasks)
+    IMAGE_STORE_MAX_AGE      seconds a known URL is reused without asking the site (default 0)
+    IMAGE_DEDUPE_DISTANCE    max dHash bit difference for "same photo" (default 3, -1 disables)
+    IMAGE_STORE_RECHECK_DAYS without validators, download a known photo again after this
+                             many days even if its HEAD matches (default 7)
+    IMAGE_STORE_KEEP_DAYS    prune URLs not seen for this many days and the files only they
+                             used (default 30, 0 never prunes)
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import contextlib
+
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+STORE_DIR = os.environ.get("IMAGE_STORE_DIR", "image_store")
+MAX_AGE = float(os.environ.get("IMAGE_STORE_MAX_AGE", "0"))
+DEDUPE_DISTANCE = int(os.environ.get("IMAGE_DEDUPE_DISTANCE", "3"))
+RECHECK_S = float(os.environ.get("IMAGE_STORE_RECHECK_DAYS", "7")) * 86400
+KEEP_S = float(os.environ.get("IMAGE_STORE_KEEP_DAYS", "30")) * 86400
+# files younger than this are never pruned: another task may be about to record them
+PRUNE_GRACE_S = 86400
+PRUNE_EVERY_S = 86400
+
+_stats = {"downloaded": 0, "revalidated": 0, "fresh": 0, "same_content": 0, "deduped": 0,
+          "watermarked": 0, "watermark_reused": 0}
+_stats_lock = threading.Lock()
+# striped locks so two threads do not render the same watermark at once
+_key_locks = [threading.Lock() for _ in range(64)]
+_local = threading.local()
+
+
+def count(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def stats():
+    """Download / reuse / watermark counters for this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def enabled():
+    return os.environ.get("IMAGE_STORE", "1") != "0"
+
+
+def _tmp(path):
+    return f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = _tmp(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _url_path(url):
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(STORE_DIR, "urls", digest[:2], digest + ".json")
+
+
+def blob_path(sha, ext):
+    return os.path.join(STORE_DIR, "blobs", sha[:2], sha + ext)
+
+
+def load_url(url):
+    try:
+        with open(_url_path(url), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("url") != url or not os.path.exists(blob_path(meta["sha"], meta.get("ext", ".jpg"))):
+        return None
+    return meta
+
+
+def save_url(meta):
+    _write_json(_url_path(meta["url"]), meta)
+
+
+def put_blob(content, ext):
+    """Store bytes under their SHA-256 (once). Returns the hash."""
+    sha = hashlib.sha256(content).hexdigest()
+    path = blob_path(sha, ext)
+    if os.path.exists(path):
+        count("same_content")
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = _tmp(path)
+        with open(tmp, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    return sha
+
+
+def file_sha(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def dhash(path, size=8):
+    """64-bit difference hash (hex) and (width, height); (None, (0, 0)) if PIL cannot read the file."""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            dims = img.size
+            img.draft("L", (size * 8, size * 8))  # JPEG: decode at reduced scale, much cheaper
+            small = img.convert("L").resize((size + 1, size))
+    except Exception:
+        return None, (0, 0)
+    px = list(small.tobytes())  # "L": one byte per pixel
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            bits = (bits << 1) | (px[row * (size + 1) + col] > px[row * (size + 1) + col + 1])
+    return f"{bits:016x}", dims
+
+
+def same_photo(a, b):
+    """Near-identical photos: `a` and `b` are image-store records with "dhash", "width", "height"."""
+    ha, hb = a.get("dhash"), b.get("dhash")
+    if ha is None or hb is None or DEDUPE_DISTANCE < 0:
+        return False
+    if not all((a.get("width"), a.get("height"), b.get("width"), b.get("height"))):
+        return False
+    if abs(a["width"] / a["height"] - b["width"] / b["height"]) > 0.02:
+        return False
+    # a near-flat hash (gradients, placeholders) says little about the photo
+    if not all(8 <= bin(int(h, 16)).count("1") <= 56 for h in (ha, hb)):
+        return False
+    return bin(int(ha, 16) ^ int(hb, 16)).count("1") <= DEDUPE_DISTANCE
+
+
+@contextlib.contextmanager
+def recording():
+    """
+    Collect {dest: store file} for every link() this thread makes inside the block,
+    so a listing's photo folders can be rebuilt from the store later (relink).
+    """
+    previous = getattr(_local, "links", None)
+    _local.links = links = {}
+    try:
+        yield links
+    finally:
+        _local.links = previous
+
+
+def relink(photos, root):
+    """
+    Rebuild photo files under `root` from {path under root: path under STORE_DIR}
+    (as saved from recording()). False, linking nothing, if any store file is gone.
+    """
+    sources = {dest: os.path.join(STORE_DIR, src) for dest, src in photos.items()}
+    if not all(os.path.exists(src) for src in sources.values()):
+        return False
+    for dest, src in sources.items():
+        link(src, os.path.join(root, dest))
+    return True
+
+
+def link(src, dest):
+    """Put `src` at `dest` as a hard link (copy if the filesystem says no)."""
+    links = getattr(_local, "links", None)
+    if links is not None:
+        links[dest] = src
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def key_lock(key):
+    return _key_locks[hash(key) % len(_key_locks)]
+
+
+def watermark_key(watermark_path):
+    """Changes whenever the watermark image does, so old outputs are not reused."""
+    with open(watermark_path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+
+def marked_path(sha, wm_key, ext):
+    return os.path.join(STORE_DIR, "marked", sha[:2], f"{sha}-{wm_key}{ext}")
+
+
+def fresh(meta):
+    return bool(MAX_AGE) and time.time() - meta.get("stored", 0) < MAX_AGE
+
+
+def recheck_due(meta):
+    """True when a photo only ever checked by HEAD should be downloaded again."""
+    return time.time() - meta.get("fetched", 0) >= RECHECK_S
+
+
+def prune(keep_s=KEEP_S, now=None):
+    """
+    Drop URL records not stored/revalidated within keep_s, then blobs and watermarked
+    files that no remaining record points to. Returns counts of what was removed.
+    """
+    now = now or time.time()
+    removed = {"urls": 0, "blobs": 0, "marked": 0, "bytes": 0}
+    keep = set()
+    for root, _, files in os.walk(os.path.join(STORE_DIR, "urls")):
+        for f in files:
+            path = os.path.join(root, f)
+            try:
+                with open(path, "r", encoding="utf-8") as fh:
+                    meta = json.load(fh)
+            except (OSError, ValueError):
+                meta = {}
+            if meta.get("sha") and now - meta.get("stored", 0) < keep_s:
+                keep.add(meta["sha"])
+            elif now - os.path.getmtime(path) >= PRUNE_GRACE_S:
+                os.remove(path)
+                removed["urls"] += 1
+    for kind in ("blobs", "marked"):
+        for root, _, files in os.walk(os.path.join(STORE_DIR, kind)):
+            for f in files:
+                path = os.path.join(root, f)
+                # blobs/<sha><ext>, marked/<sha>-<wm><ext> (SHA-256: 64 hex characters); leftover .tmp files go too
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if (f[:64] in keep and not f.endswith(".tmp")) or now - stat.st_mtime < PRUNE_GRACE_S:
+                    continue
+                os.remove(path)
+                removed[kind] += 1
+                removed["bytes"] += stat.st_size
+    log.info("image store pruned", dir=STORE_DIR, kept_photos=len(keep), **removed)
+    return removed
+
+
+def maybe_prune():
+    """prune() if it is on and has not run in the last day (any process sharing the store)."""
+    if not enabled() or KEEP_S <= 0 or not os.path.isdir(STORE_DIR):
+        return None
+    marker = os.path.join(STORE_DIR, ".last_prune")
+    try:
+        if time.time() - os.path.getmtime(marker) < PRUNE_EVERY_S:
+            return None
+    except OSError:
+        pass
+    with open(marker, "w", encoding="utf-8") as f:
+        f.write(str(time.time()))
+    try:
+        return prune()
+    except OSError as e:
+        log.warning("image store prune failed", dir=STORE_DIR, error=str(e))
+        return None
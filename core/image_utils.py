@@ -2,76 +2,180 @@
 
 import os
 import re
+import time
+import threading
 from typing import List
-import requests
-import requests.compat
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from core import fetch, ratelimit, image_store, htmlparse
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+IMAGE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                  "AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/106.0.0.0 Safari/537.36",
+    "Accept": "*/*",
+}
+
+
+def _image_headers(dealer):
+    headers = dict(IMAGE_HEADERS)
+    if dealer == "ftlgr":
+        # hotlink protection
+        headers["Referer"] = "https://www.ftlgr.com/"
+    return headers
+
+
+def _fetch_image(url, ext, dealer, headers):
+    """The image store's record for `url`, downloading only if the photo is new or changed."""
+    meta = image_store.load_url(url)
+    resp = None
+    if meta and image_store.fresh(meta):
+        image_store.count("fresh")
+        return meta
+    if meta:
+        conditional = dict(headers)
+        if meta.get("etag"):
+            conditional["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            conditional["If-Modified-Since"] = meta["last_modified"]
+        if len(conditional) > len(headers):
+            resp = fetch.get(url, dealer=dealer, headers=conditional, cache=False, verify=False)
+            unchanged = resp.status_code == 304
+        elif image_store.recheck_due(meta):
+            # no validators, and a same-size replacement would pass the HEAD: download it again now and then
+            unchanged = False
+        else:
+            # no validators from this site: a matching Content-Length is as good as it gets
+            head = fetch.request("HEAD", url, dealer=dealer, headers=headers, verify=False, allow_redirects=True)
+            unchanged = head.status_code == 200 and head.headers.get("Content-Length") == str(meta.get("size"))
+        if unchanged:
+            image_store.count("revalidated")
+            meta["stored"] = time.time()
+            image_store.save_url(meta)
+            return meta
+
+    if resp is None or resp.status_code == 304:
+        resp = fetch.get(url, dealer=dealer, headers=headers, cache=False, verify=False)
+    resp.raise_for_status()
+    sha = image_store.put_blob(resp.content, ext)
+    photo_hash, (width, height) = image_store.dhash(image_store.blob_path(sha, ext))
+    meta = {
+        "url": url, "sha": sha, "ext": ext, "size": len(resp.content),
+        "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified"),
+        "dhash": photo_hash, "width": width, "height": height, "stored": time.time(), "fetched": time.time(),
+    }
+    image_store.save_url(meta)
+    image_store.count("downloaded")
+    return meta
+
 
 def download_images(image_urls: List[str], dest_folder: str, dealer: str = None, prefix: str = "") -> List[str]:
     """
     Download a list of image URLs to dest_folder.
-    Uses proxy only for ftlgr (imanpro) images.
+    Routing (Bright Data for ftlgr's imanpro images, direct otherwise), pooling
+    and retries come from core.fetch's policy for `dealer`. Photos go through
+    core.image_store: unchanged ones are not downloaded again, and the same
+    photo under several URLs is saved once.
     Returns list of file paths.
     """
+    if not image_store.enabled():
+        return _download_images_plain(image_urls, dest_folder, dealer, prefix)
+
     os.makedirs(dest_folder, exist_ok=True)
-    saved_paths = []
+    headers = _image_headers(dealer)
+    kept = []  # [path, meta] in gallery order
 
-    # Proxy config from environment (if needed)
-    proxy_user = os.environ.get("BRIGHTDATA_PROXY_USER")
-    proxy_pass = os.environ.get("BRIGHTDATA_PROXY_PASS")
-    proxy_host = os.environ.get("BRIGHTDATA_PROXY_HOST")
-    proxy_port = os.environ.get("BRIGHTDATA_PROXY_PORT")
+    for idx, url in enumerate(image_urls, 1):
+        ext = os.path.splitext(url.split("?")[0])[1] or ".jpg"
+        filename = os.path.join(dest_folder, f"{prefix}{idx}{ext}")
+        try:
+            meta = _fetch_image(url, ext, dealer, headers)
+        except Exception as e:
+            log.warning("image download failed", url=url, error=str(e))
+            continue
+
+        dup = next((k for k in kept if k[1]["sha"] == meta["sha"] or image_store.same_photo(k[1], meta)), None)
+        if dup:
+            image_store.count("deduped")
+            area, dup_area = meta.get("width", 0) * meta.get("height", 0), dup[1].get("width", 0) * dup[1].get("height", 0)
+            if area > dup_area and os.path.splitext(dup[0])[1] == meta["ext"]:
+                # same photo in a bigger size: keep this copy in the earlier slot
+                image_store.link(image_store.blob_path(meta["sha"], meta["ext"]), dup[0])
+                dup[1] = meta
+            log.debug("duplicate photo skipped", url=url, same_as=dup[0])
+            continue
+
+        image_store.link(image_store.blob_path(meta["sha"], meta["ext"]), filename)
+        kept.append([filename, meta])
+        log.debug("image ready", url=url, path=filename, sha=meta["sha"][:12])
+
+    saved_paths = [path for path, _ in kept]
+    log.info("downloaded images", count=len(saved_paths), requested=len(image_urls), folder=dest_folder)
+    return saved_paths
+
+
+def _download_images_plain(image_urls, dest_folder, dealer=None, prefix=""):
+    os.makedirs(dest_folder, exist_ok=True)
+    saved_paths = []
+    headers = _image_headers(dealer)
 
     for idx, url in enumerate(image_urls, 1):
         ext = os.path.splitext(url.split("?")[0])[1] or ".jpg"
         filename = os.path.join(dest_folder, f"{prefix}{idx}{ext}")
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                          "AppleWebKit/537.36 (KHTML, like Gecko) "
-                          "Chrome/106.0.0.0 Safari/537.36",
-            "Accept": "*/*",
-        }
-        proxies = None
-        session = requests.Session()
-        # Only use proxy for FTLGR dealer (safe for all other scrapers)
-        if dealer == "ftlgr":
-            # For hotlink protection and proxy
-            headers["Referer"] = "https://www.ftlgr.com/"
-            proxies = {
-                "http": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}",
-                "https": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}",
-            }
         try:
-            resp = session.get(url, headers=headers, timeout=30, verify=False, proxies=proxies)
+            resp = fetch.get(url, dealer=dealer, headers=headers, cache=False, verify=False)
             resp.raise_for_status()
             with open(filename, "wb") as f:
                 f.write(resp.content)
             saved_paths.append(filename)
-            print(f"Downloaded image {idx} -> {filename}")
+            log.debug("downloaded image", url=url, path=filename, bytes=len(resp.content))
         except Exception as e:
-            print(f"Error downloading {url}: {e}")
+            log.warning("image download failed", url=url, error=str(e))
 
-    print(f"Downloaded {len(saved_paths)} images to {dest_folder}")
+    log.info("downloaded images", count=len(saved_paths), requested=len(image_urls), folder=dest_folder)
     return saved_paths
 
 
 def watermark_images(input_paths: List[str], output_folder: str, watermark_path: str) -> None:
     """
     Given a list of existing image file paths, apply the watermark (via core.watermark)
-    and save into output_folder with the same filenames.
+    and save into output_folder with the same filenames. A photo already watermarked
+    with this watermark (same content, any listing or run) is reused from core.image_store.
     """
     from core.watermark import add_watermark
 
     os.makedirs(output_folder, exist_ok=True)
+    wm_key = image_store.watermark_key(watermark_path) if image_store.enabled() else None
     for img_path in input_paths:
         fname = os.path.basename(img_path)
         out_path = os.path.join(output_folder, fname)
         try:
-            add_watermark(img_path, watermark_path, out_path)
-            print(f"Processed watermark for: {fname}")
+            if wm_key is None:
+                add_watermark(img_path, watermark_path, out_path)
+            else:
+                ext = os.path.splitext(fname)[1]
+                marked = image_store.marked_path(image_store.file_sha(img_path), wm_key, ext)
+                with image_store.key_lock(marked):
+                    if os.path.exists(marked):
+                        image_store.count("watermark_reused")
+                    else:
+                        os.makedirs(os.path.dirname(marked), exist_ok=True)
+                        # keep the extension last: add_watermark picks the format from it
+                        tmp = f"{marked[:-len(ext)] if ext else marked}.{os.getpid()}-{threading.get_ident()}.tmp{ext}"
+                        add_watermark(img_path, watermark_path, tmp)
+                        os.replace(tmp, marked)
+                        image_store.count("watermarked")
+                image_store.link(marked, out_path)
+            log.debug("watermarked", file=fname)
         except Exception as e:
-            print(f"Failed watermark {fname}: {e}")
+            log.warning("watermark failed", file=fname, error=str(e))
+
+
+FIVE_STAR_GALLERY_LINKS = (f"//a[{htmlparse.has_class('e-gallery-item')} and "
+                           f"{htmlparse.has_class('elementor-gallery-item')}]/@href")
+FIVE_STAR_GALLERY = f"//div[{htmlparse.has_class('gallery')}]"
 
 
 def extract_image_urls_from_page(listing_url: str, dealer: str = "jasper", container_id: str = "photos"):
@@ -81,53 +185,40 @@ def extract_image_urls_from_page(listing_url: str, dealer: str = "jasper", conta
                       "Chrome/106.0.0.0 Safari/537.36"
     }
 
-    proxies = None
-    # Use proxy only for ftlgr
-    if dealer == "ftlgr":
-        proxies = {
-            "http": f"http://{os.environ['BRIGHTDATA_PROXY_USER']}:{os.environ['BRIGHTDATA_PROXY_PASS']}@{os.environ['BRIGHTDATA_PROXY_HOST']}:{os.environ['BRIGHTDATA_PROXY_PORT']}",
-            "https": f"http://{os.environ['BRIGHTDATA_PROXY_USER']}:{os.environ['BRIGHTDATA_PROXY_PASS']}@{os.environ['BRIGHTDATA_PROXY_HOST']}:{os.environ['BRIGHTDATA_PROXY_PORT']}",
-        }
-
-    resp = requests.get(listing_url, headers=headers, timeout=15, verify=False, proxies=proxies)
+    resp = fetch.get(listing_url, dealer=dealer, headers=headers, timeout=15, verify=False)
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+    page = resp.text
     urls = []
 
     if dealer == "five_star":
         # 1. Anchor gallery (Elementor or similar)
-        gallery_links = soup.select('a.e-gallery-item.elementor-gallery-item')
-        if gallery_links:
-            for a_tag in gallery_links:
-                img_url = a_tag.get("href")
-                if img_url and "/uploads/" in img_url:
-                    urls.append(urljoin(listing_url, img_url))
+        for img_url in htmlparse.select(page, FIVE_STAR_GALLERY_LINKS):
+            if "/uploads/" in img_url:
+                urls.append(urljoin(listing_url, img_url))
 
         # 2. <img> tags inside the gallery block
-        gallery_div = soup.find("div", class_="gallery")
-        if gallery_div:
-            for img in gallery_div.find_all("img"):
-                img_url = img.get("src")
-                if img_url and "/uploads/" in img_url:
+        gallery_div = htmlparse.first(page, FIVE_STAR_GALLERY)
+        if gallery_div is not None:
+            for img_url in htmlparse.select(gallery_div, ".//img/@src"):
+                if "/uploads/" in img_url:
                     urls.append(urljoin(listing_url, img_url))
 
         # 3. As fallback, ANY <img> with uploads in the URL
         if not urls:
-            for img in soup.find_all("img"):
-                img_url = img.get("src")
-                if img_url and "/uploads/" in img_url:
+            for img_url in htmlparse.select(page, "//img/@src"):
+                if "/uploads/" in img_url:
                     urls.append(urljoin(listing_url, img_url))
         # Remove duplicates while keeping order
         urls = list(dict.fromkeys(urls))
-        print("Extracted gallery URLs:", urls)
+        log.debug("extracted gallery urls", url=listing_url, count=len(urls), urls=lambda: urls)
         return urls
 
     if dealer == "jasper":
-        div = soup.find("div", id=container_id)
-        if not div:
-            print(f"No <div id='{container_id}'> found.")
+        div = htmlparse.first(page, f"//div[@id='{container_id}']", hint=f'id="{container_id}"')
+        if div is None:
+            log.warning("image container not found", url=listing_url, container_id=container_id)
             return []
-        for el in div.find_all(["img", "a"]):
+        for el in htmlparse.select(div, ".//img|.//a"):
             src = el.get("src") or el.get("href") or ""
             if "javascript:" in src:
                 matches = re.findall(r"'(https?://[^']+)'", src)
@@ -139,16 +230,15 @@ def extract_image_urls_from_page(listing_url: str, dealer: str = "jasper", conta
     
     elif dealer == "ftlgr":
         # Main image
-        main_img = soup.find("img", class_="mainimage")
-        if main_img and main_img.get("src") and not main_img["src"].startswith("data:"):
-            href = urljoin(listing_url, main_img["src"])
+        main_img = htmlparse.first(page, f"//img[{htmlparse.has_class('mainimage')}]")
+        if main_img is not None and main_img.get("src") and not main_img.get("src").startswith("data:"):
+            href = urljoin(listing_url, main_img.get("src"))
             urls.append(href)
         # Carousel images
-        car_items = soup.find_all("div", class_="carousel-item")
-        for c in car_items:
-            img = c.find("img", class_="thumb")
-            if img and img.get("src"):
-                thumb_url = img["src"]
+        for c in htmlparse.select(page, f"//div[{htmlparse.has_class('carousel-item')}]"):
+            img = htmlparse.first(c, f".//img[{htmlparse.has_class('thumb')}]")
+            if img is not None and img.get("src"):
+                thumb_url = img.get("src")
                 full_url = thumb_url.replace("/TH_", "/")
                 full_url = urljoin(listing_url, full_url)
                 urls.append(full_url)
@@ -157,7 +247,9 @@ def extract_image_urls_from_page(listing_url: str, dealer: str = "jasper", conta
     elif dealer == "fyda":
         from selenium import webdriver
         from selenium.webdriver.common.by import By
-        import time
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException
 
         def get_driver():
             opts = webdriver.ChromeOptions()
@@ -178,8 +270,23 @@ def extract_image_urls_from_page(listing_url: str, dealer: str = "jasper", conta
         driver = None
         try:
             driver = get_driver()
+            ratelimit.acquire(listing_url)
+            started = time.perf_counter()
             driver.get(listing_url)
-            time.sleep(5)
+            # done as soon as the gallery (or Fyda's bot wall) is on the page
+            try:
+                WebDriverWait(driver, 30).until(EC.any_of(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "div.galleryImages img")),
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "div.background-image")),
+                    lambda d: "Pardon Our Interruption" in d.page_source,
+                ))
+            except TimeoutException:
+                log.debug("no gallery after wait", url=listing_url)
+            blocked = "Pardon Our Interruption" in driver.page_source
+            ratelimit.observe(listing_url, latency=time.perf_counter() - started, blocked=blocked)
+            if blocked:
+                log.warning("fyda bot wall on image page", url=listing_url)
+                return []
             # Collect URLs from div.background-image (if any)
             for div in driver.find_elements(By.CSS_SELECTOR, "div.background-image"):
                 s = div.get_attribute("style")
@@ -195,11 +302,11 @@ def extract_image_urls_from_page(listing_url: str, dealer: str = "jasper", conta
 
             # Remove duplicates
             image_urls = sorted(set(image_urls))
-            print(f"Extracted {len(image_urls)} images for {listing_url}")
+            log.debug("extracted image urls", url=listing_url, count=len(image_urls))
             return image_urls
 
         except Exception as e:
-            print(f"Error extracting images for Fyda: {e}")
+            log.warning("fyda image extraction failed", url=listing_url, error=str(e))
             return []
 
         finally:
@@ -207,5 +314,5 @@ def extract_image_urls_from_page(listing_url: str, dealer: str = "jasper", conta
                 driver.quit()
     
     else:
-        print(f"No extraction logic for dealer: {dealer}")
+        log.warning("no image extraction logic for dealer", dealer=dealer)
         return []
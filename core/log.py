@@ -0,0 +1,180 @@
+# core/log.py
+"""
+Leveled, structured, rate-limited logging on top of the stdlib `logging`.
+
+    from core.log import get_logger
+    log = get_logger(__name__)
+
+    log.info("fetched listing", url=url, bytes=len(text))
+    log.debug("gpt request", messages=lambda: messages)   # callable: only evaluated at DEBUG
+
+Fields are kept separate from the message, so nothing is formatted unless the
+level is enabled. Passing a lambda for a big payload (page text, message lists,
+response headers) means it is not even built otherwise.
+
+Environment:
+    LOG_LEVEL        DEBUG / INFO (default) / WARNING / ERROR
+    LOG_FORMAT       text (default) or json (one object per line, for CloudWatch Insights)
+    LOG_RATE_LIMIT   max records per message per LOG_RATE_WINDOW seconds (default 50 / 10s);
+                     the next record that gets through carries "suppressed": <n>.
+                     0 disables limiting. Warnings and errors are never dropped.
+    LOG_MAX_FIELD    truncate each field value to this many characters (default 2000)
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+
+_configured = False
+_config_lock = threading.Lock()
+
+
+class RateLimitFilter(logging.Filter):
+    """Drop INFO/DEBUG records past `limit` per (logger, message) in each `window` seconds."""
+
+    def __init__(self, limit, window):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._buckets = {}   # key -> [window_start, count, suppressed]
+
+    def filter(self, record):
+        if not self.limit or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or now - bucket[0] >= self.window:
+                suppressed = bucket[2] if bucket else 0
+                self._buckets[key] = [now, 1, 0]
+            elif bucket[1] < self.limit:
+                bucket[1] += 1
+                suppressed = 0
+            else:
+                bucket[2] += 1
+                return False
+        if suppressed:
+            record.fields = dict(getattr(record, "fields", {}), suppressed=suppressed)
+        return True
+
+
+def _render(value, max_len):
+    if callable(value):
+        value = value()
+    if not isinstance(value, (str, int, float, bool)) and value is not None:
+        try:
+            value = json.dumps(value, default=str, ensure_ascii=False)
+        except (TypeError, ValueError):
+            value = repr(value)
+    if isinstance(value, str) and len(value) > max_len:
+        value = value[:max_len] + f"...(+{len(value) - max_len} chars)"
+    return value
+
+
+class TextFormatter(logging.Formatter):
+
+    def __init__(self, max_len):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.max_len = max_len
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={_render(v, self.max_len)}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+
+    def __init__(self, max_len):
+        super().__init__()
+        self.max_len = max_len
+
+    def format(self, record):
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for k, v in (getattr(record, "fields", None) or {}).items():
+            out[k] = _render(v, self.max_len)
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at emit time (so contextlib.redirect_stdout works)."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def configure(level=None, fmt=None, stream=None):
+    """Install the handler on the root logger (once; later calls only change the level)."""
+    global _configured
+    with _config_lock:
+        root = logging.getLogger()
+        level = (level or os.environ.get("LOG_LEVEL", "INFO")).upper()
+        root.setLevel(level)
+        if _configured:
+            return
+        max_len = int(os.environ.get("LOG_MAX_FIELD", "2000"))
+        fmt = (fmt or os.environ.get("LOG_FORMAT", "text")).lower()
+        handler = logging.StreamHandler(stream) if stream else _StdoutHandler()
+        handler.setFormatter(JsonFormatter(max_len) if fmt == "json" else TextFormatter(max_len))
+        handler.addFilter(RateLimitFilter(int(os.environ.get("LOG_RATE_LIMIT", "50")),
+                                          float(os.environ.get("LOG_RATE_WINDOW", "10"))))
+        root.addHandler(handler)
+        # urllib3/botocore are chatty at DEBUG and not what we are after
+        for noisy in ("urllib3", "botocore", "boto3", "s3transfer", "selenium", "seleniumwire", "PIL"):
+            logging.getLogger(noisy).setLevel(max(logging.INFO, root.level))
+        _configured = True
+
+
+class StructLogger:
+    """`log.info("msg", key=value, ...)`; the level check happens before any formatting."""
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def _log(self, level, msg, fields, exc_info=False):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, msg, exc_info=exc_info, extra={"fields": fields}, stacklevel=3)
+
+    def is_debug(self):
+        return self._logger.isEnabledFor(logging.DEBUG)
+
+    def debug(self, msg, **fields):
+        self._log(logging.DEBUG, msg, fields)
+
+    def info(self, msg, **fields):
+        self._log(logging.INFO, msg, fields)
+
+    def warning(self, msg, **fields):
+        self._log(logging.WARNING, msg, fields)
+
+    def error(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields)
+
+    def exception(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields, exc_info=True)
+
+
+def get_logger(name):
+    if not _configured:
+        configure()
+    return StructLogger(logging.getLogger(name))
@@ -0,0 +1,149 @@
+# core/metrics.py
+"""
+Lightweight per-listing stage timing.
+
+    with metrics.stage("fetch", dealer="jasper", url=url) as rec:
+        text = get_vehicle_page_html(url)
+        rec["bytes"] = len(text or "")
+
+Code running inside a stage (same thread) can add to its record without
+being handed it:
+    metrics.note_usage(response)   # OpenAI prompt/completion tokens
+    metrics.note_retry()           # a fallback / second attempt
+
+Records are kept in memory for the process; write_report() dumps them as
+<prefix>.json (records + summary) and <prefix>.csv, and format_summary()
+gives the per-stage p50/p90/p99 table printed at the end of run_all.
+"""
+
+import os
+import csv
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+RECORD_FIELDS = ["dealer", "url", "stage", "ok", "seconds", "bytes", "tokens_in", "tokens_out", "retries", "started"]
+
+_records = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+@contextmanager
+def stage(name, dealer="", url=""):
+    rec = {"dealer": dealer, "url": url, "stage": name, "ok": True, "seconds": 0.0,
+           "bytes": 0, "tokens_in": 0, "tokens_out": 0, "retries": 0, "started": time.time()}
+    parent = getattr(_local, "current", None)
+    _local.current = rec
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    except BaseException:
+        rec["ok"] = False
+        raise
+    finally:
+        rec["seconds"] = round(time.perf_counter() - t0, 4)
+        _local.current = parent
+        with _lock:
+            _records.append(rec)
+
+
+def _current():
+    return getattr(_local, "current", None)
+
+
+def note_usage(response):
+    """Add the token counts of an OpenAI response (0.x dict or 1.x object) to the current stage."""
+    rec = _current()
+    if rec is None or response is None:
+        return
+    usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+    if not usage:
+        return
+    get = usage.get if isinstance(usage, dict) else (lambda k: getattr(usage, k, 0))
+    rec["tokens_in"] += get("prompt_tokens") or 0
+    rec["tokens_out"] += get("completion_tokens") or 0
+
+
+def note_retry(count=1):
+    rec = _current()
+    if rec is not None:
+        rec["retries"] += count
+
+
+def note_bytes(count):
+    rec = _current()
+    if rec is not None:
+        rec["bytes"] += count
+
+
+def records(dealer=None):
+    with _lock:
+        return [dict(r) for r in _records if dealer is None or r["dealer"] == dealer]
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers (pct in 0..100)."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(recs):
+    """{stage: {count, failed, total_s, p50_s, p90_s, p99_s, max_s, bytes, tokens_in, tokens_out, retries}}"""
+    by_stage = {}
+    for r in recs:
+        by_stage.setdefault(r["stage"], []).append(r)
+    summary = {}
+    for name, rows in by_stage.items():
+        secs = [float(r["seconds"]) for r in rows]
+        summary[name] = {
+            "count": len(rows),
+            "failed": sum(1 for r in rows if not r["ok"]),
+            "total_s": round(sum(secs), 3),
+            "p50_s": round(percentile(secs, 50), 3),
+            "p90_s": round(percentile(secs, 90), 3),
+            "p99_s": round(percentile(secs, 99), 3),
+            "max_s": round(max(secs), 3),
+            "bytes": sum(int(r["bytes"]) for r in rows),
+            "tokens_in": sum(int(r["tokens_in"]) for r in rows),
+            "tokens_out": sum(int(r["tokens_out"]) for r in rows),
+            "retries": sum(int(r["retries"]) for r in rows),
+        }
+    return summary
+
+
+def write_report(prefix, recs=None):
+    """Write <prefix>.json and <prefix>.csv. Returns the JSON path."""
+    recs = records() if recs is None else recs
+    parent = os.path.dirname(prefix)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(prefix + ".json", "w", encoding="utf-8") as f:
+        json.dump({"generated": time.time(), "summary": summarize(recs), "records": recs}, f, indent=2)
+    with open(prefix + ".csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=RECORD_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(recs)
+    return prefix + ".json"
+
+
+def load_report(path):
+    """Records from a report written by another process (e.g. the run_scraper subprocess)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("records", [])
+
+
+def format_summary(summary):
+    cols = ["count", "failed", "total_s", "p50_s", "p90_s", "p99_s", "max_s", "bytes", "tokens_in", "tokens_out", "retries"]
+    lines = [f"{'stage':<14}" + "".join(f"{c:>11}" for c in cols)]
+    for name, row in sorted(summary.items(), key=lambda kv: -kv[1]["total_s"]):
+        lines.append(f"{name:<14}" + "".join(f"{row[c]:>11}" for c in cols))
+    return "\n".join(lines)
@@ -1,5 +1,7 @@
-import openai
-import json
+from core import metrics, openai_utils
+from core.log import get_logger
+
+log = get_logger(__name__)
 
 def complete_diagram_info(diagram_info, compliant_info):
     """
@@ -134,26 +136,15 @@ def complete_diagram_info(diagram_info, compliant_info):
         {"role": "system", "content": f"You are a vehicle data extraction assistant. Extract information from the text and return it in a JSON format with these fields:{myfields}"},
         {"role": "user", "content": f"Extract vehicle information from this text: {mytext}"}
     ]
-    print("mymessages")
-    print(mymessages)
+    log.debug("diagram request", messages=lambda: mymessages)
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=mymessages,
-            temperature=0.1,
-            max_tokens=1000
-        )
-        extracted_info = response.choices[0].message.content
-        print("OpenAI debug output:")
-        try:
-            extracted_info = json.loads(extracted_info)
-            extracted_info = {k: '' if v is None else v for k, v in extracted_info.items()}
-            extracted_info.update(diagram_info)
-            return extracted_info
-        except json.JSONDecodeError:
-            print("Warning: Response was not valid JSON")
+        extracted_info = openai_utils.complete_json(mymessages, openai_utils.prompt_fields(myfields), task="diagram")
+        if extracted_info is None:
+            log.warning("diagram response was not valid JSON")
             return None
+        extracted_info.update(diagram_info)
+        return extracted_info
     except Exception as e:
-        print(f"Error during extraction: {str(e)}")
+        log.error("diagram extraction failed", error=str(e))
         return None
     return ''
@@ -0,0 +1,265 @@
+# core/openai_batch.py
+"""
+OpenAI Batch API for bulk runs: half the per-token price and its own rate
+limits, in exchange for answers that arrive within the batch window instead
+of seconds.
+
+A BatchJob is used in two passes over the same listings (pipeline/batch.py):
+
+    job = BatchJob("jasper-vehicle")
+    for url, text in pages.items():
+        with job.collecting(url):
+            module.extract_vehicle_info(text)      # prompt recorded, not sent
+    job.run()                                      # upload, create batch, poll, download
+    for url, text in pages.items():
+        with job.answering(url):
+            module.extract_vehicle_info(text)      # same prompt -> the batch's answer
+
+While collecting, openai_utils.complete_json records its first request
+(model, messages, max_tokens, response_format) under the current listing and
+returns an all-empty object instead of calling the API. While answering, a
+request identical to a collected one gets that listing's answer from the
+batch output. Anything else (the field re-asks and escalations of
+complete_json, requests whose batch line failed, a batch that never finished)
+goes to the API synchronously as usual, so a run always completes.
+
+Each line's custom_id is "<listing>|<task>|<n>", so the output file can be
+read back per listing.
+
+A status check or download that fails is retried on the next poll, with a
+growing pause; it never sends the batch's prompts again. Only requests that
+were never submitted (upload or create failed) go synchronous. A listing
+whose requests are in a batch that has not finished by LLM_BATCH_TIMEOUT is
+left out of the run (deferred()), not re-asked synchronously.
+
+With a run journal (pipeline/journal.py), every submission is recorded as
+{"url": "batch:<label>", "stage": "batch", "data": {"batches": {batch_id: [custom_ids]}}}
+before the job is polled. A resumed run polls those batches again instead of
+paying for the same prompts twice, and submits only requests none of them
+carried, so `--resume` picks up batches a killed or timed-out run left
+behind. Jobs go to the URL and key of the default LLM backend
+(openai_utils.get_backend()); one without a Batch API fails at submission and
+the run goes synchronous.
+
+Environment:
+    LLM_BATCH_POLL      seconds between status checks (default 30)
+    LLM_BATCH_TIMEOUT   stop waiting after this many seconds (default 7200, so one task
+                        does not sit for the whole 24 h window); unfinished batches are
+                        left for --resume
+    LLM_BATCH_WINDOW    completion_window sent to the API (default "24h")
+    LLM_BATCH_MAX       requests per batch file; bigger jobs are split (default 50000)
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+import contextlib
+
+import requests
+
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+POLL_S = float(os.getenv("LLM_BATCH_POLL", "30"))
+TIMEOUT_S = float(os.getenv("LLM_BATCH_TIMEOUT", "7200"))
+# longest pause between polls after repeated status/download errors
+MAX_BACKOFF_S = 600
+WINDOW = os.getenv("LLM_BATCH_WINDOW", "24h")
+MAX_REQUESTS = int(os.getenv("LLM_BATCH_MAX", "50000"))
+ENDPOINT = "/v1/chat/completions"
+FINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+_local = threading.local()
+
+
+def current():
+    """(job, listing, mode) for this thread, or None outside collecting()/answering()."""
+    return getattr(_local, "active", None)
+
+
+def request_key(model, messages, max_tokens):
+    """What makes two requests the same question."""
+    blob = json.dumps([model, messages, max_tokens], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+class BatchJob:
+
+    def __init__(self, label, journal=None):
+        self.label = label
+        self.journal = journal
+        self._lock = threading.Lock()
+        self.lines = []        # batch input lines, in collection order
+        self.pending = {}      # custom_id -> (listing, request key)
+        self.answers = {}      # listing -> {request key: response body}
+        self._counts = {}      # listing -> requests collected for it
+        self.failed = 0
+        self.batches = {}      # batch_id -> custom_ids submitted in it
+        self.unfinished = set()  # custom_ids in batches still running when run() stopped waiting
+
+    @contextlib.contextmanager
+    def _active(self, listing, mode):
+        previous = current()
+        _local.active = (self, listing, mode)
+        try:
+            yield self
+        finally:
+            _local.active = previous
+
+    def collecting(self, listing):
+        return self._active(listing, "collect")
+
+    def answering(self, listing):
+        return self._active(listing, "answer")
+
+    def add(self, listing, task, body):
+        """Record one chat request body for `listing`."""
+        key = request_key(body["model"], body["messages"], body.get("max_tokens"))
+        with self._lock:
+            n = self._counts[listing] = self._counts.get(listing, -1) + 1
+            custom_id = f"{listing}|{task}|{n}"
+            self.pending[custom_id] = (listing, key)
+            self.lines.append({"custom_id": custom_id, "method": "POST", "url": ENDPOINT, "body": body})
+
+    def answer(self, listing, model, messages, max_tokens):
+        """The batch's response body for this exact request of `listing`, or None."""
+        with self._lock:
+            return self.answers.get(listing, {}).get(request_key(model, messages, max_tokens))
+
+    # -- API --
+
+    @staticmethod
+    def _url(path):
+        from core.openai_utils import get_backend  # openai_utils imports this module
+        return get_backend().api_base.rstrip("/") + path
+
+    @staticmethod
+    def _headers():
+        from core.openai_utils import get_backend
+        return {"Authorization": f"Bearer {get_backend().api_key}"}
+
+    def _upload(self, lines):
+        data = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+        resp = requests.post(self._url("/files"), headers=self._headers(), data={"purpose": "batch"},
+                             files={"file": (f"{self.label}.jsonl", data, "application/jsonl")}, timeout=300)
+        resp.raise_for_status()
+        return resp.json()["id"]
+
+    def _create(self, file_id):
+        resp = requests.post(self._url("/batches"), headers=self._headers(), timeout=60,
+                             json={"input_file_id": file_id, "endpoint": ENDPOINT,
+                                   "completion_window": WINDOW, "metadata": {"run": self.label}})
+        resp.raise_for_status()
+        return resp.json()["id"]
+
+    def _status(self, batch_id):
+        resp = requests.get(self._url(f"/batches/{batch_id}"), headers=self._headers(), timeout=60)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _download(self, file_id):
+        resp = requests.get(self._url(f"/files/{file_id}/content"), headers=self._headers(), timeout=300)
+        resp.raise_for_status()
+        return [json.loads(line) for line in resp.text.splitlines() if line.strip()]
+
+    def _merge(self, records):
+        with self._lock:
+            for rec in records:
+                listing, key = self.pending.get(rec.get("custom_id"), (None, None))
+                response = rec.get("response") or {}
+                if listing is None or rec.get("error") or response.get("status_code") != 200:
+                    self.failed += 1
+                    continue
+                self.answers.setdefault(listing, {})[key] = response.get("body")
+
+    def deferred(self, listing):
+        """True if some of the listing's requests are in a batch that has not finished yet."""
+        with self._lock:
+            return any(self.pending[cid][0] == listing for cid in self.unfinished if cid in self.pending)
+
+    # -- journal --
+
+    @property
+    def _journal_key(self):
+        return f"batch:{self.label}"
+
+    def _resume(self):
+        """Batches an interrupted run of this job submitted (from the journal)."""
+        if not (self.journal and self.journal.done(self._journal_key, "batch")):
+            return []
+        saved = self.journal.data(self._journal_key, "batch") or {}
+        self.batches = {batch_id: set(ids) for batch_id, ids in saved.get("batches", {}).items()}
+        if self.batches:
+            log.info("resuming submitted batches", job=self.label, batches=list(self.batches),
+                     requests=sum(len(ids) for ids in self.batches.values()))
+        return list(self.batches)
+
+    def _record_submission(self):
+        if self.journal:
+            self.journal.record(self._journal_key, "batch",
+                                {"batches": {batch_id: sorted(ids) for batch_id, ids in self.batches.items()}})
+
+    def _submit(self):
+        """Upload and create batches for requests no batch carries yet -> their batch IDs."""
+        submitted = set().union(*self.batches.values())
+        todo = [line for line in self.lines if line["custom_id"] not in submitted]
+        created = []
+        try:
+            for i in range(0, len(todo), MAX_REQUESTS):
+                chunk = todo[i:i + MAX_REQUESTS]
+                batch_id = self._create(self._upload(chunk))
+                self.batches[batch_id] = {line["custom_id"] for line in chunk}
+                # journaled before polling, so a killed task's --resume finds it
+                self._record_submission()
+                created.append(batch_id)
+        except (requests.RequestException, KeyError, ValueError) as e:
+            log.error("batch submission failed; unsubmitted requests go synchronous", job=self.label, error=str(e))
+        if created:
+            log.info("batch submitted", job=self.label, requests=sum(len(self.batches[b]) for b in created),
+                     batches=created)
+        return created
+
+    def _collect(self, batch_id):
+        """Merge a batch's output if it is done. True when it no longer needs polling."""
+        status = self._status(batch_id)
+        if status.get("status") not in FINAL_STATES:
+            return False
+        # download everything before merging, so a failed download can simply be retried
+        records = [rec for file_key in ("output_file_id", "error_file_id") if status.get(file_key)
+                   for rec in self._download(status[file_key])]
+        self._merge(records)
+        if status.get("status") != "completed":
+            log.warning("batch did not complete", job=self.label, batch=batch_id, status=status.get("status"))
+        return True
+
+    def run(self):
+        """Submit everything collected, wait for the batches and merge their output. Never raises."""
+        if not self.lines:
+            return
+        started = time.monotonic()
+        waiting = self._resume() + self._submit()
+        errors = 0
+        while waiting:
+            for batch_id in list(waiting):
+                try:
+                    if self._collect(batch_id):
+                        waiting.remove(batch_id)
+                    errors = 0
+                except (requests.RequestException, KeyError, ValueError) as e:
+                    errors += 1
+                    log.warning("batch poll failed; retrying", job=self.label, batch=batch_id, error=str(e),
+                                errors=errors)
+            if not waiting:
+                break
+            if time.monotonic() - started > TIMEOUT_S:
+                self.unfinished = set().union(*(self.batches[b] for b in waiting))
+                log.warning("stopped waiting for batch; its listings are left for --resume", job=self.label,
+                            batches=waiting, requests=len(self.unfinished))
+                break
+            time.sleep(min(POLL_S * 2 ** min(errors, 10), max(POLL_S, MAX_BACKOFF_S)))
+        answered = sum(len(v) for v in self.answers.values())
+        log.info("batch finished", job=self.label, requests=len(self.lines), answered=answered,
+                 failed=self.failed, seconds=round(time.monotonic() - started, 1))
@@ -0,0 +1,145 @@
+# core/openai_hedge.py
+"""
+Hedged OpenAI calls: a call still running after the LLM_HEDGE_PCT percentile
+of recent latency for its task and model gets an identical duplicate, and
+whichever answers first is used. An occasional 30-60 s call then costs
+about the p95 plus one normal call, rather than holding a listing (or
+run_scraper's serial loop) for a minute.
+
+    resp = openai_hedge.call(task, model, lambda: create(body), on_extra=note_loser)
+
+The losing request cannot be cancelled (openai 0.x has no way to abort it),
+so it is paid for: on_extra receives its response when it lands, so
+llm_stats() counts its tokens and cost. Extra spend is capped per run. Hedges
+never exceed LLM_HEDGE_BUDGET of the calls made so far. Nothing is hedged
+until LLM_HEDGE_MIN_SAMPLES latencies exist for that task and model.
+
+stats() gives, per task, the calls, how many were hedged, how many the
+duplicate won, and the seconds saved (the slow original's finish minus the
+duplicate's, once the original lands).
+
+Environment:
+    LLM_HEDGE=1              turn hedging on (default off)
+    LLM_HEDGE_PCT            latency percentile that triggers the duplicate (default 95)
+    LLM_HEDGE_BUDGET         duplicates as a share of calls, per run (default 0.05)
+    LLM_HEDGE_MIN_SAMPLES    latencies needed before hedging (default 20)
+    LLM_HEDGE_WINDOW         recent latencies kept per task and model (default 200)
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, FIRST_COMPLETED, TimeoutError, wait
+
+from core import metrics
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+PCT = float(os.getenv("LLM_HEDGE_PCT", "95"))
+BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.05"))
+MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+
+_lock = threading.Lock()
+_recent = {}     # (task, model) -> deque of seconds
+_stats = {}      # task -> {"calls", "hedged", "wins", "saved_s"}
+
+
+def enabled():
+    return os.getenv("LLM_HEDGE", "0") == "1"
+
+
+def _count(task, key, n=1):
+    with _lock:
+        entry = _stats.setdefault(task, {"calls": 0, "hedged": 0, "wins": 0, "saved_s": 0.0})
+        entry[key] += n
+
+
+def stats():
+    """{task: {"calls", "hedged", "hedge_rate", "wins", "saved_s"}}"""
+    with _lock:
+        return {task: {"calls": e["calls"], "hedged": e["hedged"],
+                       "hedge_rate": round(e["hedged"] / e["calls"], 3) if e["calls"] else 0.0,
+                       "wins": e["wins"], "saved_s": round(e["saved_s"], 3)}
+                for task, e in _stats.items()}
+
+
+def _note_latency(task, model, seconds):
+    with _lock:
+        _recent.setdefault((task, model), deque(maxlen=WINDOW)).append(seconds)
+
+
+def threshold(task, model):
+    """Seconds after which a call gets a duplicate, or None while there are too few samples."""
+    with _lock:
+        samples = list(_recent.get((task, model), ()))
+    if len(samples) < MIN_SAMPLES:
+        return None
+    return metrics.percentile(samples, PCT)
+
+
+def _allowed():
+    with _lock:
+        calls = sum(e["calls"] for e in _stats.values())
+        hedged = sum(e["hedged"] for e in _stats.values())
+        return hedged + 1 <= BUDGET * calls
+
+
+def _in_thread(fn):
+    fut = Future()
+
+    def run():
+        try:
+            fut.set_result(fn())
+        except Exception as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=run, daemon=True, name="llm-call").start()
+    return fut
+
+
+def call(task, model, fn, on_extra=None):
+    """fn() (one API request), hedged when enabled. Raises fn's exception if every attempt failed."""
+    started = time.perf_counter()
+    after = threshold(task, model) if enabled() else None
+    _count(task, "calls")
+    if after is None:
+        resp = fn()
+        _note_latency(task, model, time.perf_counter() - started)
+        return resp
+
+    primary = _in_thread(fn)
+    try:
+        resp = primary.result(timeout=after)
+        _note_latency(task, model, time.perf_counter() - started)
+        return resp
+    except TimeoutError:
+        pass
+    if not _allowed():
+        resp = primary.result()
+        _note_latency(task, model, time.perf_counter() - started)
+        return resp
+
+    _count(task, "hedged")
+    log.info("slow LLM call; sending a duplicate", task=task, model=model, after_s=round(after, 2))
+    duplicate = _in_thread(fn)
+    attempts = [primary, duplicate]
+    done, pending = wait(attempts, return_when=FIRST_COMPLETED)
+    answered = [f for f in attempts if f in done and f.exception() is None]
+    if not answered and pending:
+        wait(pending)
+        answered = [f for f in attempts if f.exception() is None]
+    if not answered:
+        return primary.result()
+    winner = answered[0]
+    loser = duplicate if winner is primary else primary
+    won_at = time.perf_counter()
+    _note_latency(task, model, won_at - started)
+    if winner is duplicate:
+        _count(task, "wins")
+        primary.add_done_callback(lambda f: _count(task, "saved_s", time.perf_counter() - won_at))
+    if on_extra:
+        loser.add_done_callback(lambda f: on_extra(f.result()) if f.exception() is None else None)
+    return winner.result()
@@ -0,0 +1,230 @@
+# core/openai_pack.py
+"""
+Several listings in one chat request, so the system prompt (about 1 KB for
+every dealer's vehicle extraction) is paid once per group instead of once
+per listing.
+
+openai_utils.complete_json hands its first request to pack() when packing is
+on for the task. Requests with the same model, system prompt and fields that
+arrive within LLM_PACK_WAIT_MS of each other are grouped (up to K, and up to
+LLM_PACK_TOKENS of listing text) and sent as:
+
+    system: <the shared system prompt> + PACK_INSTRUCTIONS
+    user:   ### id: 1
+            <listing 1's user message>
+            ### id: 2
+            ...
+
+The answer {"items": [{"id": "1", ...fields}, ...]} is split by id and each
+caller gets its own item back as the JSON text of a single answer, and goes
+on with the usual validation and field re-asks. A caller whose item is
+missing or not an object (or whose group request failed) gets None and sends
+its listing on its own, so one malformed item never costs the others.
+
+The grouping thread works like core/cpu.py's batcher: callers block on a
+Future while the group fills.
+
+Packing only pays when several calls are in flight at once: the orchestrator's
+pool and staged engines with BUDGET_LLM >= 2. With BUDGET_LLM=1, or on
+run_scraper's one-listing-at-a-time path (which calls disable()), a group can
+never fill, so pack() returns None at once instead of making every call wait
+LLM_PACK_WAIT_MS for nothing.
+
+Environment:
+    LLM_PACK            listings per request (default 1: packing off)
+    LLM_PACK_<TASK>     the same for one task, e.g. LLM_PACK_VEHICLE=4
+    LLM_PACK_TOKENS     listing text per request, estimated at 4 characters a token (default 6000);
+                        a longer listing is sent on its own
+    LLM_PACK_WAIT_MS    how long a group waits to fill (default 250)
+    LLM_PACK_MAX_TOKENS answer budget of a packed request (default 4096)
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+TOKEN_BUDGET = int(os.getenv("LLM_PACK_TOKENS", "6000"))
+WAIT_S = float(os.getenv("LLM_PACK_WAIT_MS", "250")) / 1000
+MAX_TOKENS = int(os.getenv("LLM_PACK_MAX_TOKENS", "4096"))
+ITEM_HEADER = "### id: {id}"
+PACK_INSTRUCTIONS = """
+
+You will be given several separate listings. Each one starts with a line "### id: <id>".
+Apply the instructions above to each listing on its own, never mixing values between listings.
+Return one JSON object {"items": [...]} with one object per listing, in the same order.
+Each object has an "id" key holding that listing's id, plus every field described above."""
+
+_stats_lock = threading.Lock()
+_stats = {}      # task -> {"requests", "items", "isolated"}
+_packer = None
+_packer_lock = threading.Lock()
+_disabled = None   # why packing is off for this process, once disable() is called
+
+
+def size_for(task):
+    """K for `task` (1 means no packing)."""
+    return max(1, int(os.getenv(f"LLM_PACK_{task.upper()}") or os.getenv("LLM_PACK") or "1"))
+
+
+def disable(reason):
+    """Turn packing off for this process (a caller that never has two LLM calls in flight)."""
+    global _disabled
+    if _disabled is None and any(size_for(task) > 1 for task in ("vehicle", "diagram")):
+        log.info("LLM packing off", reason=reason)
+    _disabled = reason
+
+
+def _concurrent():
+    """Whether two LLM calls can be in flight at once in this process."""
+    from core.concurrency import get_budget
+
+    return _disabled is None and get_budget().limits.get("llm", 1) > 1
+
+
+def estimate_tokens(text):
+    return len(text) // 4
+
+
+def _count(task, key, n=1):
+    with _stats_lock:
+        entry = _stats.setdefault(task, {"requests": 0, "items": 0, "isolated": 0})
+        entry[key] += n
+
+
+def stats():
+    """{task: {"requests": packed requests sent, "items": listings in them, "isolated": items re-sent alone}}"""
+    with _stats_lock:
+        return {task: dict(entry) for task, entry in _stats.items()}
+
+
+def packed_messages(system, users):
+    """The group request: shared system prompt + instructions, every listing under its id."""
+    body = "\n\n".join(ITEM_HEADER.format(id=i) + "\n" + user for i, user in enumerate(users, start=1))
+    return [{"role": "system", "content": system + PACK_INSTRUCTIONS}, {"role": "user", "content": body}]
+
+
+def split_items(raw, n):
+    """Packed answer -> list of n item dicts (None where the item is missing or malformed)."""
+    from core.openai_utils import parse_json_object  # openai_utils imports this module
+
+    obj = parse_json_object(raw)
+    items = obj.get("items") if obj else None
+    if items is None and raw:
+        try:
+            items = json.loads(raw)
+        except json.JSONDecodeError:
+            items = None
+    out = [None] * n
+    if not isinstance(items, list):
+        return out
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            i = int(str(item.get("id", "")).strip()) - 1
+        except ValueError:
+            continue
+        if 0 <= i < n and out[i] is None:
+            out[i] = {k: v for k, v in item.items() if k != "id"}
+    return out
+
+
+class _Packer:
+
+    def __init__(self, send):
+        # send(task, model, messages, fields, numeric, max_tokens) -> (content, finish_reason, usage)
+        self.send = send
+        self.inbox = queue.Queue()
+        threading.Thread(target=self._dispatch, daemon=True, name="llm-packer").start()
+
+    def submit(self, key, request):
+        fut = Future()
+        self.inbox.put((key, request, fut))
+        return fut
+
+    def _dispatch(self):
+        groups = {}   # key -> {"deadline", "tokens", "members": [(request, fut)]}
+        while True:
+            timeout = min((g["deadline"] for g in groups.values()), default=None)
+            try:
+                key, request, fut = self.inbox.get(
+                    timeout=None if timeout is None else max(0.0, timeout - time.monotonic()))
+            except queue.Empty:
+                key = None
+            if key is not None:
+                group = groups.get(key)
+                if group and group["tokens"] + request["tokens"] > TOKEN_BUDGET:
+                    self._flush(key, groups.pop(key))
+                    group = None
+                if group is None:
+                    group = groups[key] = {"deadline": time.monotonic() + WAIT_S, "tokens": 0, "members": []}
+                group["tokens"] += request["tokens"]
+                group["members"].append((request, fut))
+                if len(group["members"]) >= request["k"]:
+                    self._flush(key, groups.pop(key))
+            now = time.monotonic()
+            for k in [k for k, g in groups.items() if g["deadline"] <= now]:
+                self._flush(k, groups.pop(k))
+
+    def _flush(self, key, group):
+        threading.Thread(target=self._send_group, args=(key, group["members"]), daemon=True,
+                         name="llm-pack-send").start()
+
+    def _send_group(self, key, members):
+        task, model, system, fields, numeric, max_tokens = key
+        if len(members) == 1:
+            # nobody to share the prompt with: the caller sends it as usual
+            members[0][1].set_result(None)
+            return
+        messages = packed_messages(system, [request["user"] for request, _ in members])
+        _count(task, "requests")
+        _count(task, "items", len(members))
+        try:
+            raw, finish, usage = self.send(task, model, messages, list(fields), numeric,
+                                           min(MAX_TOKENS, max_tokens * len(members)))
+            items = split_items(raw, len(members)) if finish != "length" else [None] * len(members)
+        except Exception as e:
+            log.warning("packed request failed; sending its listings one by one", task=task,
+                        items=len(members), error=str(e))
+            items, usage = [None] * len(members), {}
+        share = {k: (usage.get(k) or 0) // len(members) for k in ("prompt_tokens", "completion_tokens")}
+        isolated = sum(1 for item in items if item is None)
+        if isolated:
+            log.info("packed items unusable; retrying them one by one", task=task, isolated=isolated,
+                     items=len(members))
+            _count(task, "isolated", isolated)
+        for (_, fut), item in zip(members, items):
+            fut.set_result(None if item is None else (json.dumps(item, ensure_ascii=False), share))
+
+
+def _get_packer(send):
+    global _packer
+    with _packer_lock:
+        if _packer is None:
+            _packer = _Packer(send)
+        return _packer
+
+
+def pack(send, task, model, messages, fields, numeric, max_tokens):
+    """
+    This request's answer from a packed group: (item JSON text, its share of the
+    group's token usage), or None when the caller should send it on its own.
+    Only [system, user] requests are packed.
+    """
+    k = size_for(task)
+    if k < 2 or not _concurrent() or len(messages) != 2 or [m.get("role") for m in messages] != ["system", "user"]:
+        return None
+    user = messages[1]["content"]
+    tokens = estimate_tokens(user)
+    if tokens > TOKEN_BUDGET:
+        return None
+    key = (task, model, messages[0]["content"], tuple(fields), tuple(numeric), max_tokens)
+    fut = _get_packer(send).submit(key, {"user": user, "tokens": tokens, "k": k})
+    return fut.result()
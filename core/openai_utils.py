@@ -1,17 +1,548 @@
 # core/openai_utils.py
+"""
+OpenAI helpers shared by the scrapers.
+
+complete_json() is how every extraction (vehicle fields, diagram fields) talks
+to the model:
+
+    info = complete_json(messages, llm_vehicle_fields, numeric=numeric_vehicle_attributes)
+
+  * the request asks for a JSON object (LLM_RESPONSE_FORMAT: "json_object" JSON
+    mode, the default; "json_schema" strict structured output built from the
+    field list, for models that support it; "text" to send neither);
+  * the answer is parsed and checked locally: every field present, one plain
+    value each, a digit in numeric fields;
+  * fields that are missing or invalid are asked for again, on their own, in the
+    same conversation (LLM_FIELD_RETRIES rounds, default 1) instead of re-running
+    the whole listing; whatever is still wrong after that is left empty;
+  * only an answer that is not a JSON object at all is re-asked in full
+    (LLM_PARSE_RETRIES, default 1) before giving up with None.
+
+Batch mode (core/openai_batch.py, used by the batch engine): inside
+BatchJob.collecting() the first request of each call is recorded instead of
+sent, and inside BatchJob.answering() a request the batch already answered
+is served from its output (billed at batch prices in llm_stats()).
+
+Packing (core/openai_pack.py, LLM_PACK / LLM_PACK_<TASK>): the first request
+of concurrent calls that share a system prompt is sent as one request for K
+listings, and each call gets its own item of the answer back before
+validation. Items that come back unusable are sent again on their own.
+
+Hedging (core/openai_hedge.py, LLM_HEDGE=1): a single call that is still
+running after the LLM_HEDGE_PCT percentile of recent latency gets a duplicate
+and the first answer wins, within a per-run budget of extra calls.
+
+Model routing: each task ("vehicle", "diagram") has a list of models, cheapest
+first. A request starts on the first one and moves to the next only when the
+answer fails: not JSON, cut off at max_tokens, fields that do not validate, or
+(vehicle task) almost every field empty, which means the model did not read
+the page. The re-asks above then go to the stronger model. Escalation is opt-in
+(the default route has one model) and capped per process, since the stronger
+model costs many times more. llm_stats() reports per task and model the calls,
+latency, estimated cost and how often requests escalated.
+
+    LLM_ROUTE                 default route for every task (default "gpt-3.5-turbo"; e.g.
+                              "gpt-3.5-turbo,gpt-4o" to escalate)
+    LLM_ROUTE_<TASK>          route for one task, e.g. LLM_ROUTE_DIAGRAM=gpt-4o-mini
+    LLM_MAX_TOKENS_<TASK>     answer budget per task (default 1000)
+    LLM_ESCALATE_EMPTY        share of empty vehicle fields treated as low confidence (default 0.9)
+    LLM_ESCALATE_MAX          escalations allowed per process (default 50, 0 = no limit); after
+                              that, requests stay on their first model
+
+Backends: a route entry "model@name" goes to backend `name`, a bare "model"
+to LLM_BACKEND (default "openai", the OpenAI API with OPENAI_API_KEY /
+OPENAI_API_BASE). Any OpenAI-compatible server works, e.g. a local
+llama.cpp or vLLM server for a bulk backfill:
+
+    LLM_BACKEND_LOCAL_URL=http://localhost:8080/v1 LLM_BACKEND_LOCAL_CONCURRENCY=2 \
+    LLM_ROUTE=qwen2.5-7b-instruct@local,gpt-4o  python -m pipeline.run_scraper -s jasper
+
+and the built-in "stub" backend answers in-process, without a network or key
+(LLM_BACKEND=stub; LLM_BACKEND_STUB_HANDLER=bench.fake_openai:answer for
+realistic answers). Each backend reads its own settings:
+
+    LLM_BACKEND_<NAME>_URL          base URL (openai: OPENAI_API_BASE, else the public API)
+    LLM_BACKEND_<NAME>_KEY          API key (openai: OPENAI_API_KEY; others default to "none")
+    LLM_BACKEND_<NAME>_TIMEOUT      seconds before a request is abandoned (default 120)
+    LLM_BACKEND_<NAME>_CONCURRENCY  requests in flight at once (default: only BUDGET_LLM applies)
+    LLM_BACKEND_<NAME>_CACHE        directory of answers keyed by request; a re-extraction of
+                                    unchanged pages is then free (default: no cache)
+    LLM_BACKEND_<NAME>_FORMAT       response format for this backend (default LLM_RESPONSE_FORMAT)
+    LLM_BACKEND_<NAME>_HANDLER      "module:function" answering requests in-process: makes it a stub
+"""
 
 import os
 import re
 import json
+import time
+import hashlib
+import importlib
+import threading
+import contextlib
 import openai
+from core import metrics, openai_batch, openai_hedge, openai_pack
+from core.log import get_logger
+from core.output_fields import llm_vehicle_fields
 from dotenv import load_dotenv
-from typing import Dict
+from typing import Dict, List, Optional
+
+log = get_logger(__name__)
 
-# Load key once
+# OPENAI_API_KEY and friends may come from .env; a missing key is reported when the backend is first used
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY", "")
-if not openai.api_key:
-    raise RuntimeError("OPENAI_API_KEY is not set. Aborting.")
+
+DEFAULT_ROUTE = "gpt-3.5-turbo"
+TASK_MAX_TOKENS = {"vehicle": 1000, "diagram": 1000}
+# USD per 1M tokens (input, output), for the cost estimate in llm_stats()
+# (Batch API answers are billed at BATCH_DISCOUNT of that)
+PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+BATCH_DISCOUNT = 0.5
+ESCALATE_EMPTY = float(os.getenv("LLM_ESCALATE_EMPTY", "0.9"))
+ESCALATE_MAX = int(os.getenv("LLM_ESCALATE_MAX", "50"))
+RESPONSE_FORMAT = os.getenv("LLM_RESPONSE_FORMAT", "json_object")
+FIELD_RETRIES = int(os.getenv("LLM_FIELD_RETRIES", "1"))
+PARSE_RETRIES = int(os.getenv("LLM_PARSE_RETRIES", "1"))
+
+FIELD_NAME_RE = re.compile(r'field name:\s*"([^"]+)"')
+# what models write in a numeric field that has no value
+EMPTY_WORDS = {"n/a", "na", "none", "null", "unknown", "not specified", "not available", "not found", "-", "--"}
+
+_stats_lock = threading.Lock()
+_tiers = {}      # (task, model) -> {"calls", "batch_calls", "cached_calls", "seconds": [...], "tokens_in", ...}
+_requests = {}   # task -> {"requests", "escalated"}
+_escalations = 0
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def stub_answer(body: Dict) -> str:
+    """Default stub handler: an empty value for every field of a json_schema request, else "{}"."""
+    schema = ((body.get("response_format") or {}).get("json_schema") or {}).get("schema") or {}
+    return json.dumps({name: ([] if spec.get("type") == "array" else "")
+                       for name, spec in schema.get("properties", {}).items()})
+
+
+class Backend:
+    """One OpenAI-compatible endpoint (or in-process stub) and its limits, timeout and cache."""
+
+    def __init__(self, name):
+        self.name = name
+        setting = lambda key, default=None: os.getenv(f"LLM_BACKEND_{name.upper()}_{key}") or default
+        self.url = setting("URL", os.getenv("OPENAI_API_BASE") if name == "openai" else None)
+        self.key = setting("KEY", os.getenv("OPENAI_API_KEY") if name == "openai" else "none")
+        self.timeout = float(setting("TIMEOUT", "120"))
+        limit = int(setting("CONCURRENCY", "0"))
+        self.slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+        self.cache_dir = setting("CACHE")
+        self.response_format = setting("FORMAT", RESPONSE_FORMAT)
+        # models this endpoint rejected response_format for; their later calls go without it
+        self.format_rejected = set()
+        handler = setting("HANDLER", "core.openai_utils:stub_answer" if name == "stub" else None)
+        self.handler = None
+        if handler:
+            module, _, func = handler.partition(":")
+            self.handler = getattr(importlib.import_module(module), func)
+        if not self.handler and not self.api_key:
+            log.warning("no API key for LLM backend; its requests will fail", backend=name,
+                        env="OPENAI_API_KEY" if name == "openai" else f"LLM_BACKEND_{name.upper()}_KEY")
+
+    @property
+    def api_base(self):
+        return self.url or openai.api_base
+
+    @property
+    def api_key(self):
+        return self.key or openai.api_key
+
+    def _cache_path(self, body):
+        key = hashlib.sha1(json.dumps(body, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def cached(self, body):
+        """The cached response to exactly this request, or None."""
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(body), "r", encoding="utf-8") as f:
+                return openai.util.convert_to_openai_object(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def store(self, body, resp):
+        if not self.cache_dir:
+            return
+        path = self._cache_path(body)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(resp, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def create(self, body):
+        """One chat completion request (waits for a slot when CONCURRENCY is set)."""
+        with self.slots or contextlib.nullcontext():
+            if self.handler:
+                content = self.handler(body)
+                tokens_in = len(json.dumps(body["messages"])) // 4
+                return openai.util.convert_to_openai_object({
+                    "object": "chat.completion", "model": body["model"],
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": tokens_in, "completion_tokens": len(content) // 4,
+                              "total_tokens": tokens_in + len(content) // 4}})
+            return openai.ChatCompletion.create(api_base=self.api_base, api_key=self.api_key,
+                                                request_timeout=self.timeout, **body)
+
+
+def get_backend(name: Optional[str] = None) -> Backend:
+    """Backend `name` (default LLM_BACKEND, else "openai"), set up from its environment on first use."""
+    name = (name or os.getenv("LLM_BACKEND") or "openai").lower()
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = Backend(name)
+        return _backends[name]
+
+
+def resolve(model: str):
+    """Route entry "model" or "model@backend" -> (Backend, model name sent to it)."""
+    name, _, backend = model.rpartition("@")
+    return (get_backend(backend), name) if name else (get_backend(), model)
+
+
+def route(task: str) -> List[str]:
+    """Models for `task`, cheapest first."""
+    value = os.getenv(f"LLM_ROUTE_{task.upper()}") or os.getenv("LLM_ROUTE") or DEFAULT_ROUTE
+    return [m.strip() for m in value.split(",") if m.strip()]
+
+
+def max_tokens_for(task: str) -> int:
+    return int(os.getenv(f"LLM_MAX_TOKENS_{task.upper()}", TASK_MAX_TOKENS.get(task, 1000)))
+
+
+def _price(model):
+    """(input, output) USD per 1M tokens; only the OpenAI backend bills."""
+    backend, name = resolve(model)
+    return PRICES.get(name, (0.0, 0.0)) if backend.name == "openai" and not backend.handler else (0.0, 0.0)
+
+
+def _note_call(task, model, seconds, resp, batch=False, cached=False):
+    """
+    `seconds` is None for an answer that has no latency of its own (from a batch,
+    the cache, or a losing hedge). A cached answer costs nothing.
+    """
+    usage = (resp.get("usage") if isinstance(resp, dict) else getattr(resp, "usage", None)) or {}
+    get = usage.get if isinstance(usage, dict) else (lambda k: getattr(usage, k, 0))
+    tokens_in, tokens_out = (0, 0) if cached else (get("prompt_tokens") or 0, get("completion_tokens") or 0)
+    price_in, price_out = _price(model)
+    cost = (tokens_in * price_in + tokens_out * price_out) / 1e6 * (BATCH_DISCOUNT if batch else 1.0)
+    with _stats_lock:
+        tier = _tiers.setdefault((task, model), {"calls": 0, "batch_calls": 0, "cached_calls": 0, "seconds": [],
+                                                 "tokens_in": 0, "tokens_out": 0, "cost_usd": 0.0})
+        tier["calls"] += 1
+        tier["batch_calls"] += int(batch)
+        tier["cached_calls"] += int(cached)
+        if seconds is not None:
+            tier["seconds"].append(seconds)
+        tier["tokens_in"] += tokens_in
+        tier["tokens_out"] += tokens_out
+        tier["cost_usd"] += cost
+
+
+def _escalation_left():
+    with _stats_lock:
+        return not ESCALATE_MAX or _escalations < ESCALATE_MAX
+
+
+def _may_escalate():
+    """Take one escalation from the per-process LLM_ESCALATE_MAX allowance. False once it is spent."""
+    global _escalations
+    with _stats_lock:
+        if ESCALATE_MAX and _escalations >= ESCALATE_MAX:
+            if _escalations == ESCALATE_MAX:
+                log.warning("escalation limit reached; requests stay on their first model", limit=ESCALATE_MAX)
+                _escalations += 1  # warn once
+            return False
+        _escalations += 1
+        return True
+
+
+def _note_request(task, escalated):
+    with _stats_lock:
+        req = _requests.setdefault(task, {"requests": 0, "escalated": 0})
+        req["requests"] += 1
+        req["escalated"] += int(escalated)
+
+
+def llm_stats() -> Dict:
+    """
+    {task: {"requests", "escalation_rate",
+            "models": {model: {calls, batch_calls, cached_calls, p50_s, p90_s, tokens, cost_usd}},
+            "packed": {requests, items, isolated} when packing is on,
+            "hedge": {calls, hedged, hedge_rate, wins, saved_s} when hedging is on}}
+    """
+    packed = openai_pack.stats()
+    hedged = openai_hedge.stats() if openai_hedge.enabled() else {}
+    with _stats_lock:
+        out = {}
+        for task, req in _requests.items():
+            out[task] = {"requests": req["requests"],
+                         "escalation_rate": round(req["escalated"] / req["requests"], 3) if req["requests"] else 0.0,
+                         "models": {}}
+        for (task, model), tier in _tiers.items():
+            out.setdefault(task, {"requests": 0, "escalation_rate": 0.0, "models": {}})["models"][model] = {
+                "calls": tier["calls"],
+                "batch_calls": tier["batch_calls"],
+                "cached_calls": tier["cached_calls"],
+                "p50_s": round(metrics.percentile(tier["seconds"], 50), 3),
+                "p90_s": round(metrics.percentile(tier["seconds"], 90), 3),
+                "tokens_in": tier["tokens_in"],
+                "tokens_out": tier["tokens_out"],
+                "cost_usd": round(tier["cost_usd"], 4),
+            }
+        for task, entry in packed.items():
+            out.setdefault(task, {"requests": 0, "escalation_rate": 0.0, "models": {}})["packed"] = entry
+        for task, entry in hedged.items():
+            out.setdefault(task, {"requests": 0, "escalation_rate": 0.0, "models": {}})["hedge"] = entry
+        return out
+
+
+def prompt_fields(field_text: str) -> List[str]:
+    """Field names from a 'field name: "..."' list (the diagram prompts)."""
+    return FIELD_NAME_RE.findall(field_text)
+
+
+def json_schema(fields: List[str], numeric=()) -> Dict:
+    """Strict JSON schema for one flat object holding `fields`."""
+    props = {f: {"type": ["number", "string", "null"] if f in numeric else ["string", "null"]} for f in fields}
+    return {"type": "object", "properties": props, "required": list(fields), "additionalProperties": False}
+
+
+def _response_format(backend, model, fields, numeric):
+    if model in backend.format_rejected or backend.response_format == "text":
+        return None
+    if backend.response_format == "json_schema":
+        return {"type": "json_schema",
+                "json_schema": {"name": "fields", "strict": True, "schema": json_schema(fields, numeric)}}
+    return {"type": "json_object"}
+
+
+def parse_json_object(raw: str) -> Optional[Dict]:
+    """The JSON object in a model answer (```json fences and chatter around it tolerated), else None."""
+    if not raw:
+        return None
+    cleaned = re.sub(r'^```(?:json)?\s*|\s*```$', '', raw.strip())
+    try:
+        obj = json.loads(cleaned)
+    except json.JSONDecodeError:
+        match = re.search(r'({.*})', cleaned, re.DOTALL)
+        if not match:
+            return None
+        try:
+            obj = json.loads(match.group(1))
+        except json.JSONDecodeError:
+            return None
+    return obj if isinstance(obj, dict) else None
+
+
+def validate(obj: Dict, fields: List[str], numeric=()) -> Dict[str, str]:
+    """
+    Clean `obj` in place (None and "n/a"-style numbers become "") and return
+    {field: problem} for the fields that are missing or unusable.
+    """
+    problems = {}
+    for field in fields:
+        if field not in obj:
+            problems[field] = "missing"
+            continue
+        value = obj[field]
+        if value is None:
+            obj[field] = ""
+        elif isinstance(value, (dict, list)):
+            problems[field] = "must be a single value, not a list or object"
+        elif field in numeric and isinstance(value, str) and value.strip():
+            if value.strip().lower() in EMPTY_WORDS:
+                obj[field] = ""
+            elif not re.search(r"\d", value):
+                problems[field] = f"expected a number, got {value!r}"
+    return problems
+
+
+def _request(model, messages, fields, numeric, max_tokens, packed=False):
+    """Chat completion request body (`packed`: the answer is {"items": [{"id", ...fields}]})."""
+    backend, name = resolve(model)
+    body = {"model": name, "messages": messages, "temperature": 0.1, "max_tokens": max_tokens}
+    response_format = _response_format(backend, name, fields, numeric)
+    if packed and response_format and response_format["type"] == "json_schema":
+        item = json_schema(["id"] + list(fields), numeric)
+        response_format = {"type": "json_schema", "json_schema": {"name": "items", "strict": True, "schema": {
+            "type": "object", "properties": {"items": {"type": "array", "items": item}},
+            "required": ["items"], "additionalProperties": False}}}
+    if response_format:
+        body["response_format"] = response_format
+    return body
+
+
+def _batched(task, model, messages, max_tokens):
+    """The answer a batch (openai_batch.BatchJob.answering) already has for this request, or None."""
+    active = openai_batch.current()
+    if not active or active[2] != "answer":
+        return None
+    job, listing, _ = active
+    body = job.answer(listing, resolve(model)[1], messages, max_tokens)
+    if body is None:
+        return None
+    resp = openai.util.convert_to_openai_object(body)
+    _note_call(task, model, None, resp, batch=True)
+    return resp
+
+
+def _create(backend, body):
+    """backend.create(body), without response_format if the endpoint rejects it."""
+    try:
+        return backend.create(body)
+    except openai.error.InvalidRequestError as e:
+        if "response_format" not in body or "response_format" not in str(e):
+            raise
+        log.warning("endpoint rejected response_format; sending plain requests for this model",
+                    backend=backend.name, model=body["model"], error=str(e))
+        backend.format_rejected.add(body["model"])
+        return backend.create({k: v for k, v in body.items() if k != "response_format"})
+
+
+def _complete(task, model, body, hedge=True):
+    """One request to the model's backend (hedged unless `hedge` is False), recorded in llm_stats()."""
+    backend, _ = resolve(model)
+    resp = backend.cached(body)
+    if resp is not None:
+        _note_call(task, model, None, resp, cached=True)
+        return resp
+    started = time.perf_counter()
+    if hedge and not backend.handler:
+        # a losing duplicate is still billed: count its tokens when it lands
+        resp = openai_hedge.call(task, model, lambda: _create(backend, body),
+                                 on_extra=lambda extra: _note_call(task, model, None, extra))
+    else:
+        resp = _create(backend, body)
+    _note_call(task, model, time.perf_counter() - started, resp)
+    backend.store(body, resp)
+    return resp
+
+
+def _chat(task, model, messages, fields, numeric, max_tokens):
+    """One completion -> (content, finish_reason)."""
+    resp = _batched(task, model, messages, max_tokens)
+    if resp is None:
+        resp = _complete(task, model, _request(model, messages, fields, numeric, max_tokens))
+    metrics.note_usage(resp)
+    choice = resp.choices[0]
+    return choice.message.content, getattr(choice, "finish_reason", None)
+
+
+def _chat_packed(task, model, messages, fields, numeric, max_tokens):
+    """openai_pack's sender: one group request -> (content, finish_reason, usage)."""
+    # a packed request takes longer than the single ones hedging measures: never hedged
+    resp = _complete(task, model, _request(model, messages, fields, numeric, max_tokens, packed=True), hedge=False)
+    choice = resp.choices[0]
+    usage = (resp.get("usage") if isinstance(resp, dict) else getattr(resp, "usage", None)) or {}
+    return choice.message.content, getattr(choice, "finish_reason", None), dict(usage)
+
+
+def _doubt(task, obj, fields, finish_reason):
+    """Why a parsed answer should not be trusted, or None."""
+    if finish_reason == "length":
+        return "answer cut off at max_tokens"
+    if task == "vehicle" and fields:
+        empty = sum(1 for f in fields if obj.get(f) in (None, ""))
+        if empty / len(fields) >= ESCALATE_EMPTY:
+            return f"{empty} of {len(fields)} fields empty"
+    return None
+
+
+def complete_json(messages: List[Dict], fields: List[str], numeric=(), task: str = "vehicle",
+                  max_tokens: Optional[int] = None) -> Optional[Dict]:
+    """
+    Ask for a JSON object with `fields`. Returns it (every field present, bad
+    ones emptied after the targeted retries), or None if no parsable object came
+    back. API errors are raised to the caller.
+    """
+    models = route(task)
+    max_tokens = max_tokens or max_tokens_for(task)
+    active = openai_batch.current()
+    if active and active[2] == "collect":
+        job, listing, _ = active
+        job.add(listing, task, _request(models[0], messages, fields, numeric, max_tokens))
+        return {f: "" for f in fields}
+    tier = 0
+    escalated = False
+
+    def escalate(reason):
+        nonlocal tier, escalated
+        if tier + 1 < len(models) and _may_escalate():
+            tier += 1
+            escalated = True
+            log.info("escalating to a stronger model", task=task, model=models[tier], reason=reason)
+
+    packed = None if active else openai_pack.pack(_chat_packed, task, models[tier], messages, fields, numeric,
+                                                  max_tokens)
+    if packed is not None:
+        raw, usage = packed
+        finish = "stop"
+        metrics.note_usage({"usage": usage})
+    else:
+        raw, finish = _chat(task, models[tier], messages, fields, numeric, max_tokens)
+    obj = parse_json_object(raw)
+    for _ in range(PARSE_RETRIES):
+        reason = "not a JSON object" if obj is None else _doubt(task, obj, fields, finish)
+        # a doubtful (but parsed) answer is only re-asked if a stronger model can take it
+        if not reason or (obj is not None and (tier + 1 >= len(models) or not _escalation_left())):
+            break
+        log.warning("unusable answer; asking again", task=task, model=models[tier], reason=reason,
+                    content=lambda: raw[:200])
+        metrics.note_retry()
+        escalate(reason)
+        again, again_finish = _chat(task, models[tier], messages, fields, numeric, max_tokens)
+        again_obj = parse_json_object(again)
+        if again_obj is not None or obj is None:
+            raw, finish, obj = again, again_finish, again_obj
+    if obj is None:
+        log.warning("no JSON object after retries", task=task, content=lambda: raw[:200])
+        _note_request(task, escalated)
+        return None
+
+    problems = validate(obj, fields, numeric)
+    for _ in range(FIELD_RETRIES):
+        if not problems:
+            break
+        if not escalated:
+            escalate("invalid fields")
+        log.info("re-asking for invalid fields", task=task, model=models[tier], fields=sorted(problems))
+        metrics.note_retry()
+        todo = list(problems)
+        followup = messages + [
+            {"role": "assistant", "content": raw},
+            {"role": "user", "content": "These fields were missing or invalid:\n"
+             + "\n".join(f'- "{f}": {why}' for f, why in problems.items())
+             + "\nReturn a JSON object with only these fields, using an empty string where the text has no value."},
+        ]
+        answer, _ = _chat(task, models[tier], followup, todo, numeric, min(max_tokens, 40 * len(todo) + 50))
+        fixed = parse_json_object(answer)
+        if fixed is None:
+            continue
+        still = validate(fixed, todo, numeric)
+        obj.update({f: fixed[f] for f in todo if f not in still})
+        problems = still
+    if problems:
+        log.warning("fields left empty after retries", task=task, fields=sorted(problems))
+        obj.update({f: "" for f in problems})
+    _note_request(task, escalated)
+    return obj
+
 
 def extract_vehicle_info(
     raw_text: str,
@@ -21,7 +552,7 @@ def extract_vehicle_info(
 ) -> Dict:
     """
     Send raw_text to GPT with system_prompt, return parsed JSON dict.
-    If debug, prints first 200 chars of the raw response.
+    If debug, logs the error when the call fails.
     """
     # 1) Clean ellipses
     safe_text = raw_text.replace("…", "...")
@@ -30,20 +561,8 @@ def extract_vehicle_info(
         {"role": "user",   "content": safe_text}
     ]
     try:
-        resp = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.1,
-            max_tokens=max_tokens
-        )
-        raw = resp.choices[0].message.content
-        if debug:
-            snippet = raw[:200].replace("\n"," ") + " …"
-            print("RAW GPT->JSON (first 200 chars):", snippet)
-        # strip ```json fences
-        cleaned = re.sub(r'^```json\s*|\s*```$', '', raw.strip())
-        return json.loads(cleaned)
+        return complete_json(messages, llm_vehicle_fields, max_tokens=max_tokens) or {}
     except Exception as e:
         if debug:
-            print("OpenAI extraction error:", repr(e))
+            log.error("extraction failed", error=repr(e))
         return {}
@@ -1,11 +1,16 @@
 import os
 import csv
 from typing import Union, List, Dict
+from core.log import get_logger
 
-def write_to_csv(data: Union[Dict, List[Dict]], attributes: List[str], filename: str) -> None:
+log = get_logger(__name__)
+
+def write_to_csv(data: Union[Dict, List[Dict]], attributes: List[str], filename: str, replace: bool = False) -> None:
     """
     Append one or more dicts to a CSV file, creating directories if needed.
     If attributes (fieldnames) are not provided, they will be inferred from data.
+    With replace=True the file is rewritten with just these rows instead (through
+    a temp file, so a reader never sees it half-written).
     """
     if isinstance(data, dict):
         data = [data]
@@ -21,14 +26,17 @@ def write_to_csv(data: Union[Dict, List[Dict]], attributes: List[str], filename:
     if parent:
         os.makedirs(parent, exist_ok=True)
 
-    file_exists = os.path.exists(filename)
-    file_empty = (not file_exists) or (os.path.getsize(filename) == 0)
+    target = f"{filename}.{os.getpid()}.tmp" if replace else filename
+    file_exists = os.path.exists(target)
+    file_empty = replace or (not file_exists) or (os.path.getsize(target) == 0)
 
-    with open(filename, mode="a", newline="", encoding="utf-8") as f:
+    with open(target, mode="w" if replace else "a", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=attributes)
         if file_empty:
             writer.writeheader()
         for row in data:
             out_row = {attr: row.get(attr, "") for attr in attributes}
             writer.writerow(out_row)
-    print(f"Data written to {filename} successfully.")
\ No newline at end of file
+    if replace:
+        os.replace(target, filename)
+    log.debug("rows written", file=filename, rows=len(data))
\ No newline at end of file
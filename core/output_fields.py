@@ -26,3 +26,13 @@ diagram_attributes = [
     "F7 Tire Size", "F7 Wheel Material", "F8 Brake Type", "F8 Dual Tires", "F8 Lift Axle", "F8 Power Axle",
     "F8 Steer Axle", "F8 Tire Size", "F8 Wheel Material", "original_image_url"
 ]
+
+# What the extraction prompt asks the model for (the last two are filled in by the pipeline)
+llm_vehicle_fields = [a for a in vehicle_attributes if a not in ("Original info description", "original_image_url")]
+
+# Fields make_extracted_info_compliant treats as numbers; the model's value must hold a digit (or be empty)
+numeric_vehicle_attributes = [
+    "ECM Miles", "Engine Displacement", "Engine Horsepower", "Engine Hours", "Front Axle Capacity",
+    "Fuel Capacity", "Not Active", "Odometer Miles", "Rear Axle Capacity", "Rear Axle Ratio",
+    "Ref Number", "Vehicle Price", "Vehicle Year", "Wheelbase",
+]
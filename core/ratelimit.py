@@ -0,0 +1,142 @@
+# core/ratelimit.py
+"""
+Per-domain adaptive token buckets: how fast we hit each dealer site.
+
+    from core import ratelimit
+    ratelimit.acquire(url)                       # blocks until this domain has a token
+    ratelimit.observe(url, status=resp.status_code, latency=seconds)
+
+core.fetch does both around every request (keyed by the target site, so Web
+Unlocker calls count against the dealer they fetch). Selenium navigations call
+them directly, with blocked=True when the page is a bot wall.
+
+Adaptation is AIMD, per domain:
+    healthy response         rate += increase            (up to max_rate)
+    slow (latency > slow_s)  rate *= 0.8
+    429 / 403 / 503 / wall   rate *= 0.5 (down to min_rate), and the bucket
+                             is drained for Retry-After (or 1 / rate) seconds
+So each site runs as fast as it tolerates instead of at a fixed pace.
+
+Buckets are per process. Environment:
+    RATE_LIMIT=0       disable (acquire never waits)
+    RATE_DEFAULT       starting requests/second for domains not in DOMAIN_LIMITS
+"""
+
+import os
+import time
+import threading
+from urllib.parse import urlsplit
+
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+DEFAULTS = {"rate": 2.0, "burst": 4, "min_rate": 0.05, "max_rate": 20.0, "increase": 0.2, "slow_s": 8.0}
+
+# starting points; every domain then adapts on its own
+DOMAIN_LIMITS = {
+    "www.ftlgr.com":            {"rate": 0.5, "burst": 2, "max_rate": 5.0},
+    "www.fydafreightliner.com": {"rate": 0.2, "burst": 1, "max_rate": 2.0, "slow_s": 20.0},
+    "www.shanesequipment.com":  {"rate": 0.5, "burst": 2, "max_rate": 4.0, "slow_s": 45.0},
+}
+
+BLOCK_STATUS = (403, 429, 503)
+
+
+class DomainBucket:
+    """Token bucket whose refill rate follows the site's health."""
+
+    def __init__(self, domain, rate, burst, min_rate, max_rate, increase, slow_s):
+        self.domain = domain
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = float(increase)
+        self.slow_s = float(slow_s)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self.blocks = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token (possibly going into debt) and return how long to wait for it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            self.waited += wait
+            return wait
+
+    def observe(self, status=None, latency=None, blocked=False, retry_after=None):
+        with self._lock:
+            if blocked or status in BLOCK_STATUS:
+                self.blocks += 1
+                old, self.rate = self.rate, max(self.min_rate, self.rate * 0.5)
+                pause = retry_after if retry_after is not None else 1.0 / self.rate
+                self._refill(time.monotonic())
+                self.tokens = min(self.tokens, 0.0) - pause * self.rate
+                log.warning("backing off", domain=self.domain, status=status, blocked=blocked,
+                            rate=round(self.rate, 3), was=round(old, 3), pause_s=round(pause, 1))
+            elif latency is not None and latency > self.slow_s:
+                self.rate = max(self.min_rate, self.rate * 0.8)
+                log.info("slow responses, easing off", domain=self.domain, latency=round(latency, 2),
+                         rate=round(self.rate, 3))
+            elif status is None or status < 400:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def snapshot(self):
+        with self._lock:
+            return {"rate": round(self.rate, 3), "waited_s": round(self.waited, 2), "blocks": self.blocks}
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def enabled():
+    return os.environ.get("RATE_LIMIT", "1") != "0"
+
+
+def domain_of(url_or_domain):
+    return urlsplit(url_or_domain).netloc.lower() if "//" in url_or_domain else url_or_domain.lower()
+
+
+def bucket(url_or_domain):
+    domain = domain_of(url_or_domain)
+    with _buckets_lock:
+        b = _buckets.get(domain)
+        if b is None:
+            settings = dict(DEFAULTS, **DOMAIN_LIMITS.get(domain, {}))
+            if domain not in DOMAIN_LIMITS and os.environ.get("RATE_DEFAULT"):
+                settings["rate"] = float(os.environ["RATE_DEFAULT"])
+            b = _buckets[domain] = DomainBucket(domain, **settings)
+        return b
+
+
+def acquire(url_or_domain):
+    """Wait for this domain's next slot. Returns the seconds waited."""
+    if not enabled():
+        return 0.0
+    wait = bucket(url_or_domain).reserve()
+    if wait > 0:
+        log.debug("rate limited", domain=domain_of(url_or_domain), wait_s=round(wait, 2))
+        time.sleep(wait)
+    return wait
+
+
+def observe(url_or_domain, status=None, latency=None, blocked=False, retry_after=None):
+    if enabled():
+        bucket(url_or_domain).observe(status, latency, blocked, retry_after)
+
+
+def snapshot():
+    """{domain: {rate, waited_s, blocks}} for the end-of-run log."""
+    with _buckets_lock:
+        buckets = dict(_buckets)
+    return {domain: b.snapshot() for domain, b in buckets.items()}
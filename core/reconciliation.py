@@ -4,6 +4,10 @@ import csv
 import os
 import pandas as pd
 
+from core.log import get_logger
+
+log = get_logger(__name__)
+
 def process_vehicle_data(
     vehicle_info_path: str,
     diagram_data_path: str,
@@ -68,7 +72,7 @@ def process_vehicle_data(
     reorder_and_save_results(vehicle_data, diagram_data,
                              os.path.join(output_dir, "vehicle_info.csv"),
                              os.path.join(output_dir, "diagram_data.csv"))
-    print("Reconciliation complete. Files written under ‘myresults/’.")
+    log.info("reconciliation complete", output_dir=output_dir, rows=len(vehicle_data))
 
 
 def reorder_and_save_results(
@@ -138,5 +142,4 @@ def reorder_and_save_results(
     vehicle_df_reordered.to_csv(out_vinf, index=False)
     new_diag_df.to_csv(out_ddata, index=False)
 
-    print(f"vehicle CSV: {out_vinf}")
-    print(f"diagram CSV: {out_ddata}")
+    log.info("wrote reconciled CSVs", vehicle_csv=out_vinf, diagram_csv=out_ddata)
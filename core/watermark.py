@@ -3,9 +3,12 @@
 from PIL import Image
 from PIL.Image import Resampling
 import io
-import cairosvg
 import os
 
+from core.log import get_logger
+
+log = get_logger(__name__)
+
 def add_watermark(
     image_path: str,
     watermark_path: str,
@@ -28,6 +31,8 @@ def add_watermark(
 
         # Load watermark (SVG->PNG if necessary)
         if watermark_path.lower().endswith('.svg'):
+            # cairosvg needs the native cairo library; only load it for SVG watermarks
+            import cairosvg
             svg_data = cairosvg.svg2png(url=watermark_path)
             watermark = Image.open(io.BytesIO(svg_data)).convert("RGBA")
         else:
@@ -87,6 +92,6 @@ def process_folder_watermark(
             output_path = os.path.join(output_folder, filename)
             try:
                 add_watermark(input_path, watermark_path, output_path, scale_factor, padding, opacity)
-                print(f"Processed watermark for: {filename}")
+                log.debug("watermarked", file=filename)
             except Exception as e:
-                print(f"Error processing {filename}: {e}")
+                log.warning("watermark failed", file=filename, error=str(e))
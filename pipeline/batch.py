@@ -0,0 +1,148 @@
+# pipeline/batch.py
+"""
+Batch engine for one dealer: the OpenAI work of the whole run goes through the
+Batch API (core/openai_batch.py) instead of one synchronous call per listing.
+
+    discover -> fetch all pages -> [vehicle batch] -> normalize -> [diagram batch] -> sink -> images
+
+The diagram prompt depends on the normalized extraction (axle configuration),
+so there are two batch jobs per dealer: every listing's vehicle prompt, then
+every listing's diagram prompt. Each job is filled by running the scraper's
+own extract_vehicle_info / complete_diagram_info with prompts recorded
+instead of sent, and emptied by running them again with the answers taken
+from the batch output for that listing. Everything after that is the code
+process_listing runs (pipeline/stages.py): journal records, inventory
+snapshots, CSV sink, photos and metrics behave the same, and listings a
+journal or snapshot already covers never reach a batch.
+
+Batch IDs go into the run journal as they are submitted, so --resume after a
+killed task polls the same batches instead of submitting (and paying for) the
+prompts again. Listings whose batch is still running after LLM_BATCH_TIMEOUT
+are left out of this run and picked up the same way.
+
+Only the request count and price change, not the rows: retries and
+escalations inside complete_json, and anything a batch did not answer, are
+sent synchronously.
+
+    engine = BatchPipeline(name, module, image_root, budget, journal, sink, snapshot)
+    results = engine.run(urls)        # {url: (vehicle_row, diagram_row)}
+
+Environment:
+    BATCH_WORKERS   threads for page fetches, answering and photos (default 4)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from core.concurrency import get_budget
+from core.log import get_logger
+from core.openai_batch import BatchJob
+from pipeline import stages
+
+log = get_logger(__name__)
+
+
+class BatchPipeline:
+
+    def __init__(self, name, module, image_root, budget=None, journal=None, sink=None, snapshot=None,
+                 workers=None):
+        self.name = name
+        self.module = module
+        self.image_root = image_root
+        self.budget = budget or get_budget()
+        self.journal = journal
+        self.sink = sink
+        self.snapshot = snapshot
+        self.workers = workers or int(os.environ.get("BATCH_WORKERS", "4"))
+        self.results = {}
+        self.discovered = []
+
+    def _each(self, fn, items):
+        """fn(url, value) for every (url, value) on the worker threads -> {url: result}, failures left out."""
+        def call(item):
+            url, value = item
+            try:
+                return url, fn(url, value)
+            except Exception as e:
+                log.exception("listing failed", dealer=self.name, url=url, error=str(e))
+                return url, None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return {url: out for url, out in pool.map(call, list(items.items())) if out is not None}
+
+    def _batched(self, task, items, prompt, finish):
+        """
+        Collect prompt(url, value) for every item into one batch job, run it, then
+        finish(url, value) with the batch's answers -> {url: result}.
+        """
+        job = BatchJob(f"{self.name}-{task}", journal=self.journal)
+        for url, value in items.items():
+            with job.collecting(url):
+                try:
+                    prompt(url, value)
+                except Exception as e:
+                    log.warning("could not build batch prompt", dealer=self.name, task=task, url=url, error=str(e))
+        job.run()
+
+        def answer(url, value):
+            if job.deferred(url):
+                log.warning("batch still running; listing left for --resume", dealer=self.name, task=task, url=url)
+                return None
+            with job.answering(url):
+                return finish(url, value)
+
+        return self._each(answer, items)
+
+    def _fetch(self, url, _):
+        text = stages._fetch(self.name, self.module, url, self.budget, self.journal)
+        if not text:
+            log.warning("no page text; skipping", dealer=self.name, url=url)
+        return text
+
+    def _extract(self, url, text):
+        extracted = stages._llm_extract(self.name, self.module, url, text, self.budget, self.journal)
+        if extracted is None:
+            log.warning("extraction returned non-dict; skipping", dealer=self.name, url=url)
+            return None
+        return stages._normalize(self.name, self.module, url, extracted)
+
+    def _diagram(self, url, compliant):
+        rows = stages._diagram(self.name, self.module, url, compliant, self.budget, self.journal)
+        if self.snapshot:
+            self.snapshot.update(url, *rows)
+        return rows
+
+    def _images(self, url, rows_reused):
+        rows, reused = rows_reused
+        stages._listing_images(self.name, url, rows, self.image_root, self.budget, self.journal,
+                               self.snapshot, reused)
+        return True
+
+    def run(self, urls):
+        """Process every URL from the iterable `urls`. Returns {url: (vehicle_row, diagram_row)}."""
+        done, todo = {}, {}
+        for url in urls:
+            if not url or url in done or url in todo:
+                continue
+            self.discovered.append(url)
+            rows, reused = stages._reuse(self.name, url, self.journal, self.snapshot)
+            if rows is not None:
+                done[url] = (rows, reused)
+            else:
+                todo[url] = None
+
+        pages = self._each(self._fetch, todo)
+        compliant = self._batched("vehicle", pages,
+                                  lambda url, text: self.module.extract_vehicle_info(text), self._extract)
+        scraped = self._batched("diagram", compliant,
+                                lambda url, c: self.module.complete_diagram_info({"Listing": url}, dict(c)),
+                                self._diagram)
+        done.update({url: (rows, False) for url, rows in scraped.items()})
+
+        for url in self.discovered:
+            if url in done:
+                stages._write(self.name, url, done[url][0], self.sink, self.journal)
+                self.results[url] = done[url][0]
+        self._each(self._images, {url: done[url] for url in self.discovered if url in done})
+        log.info("engine finished", dealer=self.name, discovered=len(self.discovered), rows=len(self.results))
+        return self.results
@@ -0,0 +1,181 @@
+# pipeline/engine.py
+"""
+Staged producer/consumer engine for one dealer.
+
+    discover -> fetch -> extract -> normalize -> diagram -> sink -> images
+           [queue]   [queue]    [queue]      [queue]    [queue]  [queue]
+
+Each stage has its own worker threads and reads from a bounded queue, so a
+slow stage pushes back on the ones before it instead of piling page text up in
+memory. Page fetches, OpenAI calls and photo work for different listings then
+overlap the whole time instead of taking turns listing by listing, and
+processing starts with the first discovered URL (discovery may be a generator).
+
+The work in each stage is the same code process_listing runs (pipeline/stages.py),
+so budget slots, journal records, resume, inventory snapshots and metrics all
+behave the same way. Listings a journal or snapshot already covers go straight
+from discovery to the sink.
+
+    engine = StagedPipeline(name, module, image_root, budget, journal, sink, snapshot)
+    results = engine.run(urls)        # {url: (vehicle_row, diagram_row)}
+
+Environment:
+    ENGINE_QUEUE                 items each queue holds before its producer waits (default 16)
+    ENGINE_WORKERS_<STAGE>       worker threads for one stage, e.g. ENGINE_WORKERS_DIAGRAM=6
+"""
+
+import os
+import queue
+import threading
+
+from core.concurrency import get_budget
+from core.log import get_logger
+from pipeline import stages
+
+log = get_logger(__name__)
+
+STAGES = ("fetch", "extract", "normalize", "diagram", "sink", "images")
+# Budget slots still cap the process as a whole; these size each dealer's stage.
+# The sink stays single-threaded so CSV rows are appended one at a time.
+DEFAULT_WORKERS = {"fetch": 4, "extract": 4, "normalize": 1, "diagram": 4, "sink": 1, "images": 2}
+
+_DONE = object()
+
+
+def default_workers():
+    workers = dict(DEFAULT_WORKERS)
+    for stage in STAGES:
+        value = os.environ.get(f"ENGINE_WORKERS_{stage.upper()}")
+        if value:
+            workers[stage] = max(1, int(value))
+    workers["sink"] = 1
+    return workers
+
+
+class StagedPipeline:
+
+    def __init__(self, name, module, image_root, budget=None, journal=None, sink=None, snapshot=None,
+                 workers=None, queue_size=None):
+        self.name = name
+        self.module = module
+        self.image_root = image_root
+        self.budget = budget or get_budget()
+        self.journal = journal
+        self.sink = sink
+        self.snapshot = snapshot
+        self.workers = dict(default_workers(), **(workers or {}))
+        size = queue_size or int(os.environ.get("ENGINE_QUEUE", "16"))
+        self.queues = {stage: queue.Queue(maxsize=size) for stage in STAGES}
+        self.results = {}
+        self.discovered = []
+        self._lock = threading.Lock()
+        self._finished = {stage: 0 for stage in STAGES}
+
+    # -- stage bodies: take an item, return it for the next stage (or None to drop it) --
+
+    def _fetch(self, item):
+        text = stages._fetch(self.name, self.module, item["url"], self.budget, self.journal)
+        if not text:
+            log.warning("no page text; skipping", dealer=self.name, url=item["url"])
+            return None
+        item["text"] = text
+        return item
+
+    def _extract(self, item):
+        extracted = stages._llm_extract(self.name, self.module, item["url"], item.pop("text"), self.budget, self.journal)
+        if extracted is None:
+            log.warning("extraction returned non-dict; skipping", dealer=self.name, url=item["url"])
+            return None
+        item["extracted"] = extracted
+        return item
+
+    def _normalize(self, item):
+        item["compliant"] = stages._normalize(self.name, self.module, item["url"], item.pop("extracted"))
+        return item
+
+    def _diagram(self, item):
+        item["rows"] = stages._diagram(self.name, self.module, item["url"], item.pop("compliant"),
+                                       self.budget, self.journal)
+        if self.snapshot:
+            self.snapshot.update(item["url"], *item["rows"])
+        return item
+
+    def _sink(self, item):
+        stages._write(self.name, item["url"], item["rows"], self.sink, self.journal)
+        with self._lock:
+            self.results[item["url"]] = item["rows"]
+        return item
+
+    def _images(self, item):
+        stages._listing_images(self.name, item["url"], item["rows"], self.image_root, self.budget,
+                               self.journal, self.snapshot, item.get("reused", False))
+        return None
+
+    # -- plumbing --
+
+    def _next(self, stage):
+        i = STAGES.index(stage) + 1
+        return STAGES[i] if i < len(STAGES) else None
+
+    def _close(self, stage):
+        """Called by each worker of `stage` as it exits; the last one closes the next queue."""
+        with self._lock:
+            self._finished[stage] += 1
+            last = self._finished[stage] == self.workers[stage]
+        nxt = self._next(stage)
+        if last and nxt:
+            for _ in range(self.workers[nxt]):
+                self.queues[nxt].put(_DONE)
+
+    def _worker(self, stage):
+        body = getattr(self, f"_{stage}")
+        inbox = self.queues[stage]
+        nxt = self._next(stage)
+        try:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                try:
+                    out = body(item)
+                except Exception as e:
+                    log.exception("listing failed", dealer=self.name, stage=stage, url=item["url"], error=str(e))
+                    continue
+                if out is not None and nxt:
+                    self.queues[nxt].put(out)
+        finally:
+            self._close(stage)
+
+    def _discover(self, urls):
+        """Feed fetch (or sink, for listings already covered), as URLs arrive."""
+        seen = set()
+        try:
+            for url in urls:
+                if not url or url in seen:
+                    continue
+                seen.add(url)
+                self.discovered.append(url)
+                rows, reused = stages._reuse(self.name, url, self.journal, self.snapshot)
+                if rows is not None:
+                    self.queues["sink"].put({"url": url, "rows": rows, "reused": reused})
+                else:
+                    self.queues["fetch"].put({"url": url})
+        except Exception as e:
+            # keep what was discovered so far; the rest of the run carries on with it
+            log.exception("discovery failed part-way", dealer=self.name, discovered=len(self.discovered), error=str(e))
+        finally:
+            for _ in range(self.workers["fetch"]):
+                self.queues["fetch"].put(_DONE)
+
+    def run(self, urls):
+        """Process every URL from the iterable `urls`. Returns {url: (vehicle_row, diagram_row)}."""
+        threads = [threading.Thread(target=self._worker, args=(stage,), daemon=True,
+                                    name=f"{self.name}-{stage}-{n}")
+                   for stage in STAGES for n in range(self.workers[stage])]
+        for t in threads:
+            t.start()
+        self._discover(urls)
+        for t in threads:
+            t.join()
+        log.info("engine finished", dealer=self.name, discovered=len(self.discovered), rows=len(self.results))
+        return self.results
@@ -0,0 +1,146 @@
+# pipeline/inventory.py
+"""
+Incremental runs: skip listings whose discovery summary has not changed.
+
+Some dealers' discovery already returns the basics of every unit (Shane's
+collector dataset, Fyda's search results). The scraper module exposes them
+through the registry's "summaries" function as {url: {"stock", "price", ...}}.
+
+The snapshot remembers, per listing URL, a fingerprint of that summary and the
+rows the last run produced for it:
+
+    inventory/<dealer>.json   {url: {"fingerprint": "...", "vehicle": {...}, "diagram": {...},
+                                 "images": true, "photos": {"<stock>/1.jpg": "blobs/..", ...}}}
+
+When this run's summary fingerprint matches, process_listing reuses the saved
+rows instead of fetching the page and paying for extraction again. results/ is
+not kept between tasks, so the photos still have to be there: the entry also
+lists where each photo file came from in core/image_store.py ("photos"), and
+they are linked back from the store. If the store no longer has them (or
+IMAGE_STORE=0), the photos are fetched as usual. A new price
+or stock number means a new fingerprint, so that unit is scraped normally.
+
+Environment:
+    INVENTORY_DIR   where snapshots live (default ./inventory; keep it on a
+                    persistent volume for incremental runs across tasks)
+    INCREMENTAL=0   ignore snapshots and process every listing
+"""
+
+import os
+import json
+import hashlib
+import threading
+
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+INVENTORY_DIR = os.environ.get("INVENTORY_DIR", "inventory")
+
+
+def enabled():
+    return os.environ.get("INCREMENTAL", "1") != "0"
+
+
+def fingerprint(summary):
+    """
+    Stable hash of everything in a summary except its URL. None unless the
+    summary has a price or stock number, since a title alone would hide a price change.
+    """
+    fields = {k: str(v).strip() for k, v in (summary or {}).items() if k != "url" and v not in (None, "")}
+    if not (fields.get("price") or fields.get("stock")):
+        return None
+    return hashlib.sha1(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class InventorySnapshot:
+
+    def __init__(self, path, summaries):
+        self.path = path
+        # a streaming dealer's summaries are a live view that is still empty here
+        self.summaries = summaries if summaries is not None else {}
+        self._lock = threading.Lock()
+        self._saved = {}
+        self._current = {}
+        self.skipped = 0
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._saved = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                log.warning("unreadable inventory snapshot; starting over", path=path, error=str(e))
+
+    @classmethod
+    def for_dealer(cls, name, summaries):
+        return cls(os.path.join(INVENTORY_DIR, f"{name}.json"), summaries)
+
+    def _match(self, url):
+        fp = fingerprint(self.summaries.get(url))
+        entry = self._saved.get(url)
+        return entry if fp and entry and entry.get("fingerprint") == fp else None
+
+    def is_unchanged(self, url):
+        return self._match(url) is not None
+
+    def unchanged(self, url):
+        """(vehicle_row, diagram_row) from the last run if this unit's summary is the same, else None."""
+        entry = self._match(url)
+        if entry is None:
+            return None
+        with self._lock:
+            self._current[url] = entry
+            self.skipped += 1
+        return entry["vehicle"], entry["diagram"]
+
+    def images_done(self, url):
+        entry = self._match(url)
+        return bool(entry and entry.get("images"))
+
+    def photos(self, url):
+        """{path under the image root: image store file} the last run linked for this unit, or None."""
+        entry = self._match(url)
+        return entry.get("photos") if entry else None
+
+    def update(self, url, vehicle_row, diagram_row):
+        fp = fingerprint(self.summaries.get(url))
+        if fp:
+            with self._lock:
+                self._current[url] = {"fingerprint": fp, "vehicle": vehicle_row, "diagram": diagram_row}
+
+    def mark_images(self, url, photos=None):
+        with self._lock:
+            if url in self._current:
+                entry = dict(self._current[url], images=True)
+                if photos is not None:
+                    entry["photos"] = photos
+                self._current[url] = entry
+
+    def save(self):
+        """Write this run's units. Listings that were not processed keep their old entry; sold ones drop out."""
+        if not self.summaries:
+            log.warning("no summaries this run; inventory snapshot left as it was", path=self.path)
+            return
+        with self._lock:
+            merged = {url: self._current.get(url, self._saved.get(url)) for url in self.summaries}
+            merged = {url: entry for url, entry in merged.items() if entry}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(merged, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        log.info("inventory snapshot saved", path=self.path, units=len(merged), unchanged=self.skipped)
+
+
+def snapshot_for(name, module, spec, streaming=False):
+    """
+    The dealer's snapshot, or None if it has no summaries hook, none came back, or INCREMENTAL=0.
+    With streaming discovery the summaries are a live view that fills in as
+    listings are yielded, so an empty one is fine.
+    """
+    hook = spec.get("summaries")
+    if not hook or not enabled():
+        return None
+    summaries = getattr(module, hook)()
+    if not summaries and not streaming:
+        return None
+    return InventorySnapshot.for_dealer(name, summaries)
@@ -0,0 +1,106 @@
+# pipeline/journal.py
+"""
+Per-run journal so a scraper run can be resumed after a crash.
+
+One JSON line per event, appended and flushed as the run goes:
+    {"url": "...", "stage": "fetched",   "status": "ok", "data": "<page text>", "time": ...}
+    {"url": "...", "stage": "extracted", "status": "ok", "data": {"vehicle": {...}, "diagram": {...}}}
+    {"url": "...", "stage": "written",   "status": "ok"}
+    {"url": "...", "stage": "images",    "status": "failed", "error": "..."}
+plus one {"stage": "discovered", "data": [urls]} line for the listing set, and
+for the batch engine one {"url": "batch:<job>", "stage": "batch", ...} line per
+OpenAI batch submission (core/openai_batch.py), so a resume polls it again.
+
+Replaying the file gives the latest status of every (url, stage). With
+`run_scraper --resume`, stages that are "ok" are skipped and their saved data
+reused, so a restart neither re-fetches/re-pays for finished listings nor
+appends duplicate CSV rows.
+"""
+
+import os
+import json
+import time
+import threading
+
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+STAGES = ("fetched", "extracted", "written", "images")
+# Outside results/ so page text in the journal is not shipped in the export zip
+JOURNAL_DIR = os.environ.get("JOURNAL_DIR", "journal")
+
+
+class RunJournal:
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = {}        # (url, stage) -> record
+        self.discovered = None  # listing URLs from the original run
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if resume and os.path.exists(path):
+            self._replay()
+        elif os.path.exists(path):
+            # Fresh run: keep the previous journal around instead of mixing runs
+            os.replace(path, path + ".prev")
+        self._fh = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def for_source(cls, source, resume=False):
+        return cls(os.path.join(JOURNAL_DIR, f"{source}.jsonl"), resume=resume)
+
+    def _replay(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # last line may be half-written if the task was killed
+                if rec.get("stage") == "discovered":
+                    self.discovered = rec.get("data") or []
+                else:
+                    self._state[(rec.get("url"), rec.get("stage"))] = rec
+        done = sum(1 for rec in self._state.values() if rec.get("stage") == "written" and rec.get("status") == "ok")
+        log.info("resuming from journal", path=self.path, listings=len(self.discovered or []), written=done)
+
+    def _append(self, rec):
+        rec["time"] = time.time()
+        line = json.dumps(rec, ensure_ascii=False)
+        with self._lock:
+            self._fh.write(line + "\n")
+            self._fh.flush()
+            if rec.get("stage") != "discovered":
+                self._state[(rec.get("url"), rec.get("stage"))] = rec
+
+    def record_discovered(self, urls):
+        self.discovered = list(urls)
+        self._append({"stage": "discovered", "data": self.discovered})
+
+    def record(self, url, stage, data=None):
+        rec = {"url": url, "stage": stage, "status": "ok"}
+        if data is not None:
+            rec["data"] = data
+        self._append(rec)
+
+    def record_failure(self, url, stage, error):
+        self._append({"url": url, "stage": stage, "status": "failed", "error": str(error)})
+
+    def done(self, url, stage):
+        rec = self._state.get((url, stage))
+        return bool(rec) and rec.get("status") == "ok"
+
+    def data(self, url, stage):
+        rec = self._state.get((url, stage))
+        return rec.get("data") if rec else None
+
+    def summary(self):
+        counts = {stage: {"ok": 0, "failed": 0} for stage in STAGES}
+        for (url, stage), rec in self._state.items():
+            if stage in counts:
+                counts[stage][rec.get("status", "failed")] += 1
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._fh.close()
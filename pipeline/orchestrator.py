@@ -0,0 +1,234 @@
+# pipeline/orchestrator.py
+"""
+Run several dealers in ONE process under a shared concurrency budget.
+
+Instead of run_all shelling out to `pipeline.run_scraper` and then
+`pipeline.run_reconciliation` once per dealer (re-importing every scraper and
+round-tripping through CSV), this imports each scraper module once, processes
+listings from all selected dealers on one shared worker pool, and hands the
+scraped rows straight to reconciliation in memory.
+
+Each listing's stages take a slot from core.concurrency:
+    page fetch / image URLs -> "http" (or "browser" for Selenium dealers)
+    GPT extraction + diagram -> "llm"
+
+--engine staged (or PIPELINE_ENGINE=staged) runs each dealer through
+pipeline/engine.py instead: per-stage workers joined by bounded queues, so
+fetches, OpenAI calls and photos of different listings overlap continuously.
+Dealers with a streaming discovery generator (registry "stream") feed it
+directly, so detail work starts with the first inventory page.
+
+--engine batch (PIPELINE_ENGINE=batch) is for nightly runs that are not
+waiting on the answer: each dealer's extraction and diagram prompts go to the
+OpenAI Batch API as two jobs (pipeline/batch.py) at batch pricing, and the
+answers are merged back per listing before reconciliation.
+
+Outputs per dealer (same layout as a single-dealer run, one level down):
+    results/<dealer>/vehicleinfo.csv, results/<dealer>/diagram.csv, results/<dealer>/images/
+    myresults/<dealer>/vehicle_info.csv, myresults/<dealer>/diagram_data.csv
+
+Usage:
+    python -m pipeline.orchestrator --dealers jasper,five_star,ftlgr
+    python -m pipeline.orchestrator --dealers all --limit 5
+"""
+
+import os
+import sys
+import argparse
+import contextlib
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from core import metrics
+from core import cpu, fetch, ratelimit, image_store
+from core.concurrency import get_budget
+from core.log import get_logger
+from core.output import write_to_csv
+from core.output_fields import vehicle_attributes, diagram_attributes
+from scrapers import registry
+from pipeline.batch import BatchPipeline
+from pipeline.engine import StagedPipeline
+from pipeline.journal import RunJournal
+from pipeline.inventory import snapshot_for
+from pipeline.stages import process_listing, prefetch
+
+log = get_logger(__name__)
+
+VEHICLE_INFO_ORG_PATH = os.path.join("data", "raw", "vehicle_info_org.csv")
+ENGINES = {"staged": StagedPipeline, "batch": BatchPipeline}
+
+
+def write_dealer_report(name, results_dir):
+    """results/<dealer>/run_report.{json,csv}, so it ships in that dealer's zip."""
+    metrics.write_report(os.path.join(results_dir, "run_report"), metrics.records(dealer=name))
+
+
+def _streamed(name, urls, journal, limit=None, budget=None, kind=None):
+    """
+    Yield from a discovery generator, timing it and journaling whatever it found
+    (even if it fails part-way). With a budget, the generator holds a `kind` slot
+    from its first URL until it is exhausted or closed, like a one-shot discovery.
+    """
+    found = []
+    try:
+        with (budget.slot(kind) if budget else contextlib.nullcontext()), metrics.stage("discover", name):
+            for url in itertools.islice(urls, limit):
+                found.append(url)
+                yield url
+    finally:
+        close = getattr(urls, "close", None)
+        if close:
+            close()  # stopping at --limit still quits the discovery browser
+        journal.record_discovered(found)
+        log.info("listings discovered", dealer=name, count=len(found), streamed=True)
+
+
+def run_dealer(name, pool, budget, limit=None, resume=False, results_root="results", myresults_root="myresults",
+               engine="pool"):
+    """
+    Discover one dealer's listings, process them on the shared pool (or the staged
+    engine), write the raw CSVs (for the archive) and reconcile from the in-memory rows.
+    With resume, listings/stages finished by an earlier run come from its journal.
+    Returns (results_dir, myresults_dir).
+    """
+    from pipeline.run_reconciliation import reconcile_rows
+
+    spec = registry.get_spec(name)
+    module = registry.load(name)
+    results_dir = os.path.join(results_root, name)
+    myresults_dir = os.path.join(myresults_root, name)
+    image_root = os.path.join(results_dir, "images")
+    os.makedirs(image_root, exist_ok=True)
+
+    journal = RunJournal.for_source(name, resume=resume)
+    # streaming discovery holds a budget slot while the fetches it feeds need the same kind,
+    # so it needs at least two of them (with one, discover first and then fetch)
+    streaming = (engine == "staged" and bool(spec.get("stream")) and journal.discovered is None
+                 and budget.limits[spec["fetch"]] > 1)
+    if journal.discovered is not None:
+        urls = journal.discovered
+        log.info("discovery from journal", dealer=name)
+    elif streaming:
+        log.info("streaming discovery", dealer=name)
+        urls = _streamed(name, getattr(module, spec["stream"])(), journal, limit, budget, spec["fetch"])
+    else:
+        log.info("discovery", dealer=name)
+        with budget.slot(spec["fetch"]), metrics.stage("discover", name):
+            urls = getattr(module, spec["listings"])()
+        journal.record_discovered(urls)
+    if not streaming:
+        if limit is not None:
+            urls = urls[:limit]
+        log.info("listings discovered", dealer=name, count=len(urls))
+    snapshot = snapshot_for(name, module, spec, streaming=streaming)
+    if not streaming:
+        prefetch(name, module, urls, journal, snapshot)
+
+    vehicle_rows, diagram_rows, listing_urls = [], [], []
+    if engine in ENGINES:
+        staged = ENGINES[engine](name, module, image_root, budget, journal, snapshot=snapshot)
+        results = staged.run(urls)
+        for url in staged.discovered:
+            if url in results:
+                vehicle_rows.append(results[url][0])
+                diagram_rows.append(results[url][1])
+                listing_urls.append(url)
+    else:
+        futures = [(url, pool.submit(process_listing, name, module, url, image_root, budget, journal, None, snapshot))
+                   for url in urls]
+        for idx, (url, future) in enumerate(futures, start=1):
+            try:
+                result = future.result()
+            except Exception as e:
+                log.error("listing failed", dealer=name, n=idx, total=len(urls), url=url, error=str(e))
+                continue
+            if result:
+                vehicle_rows.append(result[0])
+                diagram_rows.append(result[1])
+                listing_urls.append(url)
+            log.info("listing done", dealer=name, n=idx, total=len(urls), url=url)
+    journal.close()
+    if snapshot:
+        snapshot.save()
+
+    # rewritten, not appended: a resumed run gets every row back from its journal
+    write_to_csv(vehicle_rows, vehicle_attributes, os.path.join(results_dir, "vehicleinfo.csv"), replace=True)
+    write_to_csv([row for row in diagram_rows if row is not None], diagram_attributes,
+                 os.path.join(results_dir, "diagram.csv"), replace=True)
+
+    if not vehicle_rows:
+        log.warning("no rows scraped; skipping reconciliation", dealer=name)
+        os.makedirs(myresults_dir, exist_ok=True)
+        write_dealer_report(name, results_dir)
+        return results_dir, myresults_dir
+
+    log.info("reconciliation", dealer=name, rows=len(vehicle_rows))
+    with metrics.stage("reconcile", name):
+        # reconciliation pairs rows by position: a listing without a diagram row gets an empty one there
+        reconcile_rows(vehicle_rows, [row or {} for row in diagram_rows], VEHICLE_INFO_ORG_PATH, listing_urls,
+                       output_dir=myresults_dir)
+    write_dealer_report(name, results_dir)
+    return results_dir, myresults_dir
+
+
+def run_dealers(names, limit=None, resume=False, on_dealer_done=None, engine=None):
+    """
+    Run every dealer in `names` concurrently on one shared pool.
+    `engine` is "pool", "staged" or "batch" (default: PIPELINE_ENGINE, else "pool").
+    `on_dealer_done(name, results_dir, myresults_dir)` is called as each dealer
+    finishes (run_all uses it to zip + upload that dealer while others continue).
+    Returns {name: (results_dir, myresults_dir)} for the dealers that completed.
+    """
+    budget = get_budget()
+    engine = engine or os.environ.get("PIPELINE_ENGINE", "pool")
+    log.info("starting dealers", dealers=names, budget=budget.limits, engine=engine)
+    outputs = {}
+
+    def dealer_job(name):
+        try:
+            outputs[name] = run_dealer(name, pool, budget, limit=limit, resume=resume, engine=engine)
+        except Exception as e:
+            log.exception("dealer failed", dealer=name, error=str(e))
+            return
+        if on_dealer_done:
+            on_dealer_done(name, *outputs[name])
+
+    with ThreadPoolExecutor(max_workers=budget.total) as pool, \
+         ThreadPoolExecutor(max_workers=len(names)) as dealer_pool:
+        list(dealer_pool.map(dealer_job, names))
+    from core.openai_utils import llm_stats  # loaded with the scrapers, not for --list
+    log.info("http summary", http=fetch.stats(), rates=ratelimit.snapshot(), images=image_store.stats(),
+             cpu=cpu.stats(), llm=llm_stats())
+    image_store.maybe_prune()
+    return outputs
+
+
+def parse_dealers(value):
+    """'all' or a comma-separated list -> list of dealer names."""
+    if value.strip().lower() == "all":
+        return registry.names()
+    names = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [n for n in names if n not in registry.SCRAPERS]
+    if unknown:
+        raise ValueError(f"Unknown dealer(s): {unknown}. Choose from {registry.names()}")
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several dealers in one process.")
+    parser.add_argument("--dealers", "-d", default="all", help="'all' or comma-separated: " + ", ".join(registry.names()))
+    parser.add_argument("--limit", "-n", type=int, default=None, help="(Optional) Only scrape the first N listings per dealer")
+    parser.add_argument("--resume", action="store_true", help="Continue each dealer from its journal (journal/<dealer>.jsonl)")
+    parser.add_argument("--engine", choices=("pool", "staged", "batch"), default=None,
+                        help="pool: one task per listing (default); staged: per-stage workers with bounded queues; "
+                             "batch: OpenAI Batch API for all of a dealer's prompts")
+    args = parser.parse_args()
+
+    outputs = run_dealers(parse_dealers(args.dealers), limit=args.limit, resume=args.resume, engine=args.engine)
+    log.info("finished dealers", count=len(outputs), dealers=sorted(outputs))
+    if not outputs:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
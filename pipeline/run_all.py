@@ -4,68 +4,198 @@ import sys
 import subprocess
 import os
 import datetime
-import boto3
+import threading
 
-# Ensure working directory is project root
+# Ensure working directory is project root (and importable when run as a script)
 os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.getcwd())
+
+from core import metrics
+from core.log import get_logger
+from pipeline.zip_only import write_results_zip, RESULT_FOLDERS
+from pipeline.s3_upload import S3Uploader
 
 # Read bucket and scraper from env variables (set by deploy.sh or ECS taskdef)
 S3_BUCKET = os.environ.get('S3_BUCKET', 'colton-bucket-prod')
+# Build the zip straight into the S3 upload instead of writing it to disk first
+ZIP_STREAM_UPLOAD = os.environ.get('ZIP_STREAM_UPLOAD', '1') == '1'
+# Also push images/CSVs as they are produced, with a manifest.json written last
+S3_INCREMENTAL_UPLOAD = os.environ.get('S3_INCREMENTAL_UPLOAD', '0') == '1'
+# Stage timings (JSON + CSV); written into results/ so the report ships in the zip
+RUN_REPORT_PREFIX = os.path.join("results", "run_report")
 SCRAPER_NAME = os.environ.get('SCRAPER_NAME', None)
-print(f'scraper name is {SCRAPER_NAME}')
+log = get_logger("pipeline.run_all")
+log.info("scraper selected", scraper=SCRAPER_NAME)
 if not SCRAPER_NAME:
-    print("!! SCRAPER_NAME env var is not set. Exiting.")
+    log.error("SCRAPER_NAME env var is not set. Exiting.")
     sys.exit(1)
 
 
 def run_scraper(scraper_name):
     """Run a single scraper using run_scraper CLI."""
     try:
-        print(f"\n=== RUNNING SCRAPER: {scraper_name} ===")
+        log.info("running scraper", scraper=scraper_name)
         subprocess.run([sys.executable, "-m", "pipeline.run_scraper", "--source", scraper_name], check=True)
     except subprocess.CalledProcessError as e:
-        print(f"!! Error running scraper {scraper_name}: {e}")
+        log.error("scraper failed", scraper=scraper_name, error=str(e))
         sys.exit(1)
 
 def upload_to_s3(file_path, bucket_name, key_name):
-    """Upload the given file to S3 under the specified bucket/key."""
-    print(f"Uploading {file_path} to s3://{bucket_name}/{key_name}")
-    s3 = boto3.client("s3")
-    with open(file_path, "rb") as f:
-        s3.upload_fileobj(f, bucket_name, key_name)
-    print(f"Done Uploaded to s3://{bucket_name}/{key_name}")
+    """Upload the given file to S3 (multipart, checksummed, resumes a partial upload)."""
+    S3Uploader(bucket_name).upload_file(file_path, key_name)
+
+def upload_incremental_outputs(bucket_name, key_prefix, folders=RESULT_FOLDERS, scraper_name=None):
+    """
+    Push anything run_scraper has not already uploaded (CSVs, late images),
+    then write the manifest last so consumers only see a complete set.
+    """
+    uploader = S3Uploader(bucket_name)
+    for folder, arc_root in folders:
+        if os.path.isdir(folder):
+            uploader.sync_folder(folder, f"{key_prefix}/{arc_root}", skip_existing=True)
+    uploader.write_manifest(key_prefix, extra={"scraper": scraper_name or SCRAPER_NAME})
+    uploader.close()
+
+def stream_zip_to_s3(bucket_name, key_name, folders=RESULT_FOLDERS):
+    """
+    Package results/ and myresults/ into a ZIP that is written into a pipe while
+    S3 reads the other end, so packaging and upload overlap. If packaging fails,
+    the upload is aborted and whatever was at `key_name` before stays there.
+    """
+    log.info("streaming results zip", dest=f"s3://{bucket_name}/{key_name}")
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def produce():
+        try:
+            with os.fdopen(write_fd, "wb") as writer:
+                count = write_results_zip(writer, folders)
+            log.info("packaged files into the stream", files=count)
+        except Exception as e:
+            errors.append(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    def check():
+        # the upload reached EOF, so the producer has closed its end and is finishing
+        producer.join()
+        if errors:
+            raise errors[0]
+
+    uploader = S3Uploader(bucket_name)
+    try:
+        # Closing the read end on failure makes the producer hit a broken pipe and stop.
+        with os.fdopen(read_fd, "rb") as reader:
+            uploader.upload_stream(reader, key_name, check=check)
+    finally:
+        producer.join()
+    log.info("uploaded results zip", dest=f"s3://{bucket_name}/{key_name}")
+
+def report_run(recs):
+    """Write the combined run report and print the per-stage percentile summary."""
+    path = metrics.write_report(RUN_REPORT_PREFIX, recs)
+    log.info("stage timings", records=len(recs), path=path)
+    print(metrics.format_summary(metrics.summarize(recs)))
+
+def run_many(dealer_names):
+    """
+    Several dealers in this one process (SCRAPER_NAME=all or a comma list):
+    shared concurrency budget, in-memory handoff to reconciliation, and each
+    dealer is zipped + uploaded as soon as it finishes.
+    """
+    from pipeline.orchestrator import run_dealers
+
+    date_str = datetime.datetime.now().strftime("%Y-%m-%d")
+    failed = []
+
+    def publish(name, results_dir, myresults_dir):
+        folders = [(results_dir, "results"), (myresults_dir, "myresults")]
+        try:
+            if S3_INCREMENTAL_UPLOAD:
+                with metrics.stage("upload", name):
+                    upload_incremental_outputs(S3_BUCKET, f"exports/{name}/{date_str}", folders, scraper_name=name)
+            with metrics.stage("zip_upload", name):
+                stream_zip_to_s3(S3_BUCKET, f"exports/{name}_results_{date_str}_coltonmkt.zip", folders)
+        except Exception as e:
+            log.error("zip/upload failed", dealer=name, error=str(e))
+            failed.append(name)
+
+    outputs = run_dealers(dealer_names, on_dealer_done=publish)
+    report_run(metrics.records())
+    missing = [n for n in dealer_names if n not in outputs]
+    if missing or failed:
+        log.error("dealers with errors", scrape=missing, upload=failed)
+        sys.exit(1)
+    log.info("pipeline done")
 
 def main():
-    print(f"=== STARTING INGESTION PIPELINE FOR {SCRAPER_NAME} ===")
+    if SCRAPER_NAME == "all" or "," in SCRAPER_NAME:
+        from pipeline.orchestrator import parse_dealers
+        log.info("starting in-process pipeline", dealers=SCRAPER_NAME)
+        run_many(parse_dealers(SCRAPER_NAME))
+        return
+
+    log.info("starting ingestion pipeline", scraper=SCRAPER_NAME)
+    date_str = datetime.datetime.now().strftime("%Y-%m-%d")
+    incremental_prefix = f"exports/{SCRAPER_NAME}/{date_str}"
+    if S3_INCREMENTAL_UPLOAD:
+        # run_scraper picks this up and uploads each listing's images as it goes
+        os.environ["S3_INCREMENTAL_PREFIX"] = incremental_prefix
     # Run the selected scraper
     run_scraper(SCRAPER_NAME)
+    scraper_records = metrics.load_report(RUN_REPORT_PREFIX + ".json")
 
     # Run reconciliation
-    print("\n=== RUNNING RECONCILIATION ===")
+    log.info("running reconciliation")
     try:
-        subprocess.run([sys.executable, "-m", "pipeline.run_reconciliation"], check=True)
-        print("Finished reconciliation.")
+        with metrics.stage("reconcile", SCRAPER_NAME):
+            subprocess.run([sys.executable, "-m", "pipeline.run_reconciliation"], check=True)
+        log.info("finished reconciliation")
     except subprocess.CalledProcessError as e:
-        print(f"!! Error in reconciliation: {e}")
+        log.error("reconciliation failed", error=str(e))
         sys.exit(1)
 
+    if S3_INCREMENTAL_UPLOAD:
+        log.info("uploading remaining artifacts and manifest")
+        try:
+            with metrics.stage("upload", SCRAPER_NAME):
+                upload_incremental_outputs(S3_BUCKET, incremental_prefix)
+        except Exception as e:
+            log.error("incremental upload failed", error=str(e))
+            sys.exit(1)
+
+    # Scrape + reconcile timings go into the zip; upload timings are only printed
+    metrics.write_report(RUN_REPORT_PREFIX, scraper_records + metrics.records())
+
     # Create a per-scraper zip file
-    print("\n=== CREATING ZIP ARCHIVE ===")
-    date_str = datetime.datetime.now().strftime("%Y-%m-%d")
     zip_filename = f"{SCRAPER_NAME}_results_{date_str}_coltonmkt.zip"
-    try:
-        # zip_only.py now always takes --output for custom naming
-        subprocess.run([sys.executable, "-m", "pipeline.zip_only", "--output", zip_filename], check=True)
-        print(f"Finished creating zip: {zip_filename}")
-    except Exception as e:
-        print(f"!! Error while zipping: {e}")
-        sys.exit(1)
-
-    # Upload zip to S3
-    print("\n=== UPLOADING TO S3 ===")
     key_name = f"exports/{zip_filename}"
-    upload_to_s3(zip_filename, S3_BUCKET, key_name)
-    print("=== PIPELINE DONE ===")
+
+    if ZIP_STREAM_UPLOAD:
+        log.info("creating zip and uploading (streamed)", key=key_name)
+        try:
+            with metrics.stage("zip_upload", SCRAPER_NAME):
+                stream_zip_to_s3(S3_BUCKET, key_name)
+        except Exception as e:
+            log.error("zip/upload failed", error=str(e))
+            sys.exit(1)
+    else:
+        log.info("creating zip archive", file=zip_filename)
+        try:
+            # zip_only.py now always takes --output for custom naming
+            subprocess.run([sys.executable, "-m", "pipeline.zip_only", "--output", zip_filename], check=True)
+            log.info("created zip", file=zip_filename)
+        except Exception as e:
+            log.error("zip failed", error=str(e))
+            sys.exit(1)
+
+        # Upload zip to S3
+        log.info("uploading to S3", key=key_name)
+        with metrics.stage("upload", SCRAPER_NAME):
+            upload_to_s3(zip_filename, S3_BUCKET, key_name)
+    report_run(scraper_records + metrics.records())
+    log.info("pipeline done")
 
 if __name__ == "__main__":
     main()
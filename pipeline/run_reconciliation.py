@@ -2,19 +2,23 @@ import csv
 import os
 import pandas as pd
 
+from core.log import get_logger
+
+log = get_logger(__name__)
+
 def open_csv_reader_auto(path):
     """
     Returns a (file handle, csv.DictReader), using utf-8 or cp1252 depending on what works.
     """
     try:
-        print(f"Trying to open {path} with utf-8 encoding...")
+        log.debug("opening csv", path=path, encoding="utf-8")
         f = open(path, "r", encoding="utf-8", newline="")
         reader = csv.DictReader(f)
         # Try to read the header now (will trigger UnicodeDecodeError if encoding is wrong)
         _ = reader.fieldnames
         return f, reader
     except UnicodeDecodeError:
-        print(f"utf-8 failed for {path}, falling back to cp1252...")
+        log.warning("utf-8 failed, falling back to cp1252", path=path)
         f = open(path, "r", encoding="cp1252", newline="")
         reader = csv.DictReader(f)
         _ = reader.fieldnames
@@ -24,7 +28,6 @@ def reorder_and_save_results(vehicle_data, diagram_data, out_vinf, out_ddata):
     """
     Writes the vehicle and diagram data CSVs with canonical column ordering.
     """
-    print("======= Reordering and writing output files =======")
     vehicle_df = pd.DataFrame(vehicle_data)
     diagram_df = pd.DataFrame(diagram_data)
 
@@ -48,7 +51,7 @@ def reorder_and_save_results(vehicle_data, diagram_data, out_vinf, out_ddata):
         'original_image_url', "dealerURL", "dealerUploadType"
     ]
 
-    print("Output vehicle columns:", ordered_columns_vehicle)
+    log.debug("output vehicle columns", columns=ordered_columns_vehicle)
     vehicle_df_reordered = pd.DataFrame()
     for col in ordered_columns_vehicle:
         if col in vehicle_df.columns:
@@ -73,7 +76,7 @@ def reorder_and_save_results(vehicle_data, diagram_data, out_vinf, out_ddata):
         'F8 Tire Size', 'F8 Wheel Material', 'original_image_url', "dealerURL", "dealerUploadType"
     ]
 
-    print("Output diagram columns:", ordered_columns_diagram)
+    log.debug("output diagram columns", columns=ordered_columns_diagram)
     new_diagram_df = pd.DataFrame()
     new_diagram_df['Stock Number'] = vehicle_df['Stock Number']
     new_diagram_df['Listing'] = vehicle_df['Listing']
@@ -85,36 +88,16 @@ def reorder_and_save_results(vehicle_data, diagram_data, out_vinf, out_ddata):
         else:
             new_diagram_df[col] = None
 
-    print(f"Writing vehicle data to {out_vinf} ...")
     vehicle_df_reordered.to_csv(out_vinf, index=False)
-    print(f"Writing diagram data to {out_ddata} ...")
     new_diagram_df.to_csv(out_ddata, index=False)
-    print(f"Successfully wrote reconciled CSVs:\n  {out_vinf}\n  {out_ddata}")
+    log.info("wrote reconciled CSVs", vehicle_csv=out_vinf, diagram_csv=out_ddata, rows=len(vehicle_df_reordered))
 
-def process_vehicle_data(vehicle_info_path, diagram_data_path, vehicle_info_org_path, mylistings):
+def load_org_vehicle_info(vehicle_info_org_path):
     """
-    Compares new vehicle & diagram CSVs with an original/master CSV to bucket into upload types.
-    Output is written to 'myresults/vehicle_info.csv' and 'myresults/diagram_data.csv'.
+    Returns {stock_number: price} from the original/master CSV.
     """
-    print("======= Starting reconciliation process =======")
-    print(f"vehicle_info_path: {vehicle_info_path}")
-    print(f"diagram_data_path: {diagram_data_path}")
-    print(f"vehicle_info_org_path: {vehicle_info_org_path}")
-    print(f"Listings length: {len(mylistings)}")
-
-    # Output directory
-    output_dir = "myresults"
-    os.makedirs(output_dir, exist_ok=True)
-
-    output_paths = {
-        "vehicle": os.path.join(output_dir, "vehicle_info.csv"),
-        "diagram": os.path.join(output_dir, "diagram_data.csv")
-    }
-
-    # Load original vehicle info (the master for reconciliation)
     org_vehicle_info = {}
 
-    print(f"Loading original vehicle info from {vehicle_info_org_path}...")
     org_file, org_reader = open_csv_reader_auto(vehicle_info_org_path)
     for row in org_reader:
         stock_num = row.get("Stock Number", "")
@@ -122,23 +105,19 @@ def process_vehicle_data(vehicle_info_path, diagram_data_path, vehicle_info_org_
         org_vehicle_info[stock_num] = price_val
     org_file.close()
 
-    print(f"Loaded {len(org_vehicle_info)} entries from master/original file.")
-
-    # Read new vehicle and diagram data, using open_csv_reader_auto for both!
-    print(f"Loading new vehicle/diagram data from {vehicle_info_path} and {diagram_data_path}...")
-    vehicle_file, vehicle_reader = open_csv_reader_auto(vehicle_info_path)
-    diagram_file, diagram_reader = open_csv_reader_auto(diagram_data_path)
-
-    vehicle_headers = vehicle_reader.fieldnames
-    diagram_headers = diagram_reader.fieldnames
-
-    print("Vehicle headers:", vehicle_headers)
-    print("Diagram headers:", diagram_headers)
+    log.info("loaded master vehicle info", path=vehicle_info_org_path, entries=len(org_vehicle_info))
+    return org_vehicle_info
 
+def bucket_rows(vehicle_rows, diagram_rows, org_vehicle_info, mylistings):
+    """
+    Tags each (vehicle, diagram) row pair with dealerURL and dealerUploadType
+    (new/update/present, by price comparison against the master file).
+    Returns (vehicle_data, diagram_data).
+    """
     vehicle_data = []
     diagram_data = []
 
-    for index, (vehicle_row, diagram_row) in enumerate(zip(vehicle_reader, diagram_reader)):
+    for index, (vehicle_row, diagram_row) in enumerate(zip(vehicle_rows, diagram_rows)):
         stock_number = vehicle_row.get("Stock Number", "")
         vehicle_price = vehicle_row.get("Vehicle Price", "") or vehicle_row.get("Price", "")
         dealer_url = mylistings[index] if index < len(mylistings) else ""
@@ -153,22 +132,21 @@ def process_vehicle_data(vehicle_info_path, diagram_data_path, vehicle_info_org_
                 org_price_float = float(str(org_price).replace(",", "").replace("$", "").strip()) if org_price else 0
                 if abs(vehicle_price_float - org_price_float) < 0.01:
                     upload_type = "present"
-                    print(f"Prices match for Stock Number: {stock_number} -- {vehicle_price} == {org_price}")
+                    log.debug("price match", stock=stock_number, price=vehicle_price)
                 else:
                     upload_type = "update"
-                    print(f"Prices DIFFER for Stock Number: {stock_number} -- {vehicle_price} != {org_price}")
+                    log.debug("price differs", stock=stock_number, price=vehicle_price, master_price=org_price)
             except Exception as e:
                 # String fallback
                 if str(vehicle_price).strip() == str(org_price).strip():
                     upload_type = "present"
-                    print(f"Prices match (string) for Stock Number: {stock_number} -- '{vehicle_price}' == '{org_price}'")
+                    log.debug("price match (string)", stock=stock_number, price=vehicle_price)
                 else:
                     upload_type = "update"
-                    print(f"Prices DIFFER (string) for Stock Number: {stock_number} -- '{vehicle_price}' != '{org_price}'")
-                    print("  Exception while comparing:", e)
+                    log.debug("price differs (string)", stock=stock_number, price=vehicle_price, master_price=org_price, error=str(e))
         else:
             upload_type = "new"
-            print(f"Stock Number NOT FOUND in master file: {stock_number} (upload_type=new)")
+            log.debug("stock not in master file", stock=stock_number)
 
         # Add dealer URL and upload type to each row
         vehicle_row["dealerURL"] = dealer_url
@@ -179,15 +157,50 @@ def process_vehicle_data(vehicle_info_path, diagram_data_path, vehicle_info_org_
         diagram_row["dealerUploadType"] = upload_type
         diagram_data.append(diagram_row)
 
-    vehicle_file.close()
-    diagram_file.close()
+    counts = {}
+    for row in vehicle_data:
+        counts[row["dealerUploadType"]] = counts.get(row["dealerUploadType"], 0) + 1
+    log.info("bucketed vehicles", total=len(vehicle_data), **counts)
+    return vehicle_data, diagram_data
 
-    print(f"Finished bucketing {len(vehicle_data)} vehicles. (new/update/present based on price comparison)")
+def reconcile_rows(vehicle_rows, diagram_rows, vehicle_info_org_path, mylistings, output_dir="myresults"):
+    """
+    In-memory version of process_vehicle_data: takes the scraped rows directly
+    (no CSV round-trip) and writes vehicle_info.csv / diagram_data.csv under output_dir.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    output_paths = {
+        "vehicle": os.path.join(output_dir, "vehicle_info.csv"),
+        "diagram": os.path.join(output_dir, "diagram_data.csv")
+    }
+
+    org_vehicle_info = load_org_vehicle_info(vehicle_info_org_path)
+    vehicle_data, diagram_data = bucket_rows(vehicle_rows, diagram_rows, org_vehicle_info, mylistings)
 
     # Write the reconciled results, ordered like Colab/output
-    print("Writing reconciled results...")
     reorder_and_save_results(vehicle_data, diagram_data, output_paths["vehicle"], output_paths["diagram"])
-    print("Reconciliation complete! Wrote:", output_paths["vehicle"], "and", output_paths["diagram"])
+    log.info("reconciliation complete", output_dir=output_dir)
+
+def process_vehicle_data(vehicle_info_path, diagram_data_path, vehicle_info_org_path, mylistings):
+    """
+    Compares new vehicle & diagram CSVs with an original/master CSV to bucket into upload types.
+    Output is written to 'myresults/vehicle_info.csv' and 'myresults/diagram_data.csv'.
+    """
+    log.info("starting reconciliation", vehicle_csv=vehicle_info_path, diagram_csv=diagram_data_path,
+             master_csv=vehicle_info_org_path, listings=len(mylistings))
+
+    # Read new vehicle and diagram data, using open_csv_reader_auto for both!
+    vehicle_file, vehicle_reader = open_csv_reader_auto(vehicle_info_path)
+    diagram_file, diagram_reader = open_csv_reader_auto(diagram_data_path)
+
+    log.debug("csv headers", vehicle=vehicle_reader.fieldnames, diagram=diagram_reader.fieldnames)
+
+    vehicle_rows = list(vehicle_reader)
+    diagram_rows = list(diagram_reader)
+    vehicle_file.close()
+    diagram_file.close()
+
+    reconcile_rows(vehicle_rows, diagram_rows, vehicle_info_org_path, mylistings, output_dir="myresults")
 
 if __name__ == "__main__":
     process_vehicle_data(
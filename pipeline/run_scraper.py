@@ -8,30 +8,26 @@ import subprocess
 sys.stdout.reconfigure(encoding="utf-8")
 sys.stderr.reconfigure(encoding="utf-8")
 
-# Import scrapers
-from scrapers.jasper_trucks import get_target_listings as get_jasper_listings, run as run_jasper
-from scrapers.five_star_trucks import get_listings as get_five_star_listings, run as run_five_star
-from scrapers.ftlgr_trucks import get_listings as get_ftlgr_listings, run as run_ftlgr
-from scrapers.fyda_freightliner import get_all_fyda_listings as get_fyda_listings, run as run_fyda
-from scrapers.shanes_equipment import get_listings as get_shanes_listings, run as run_shanes
-
-SCRAPERS = {
-    "jasper":        (get_jasper_listings, run_jasper),
-    "five_star":     (get_five_star_listings, run_five_star),
-    "ftlgr":         (get_ftlgr_listings, run_ftlgr),
-    "fyda":          (get_fyda_listings, run_fyda),
-    "shanes_equipment": (get_shanes_listings, run_shanes)
-}
+# Scrapers are resolved lazily: only the selected one (and its Selenium/openai/etc.
+# imports) is loaded, so --list / --dry-run start instantly.
+from scrapers import registry
+from core import metrics
+from core import cpu, fetch, ratelimit, image_store, openai_pack
+from core.log import get_logger
+from core.output import write_to_csv
+from core.output_fields import vehicle_attributes, diagram_attributes
+from pipeline.journal import RunJournal
+from pipeline.inventory import snapshot_for
+from pipeline import stages
+
+log = get_logger("pipeline.run_scraper")
 
 def print_dir_contents(path):
-    print(f"\n--- Directory listing for: {path} ---")
-    for item in os.listdir(path):
-        print("   ", item)
-    print("-----------------------------------------\n")
+    log.debug("directory listing", path=path, items=lambda: sorted(os.listdir(path)))
 
 def file_exists(path):
     exists = os.path.exists(path)
-    print(f"    [debug] Exists: {path} ? {exists}")
+    log.debug("file exists", path=path, exists=exists)
     return exists
 
 def main():
@@ -40,18 +36,49 @@ def main():
     )
     parser.add_argument(
         "--source", "-s",
-        required=True,
-        choices=list(SCRAPERS.keys()),
-        help="Which scraper to run: jasper, five_star, ftlgr, fyda, shanes_equipment"
+        choices=registry.names(),
+        help="Which scraper to run: " + ", ".join(registry.names())
     )
     parser.add_argument(
         "--limit", "-n", type=int, default=None,
         help="(Optional) Only scrape the first N results"
     )
+    parser.add_argument(
+        "--list", action="store_true",
+        help="List the available scrapers and exit (does not import any of them)"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="Show what would run for --source and exit (does not import the scraper)"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Continue an interrupted run from journal/<source>.jsonl instead of starting over"
+    )
+    parser.add_argument(
+        "--batch", action="store_true", default=os.environ.get("PIPELINE_ENGINE") == "batch",
+        help="Send all extraction/diagram prompts through the OpenAI Batch API (also PIPELINE_ENGINE=batch)"
+    )
     args = parser.parse_args()
 
+    if args.list:
+        for name in registry.names():
+            spec = registry.get_spec(name)
+            print(f"{name:<18} {spec['module']}  (listings: {spec['listings']}, fetch: {spec['fetch']})")
+        return
+    if not args.source:
+        parser.error("--source is required (or use --list)")
+
     source = args.source
-    get_listings_func, run_func = SCRAPERS[source]
+    if args.dry_run:
+        spec = registry.get_spec(source)
+        print(f"[run_scraper] DRY RUN '{source}'")
+        print(f"    module:    {spec['module']} (found: {registry.is_available(source)})")
+        print(f"    listings:  {spec['listings']}()  limit={args.limit}")
+        print(f"    stages:    fetched -> extracted -> written -> images (results/vehicleinfo.csv, results/diagram.csv, results/images)")
+        return
+
+    module = registry.load(source)
     os.makedirs("results", exist_ok=True)
     os.makedirs("results/images", exist_ok=True)
 
@@ -59,23 +86,73 @@ def main():
     diagram_csv  = os.path.join("results", "diagram.csv")
     image_root   = os.path.join("results", "images")
 
-    urls = get_listings_func()
+    # Optional: upload each listing's images while the next one is scraped (set by run_all)
+    uploader = None
+    incremental_prefix = os.environ.get("S3_INCREMENTAL_PREFIX")
+    if incremental_prefix:
+        from pipeline.s3_upload import S3Uploader
+        uploader = S3Uploader(os.environ.get("S3_BUCKET", "colton-bucket-prod"))
+
+    journal = RunJournal.for_source(source, resume=args.resume)
+    if journal.discovered is not None:
+        urls = journal.discovered
+    else:
+        with metrics.stage("discover", source):
+            urls = registry.get_listings_func(source)()
+        journal.record_discovered(urls)
     if args.limit is not None:
         urls = urls[: args.limit]
-    print(f"[run_scraper] Running '{source}' with {len(urls)} URLs.")
-    print(f"[debug] BEFORE SCRAPER RUN: Does vehicleinfo.csv exist? {os.path.exists(veh_info_csv)}")
-    print(f"[debug] BEFORE SCRAPER RUN: Does diagram.csv exist? {os.path.exists(diagram_csv)}")
-    for idx, url in enumerate(urls, start=1):
-        print(f"[{source}] {idx}/{len(urls)} => {url}")
-        run_func(url, veh_info_csv, diagram_csv, image_root)
-    print("-" * 60)
-    print(f"[debug] AFTER SCRAPER RUN for '{source}':")
+    log.info("running scraper", source=source, listings=len(urls))
+    snapshot = snapshot_for(source, module, registry.get_spec(source))
+    stages.prefetch(source, module, urls, journal, snapshot)
     file_exists(veh_info_csv)
     file_exists(diagram_csv)
-    print_dir_contents("results")
 
-    print("[run_scraper] Done with selected scraper.")
+    def write_rows(vehicle_row, diagram_row):
+        write_to_csv(vehicle_row, vehicle_attributes, veh_info_csv)
+        if diagram_row is not None:
+            write_to_csv(diagram_row, diagram_attributes, diagram_csv)
+
+    if args.batch:
+        # every prompt of the run in two Batch API jobs; rows land in the CSVs once both are back
+        from pipeline.batch import BatchPipeline
+        BatchPipeline(source, module, image_root, journal=journal, sink=write_rows, snapshot=snapshot).run(urls)
+        if uploader:
+            uploader.sync_folder(image_root, f"{incremental_prefix}/results/images")
+    else:
+        # one listing at a time: an LLM_PACK group could never fill
+        openai_pack.disable("run_scraper processes one listing at a time")
+        for idx, url in enumerate(urls, start=1):
+            log.info("listing", source=source, n=idx, total=len(urls), url=url)
+            try:
+                stages.process_listing(source, module, url, image_root, journal=journal, sink=write_rows,
+                                       snapshot=snapshot)
+            except Exception as e:
+                # Journal keeps the finished stages; --resume picks this listing up again
+                log.exception("listing failed", source=source, url=url, error=str(e))
+            if uploader:
+                uploader.sync_folder(image_root, f"{incremental_prefix}/results/images")
+    upload_failures = {}
+    if uploader:
+        # failures are logged, not raised: run_all's final sync (skip_existing) sends them again
+        upload_failures = uploader.wait()
+        uploader.close()
+    from core.openai_utils import llm_stats  # loaded with the scraper, not for --list
+    log.info("journal summary", path=journal.path, stages=journal.summary(), http=fetch.stats(),
+             rates=ratelimit.snapshot(), images=image_store.stats(), cpu=cpu.stats(),
+             llm=llm_stats(), upload_failures=len(upload_failures))
+    journal.close()
+    if snapshot:
+        snapshot.save()
+    image_store.maybe_prune()
+    # Per-listing stage timings; run_all merges this into the run summary
+    report = metrics.write_report(os.path.join("results", "run_report"))
+    log.info("stage timings written", path=report)
+    print(metrics.format_summary(metrics.summarize(metrics.records())))
+    file_exists(veh_info_csv)
+    file_exists(diagram_csv)
     print_dir_contents("results")
+    log.info("scraper done", source=source)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,358 @@
+# pipeline/s3_upload.py
+"""
+S3 uploader used by run_all / run_scraper.
+
+- One shared boto3 client per process (connection pool sized to the concurrency).
+- Large files go up as multipart uploads with a tuned chunk size, several parts
+  in flight at once, and a SHA-256 checksum (ChecksumAlgorithm) on every part and
+  single put, so S3 rejects corrupt data. When S3 returns the object's checksum
+  (the composite "<sha256 of part sha256s>-N" for multipart) it is compared too.
+  ETags are not used for verification: under SSE-KMS they are not an MD5.
+- If a multipart upload dies half way, the next call for the same key finds the
+  open upload, keeps the parts whose checksum matches the local data and only
+  sends the rest.
+- Streams (the zip that run_all builds into a pipe) go up the same way: parts
+  are read off the stream one chunk at a time with checksums, and a rerun that
+  produces the same bytes skips the parts an interrupted upload already sent.
+- Optional incremental mode: artifacts are uploaded in the background as they
+  appear on disk, and a manifest is written last. A failed artifact is logged
+  and returned by wait() rather than raised, and the next sync_folder (or the
+  next process) queues it again.
+
+Settings come from env so the ECS task definition can tune them:
+    S3_ENDPOINT_URL        e.g. http://localhost:9000 for MinIO (moto also works)
+    S3_MULTIPART_CHUNK_MB  part size, default 16
+    S3_MAX_CONCURRENCY     parts/files in flight, default 8
+"""
+
+import os
+import json
+import base64
+import hashlib
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+MB = 1024 * 1024
+DEFAULT_CHUNK_SIZE = int(os.environ.get("S3_MULTIPART_CHUNK_MB", "16")) * MB
+DEFAULT_CONCURRENCY = int(os.environ.get("S3_MAX_CONCURRENCY", "8"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client(max_concurrency: int = DEFAULT_CONCURRENCY):
+    """Return the process-wide S3 client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = boto3.client(
+                "s3",
+                endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+                config=Config(
+                    max_pool_connections=max(10, max_concurrency * 2),
+                    retries={"max_attempts": 5, "mode": "adaptive"},
+                ),
+            )
+        return _client
+
+
+def _md5(data: bytes) -> bytes:
+    return hashlib.md5(data).digest()
+
+
+def _sha256(data: bytes) -> str:
+    """Base64 SHA-256, the form S3's ChecksumSHA256 takes."""
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def _composite_sha256(checksums) -> str:
+    """S3's checksum of a multipart object: SHA-256 of the parts' SHA-256s, then -<part count>."""
+    digests = b"".join(base64.b64decode(c) for c in checksums)
+    return f"{_sha256(digests)}-{len(checksums)}"
+
+
+def _read_chunk(fileobj, size):
+    """Exactly `size` bytes from a stream, fewer only at EOF (a raw pipe read can return less)."""
+    buf = bytearray()
+    while len(buf) < size:
+        data = fileobj.read(size - len(buf))
+        if not data:
+            break
+        buf += data
+    return bytes(buf)
+
+
+class S3Uploader:
+    """Multipart, concurrent, resumable uploads into one bucket."""
+
+    def __init__(self, bucket, chunk_size=DEFAULT_CHUNK_SIZE,
+                 max_concurrency=DEFAULT_CONCURRENCY, client=None):
+        # S3 needs parts of at least 5 MB (except the last one)
+        self.bucket = bucket
+        self.chunk_size = max(chunk_size, 5 * MB)
+        self.max_concurrency = max_concurrency
+        self.client = client or get_s3_client(max_concurrency)
+        self._pool = None
+        self._pending = []    # [(key, future)]
+        self._uploaded = {}   # local path -> (size, mtime) already sent
+        self._queued = {}     # local path -> (size, mtime) in flight
+        self._lock = threading.Lock()
+
+    # ── Single files ────────────────────────────────────────────────────────
+    def upload_file(self, file_path, key):
+        """Upload one file, resuming an earlier partial multipart upload if there is one."""
+        size = os.path.getsize(file_path)
+        log.info("uploading file", path=file_path, bytes=size, dest=f"s3://{self.bucket}/{key}")
+        if size <= self.chunk_size:
+            with open(file_path, "rb") as f:
+                checksum = self._put(key, f.read())
+        else:
+            checksum = self._multipart_upload(file_path, key, size)
+        log.info("uploaded", dest=f"s3://{self.bucket}/{key}")
+        return checksum
+
+    def upload_stream(self, fileobj, key, check=None):
+        """
+        Upload a non-seekable stream (e.g. a pipe) chunk by chunk, with at most
+        max_concurrency parts in memory. Checksummed like upload_file; parts of an
+        open upload of `key` whose checksum matches what the stream produces are not sent again.
+
+        `check()` is called at EOF, before anything is made visible at `key`. If it
+        raises (the producer failed, so the stream is truncated), the multipart
+        upload is aborted and the existing object at `key` is left as it was.
+        """
+        log.info("streaming upload", dest=f"s3://{self.bucket}/{key}")
+        first = _read_chunk(fileobj, self.chunk_size)
+        second = _read_chunk(fileobj, self.chunk_size) if len(first) == self.chunk_size else b""
+        if not second:
+            if check:
+                check()
+            checksum = self._put(key, first)
+            log.info("uploaded", dest=f"s3://{self.bucket}/{key}", bytes=len(first))
+            return checksum
+
+        upload_id, done = self._open_upload(key)
+        futures = []
+        slots = threading.BoundedSemaphore(self.max_concurrency)
+
+        def send_part(part_number, data):
+            try:
+                return self._send_part(key, upload_id, part_number, data, done)
+            finally:
+                slots.release()
+
+        # Parts that fail leave the upload open so the next run can resume it.
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            data, size = first, 0
+            while data:
+                slots.acquire()
+                size += len(data)
+                futures.append(pool.submit(send_part, len(futures) + 1, data))
+                data, second = second, b""
+                if not data:
+                    data = _read_chunk(fileobj, self.chunk_size)
+            parts = [f.result() for f in futures]
+
+        if check:
+            try:
+                check()
+            except Exception:
+                # a truncated stream must never complete; its parts are no use to a rerun either
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+                log.warning("stream failed; multipart upload aborted", dest=f"s3://{self.bucket}/{key}")
+                raise
+
+        checksum = self._complete(key, upload_id, parts)
+        log.info("uploaded", dest=f"s3://{self.bucket}/{key}", bytes=size, parts=len(parts))
+        return checksum
+
+    def _verify(self, key, expected, resp):
+        """Compare S3's ChecksumSHA256 with ours when it returns one (it already checked each request's body)."""
+        got = resp.get("ChecksumSHA256")
+        if got and got != expected:
+            raise RuntimeError(f"Checksum mismatch for s3://{self.bucket}/{key}: {got} != {expected}")
+        return expected
+
+    def _put(self, key, data):
+        checksum = _sha256(data)
+        resp = self.client.put_object(Bucket=self.bucket, Key=key, Body=data,
+                                      ChecksumAlgorithm="SHA256", ChecksumSHA256=checksum)
+        return self._verify(key, checksum, resp)
+
+    def _open_upload(self, key):
+        """(upload_id, parts already there) for `key`: an unfinished upload to resume, or a new one."""
+        upload_id, done = self._find_open_upload(key)
+        if upload_id is None:
+            upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key,
+                                                            ChecksumAlgorithm="SHA256")["UploadId"]
+        return upload_id, done
+
+    def _send_part(self, key, upload_id, part_number, data, done):
+        """Upload one part unless the open upload already has it -> its entry for complete_multipart_upload."""
+        checksum = _sha256(data)
+        have = done.get(part_number)
+        # S3 lists each part's checksum; an endpoint that does not falls back to the part's MD5 ETag
+        if have and (have.get("ChecksumSHA256") == checksum
+                     or (not have.get("ChecksumSHA256") and have["ETag"].strip('"') == _md5(data).hex())):
+            return {"PartNumber": part_number, "ETag": have["ETag"], "ChecksumSHA256": checksum}
+        resp = self.client.upload_part(
+            Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=data,
+            ChecksumAlgorithm="SHA256", ChecksumSHA256=checksum,
+        )
+        self._verify(key, checksum, resp)
+        return {"PartNumber": part_number, "ETag": resp["ETag"], "ChecksumSHA256": checksum}
+
+    def _complete(self, key, upload_id, parts):
+        resp = self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts},
+        )
+        return self._verify(key, _composite_sha256([p["ChecksumSHA256"] for p in parts]), resp)
+
+    def _find_open_upload(self, key):
+        """Return (upload_id, {part_number: listed part}) for an unfinished upload of `key`, if any."""
+        resp = self.client.list_multipart_uploads(Bucket=self.bucket, Prefix=key)
+        # only uploads started with SHA-256 checksums: their parts can be verified and completed the same way
+        uploads = [u for u in resp.get("Uploads", []) if u["Key"] == key and u.get("ChecksumAlgorithm") == "SHA256"]
+        if not uploads:
+            return None, {}
+        upload_id = max(uploads, key=lambda u: u["Initiated"])["UploadId"]
+        done = {}
+        paginator = self.client.get_paginator("list_parts")
+        for page in paginator.paginate(Bucket=self.bucket, Key=key, UploadId=upload_id):
+            for part in page.get("Parts", []):
+                done[part["PartNumber"]] = part
+        log.info("resuming multipart upload", key=key, parts_done=len(done))
+        return upload_id, done
+
+    def _multipart_upload(self, file_path, key, size):
+        upload_id, done = self._open_upload(key)
+        part_count = (size + self.chunk_size - 1) // self.chunk_size
+
+        def send_part(part_number):
+            with open(file_path, "rb") as f:
+                f.seek((part_number - 1) * self.chunk_size)
+                data = f.read(self.chunk_size)
+            return self._send_part(key, upload_id, part_number, data, done)
+
+        # Parts that fail leave the upload open so the next run can resume it.
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            parts = list(pool.map(send_part, range(1, part_count + 1)))
+        return self._complete(key, upload_id, parts)
+
+    # ── Incremental artifacts ───────────────────────────────────────────────
+    def submit(self, file_path, key, stat=None):
+        """Queue a background upload of one artifact. Only a successful upload marks it as sent."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        stat = stat or os.stat(file_path)
+        version = (stat.st_size, stat.st_mtime)
+        with self._lock:
+            self._queued[file_path] = version
+
+        def settle(future):
+            with self._lock:
+                if self._queued.get(file_path) == version:
+                    del self._queued[file_path]
+                if future.exception() is None:
+                    self._uploaded[file_path] = version
+
+        future = self._pool.submit(self.upload_file, file_path, key)
+        future.add_done_callback(settle)
+        self._pending.append((key, future))
+
+    def _existing(self, key_prefix):
+        """{key: (size, last modified as a timestamp)} of the objects under key_prefix."""
+        found = {}
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=key_prefix.rstrip("/") + "/"):
+            for obj in page.get("Contents", []):
+                found[obj["Key"]] = (obj["Size"], obj["LastModified"].timestamp())
+        return found
+
+    def sync_folder(self, folder, key_prefix, skip_existing=False):
+        """
+        Queue every file under `folder` that is new or changed since the last call.
+        Called after each listing so images go up while the next listing is scraped.
+        With skip_existing, objects already in S3 with the same size that were
+        uploaded after the local file last changed are left alone (used by a fresh
+        process, e.g. run_all after run_scraper, or a rerun). A file edited since,
+        even to the same length, goes up again.
+        """
+        existing = self._existing(key_prefix) if skip_existing else {}
+        queued = 0
+        for root, dirs, files in os.walk(folder):
+            for f in files:
+                path = os.path.join(root, f)
+                stat = os.stat(path)
+                version = (stat.st_size, stat.st_mtime)
+                with self._lock:
+                    if version in (self._uploaded.get(path), self._queued.get(path)):
+                        continue
+                rel = os.path.relpath(path, folder).replace(os.sep, "/")
+                key = f"{key_prefix.rstrip('/')}/{rel}"
+                size, uploaded = existing.get(key, (None, 0))
+                if size == stat.st_size and uploaded >= stat.st_mtime:
+                    with self._lock:
+                        self._uploaded[path] = version
+                    continue
+                self.submit(path, key, stat)
+                queued += 1
+        return queued
+
+    def wait(self):
+        """Block until every queued upload is done. Returns {key: error} for the ones that failed (each is logged)."""
+        pending, self._pending = self._pending, []
+        failed = {}
+        for key, future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                log.error("upload failed", dest=f"s3://{self.bucket}/{key}", error=str(e))
+                failed[key] = str(e)
+        if failed:
+            log.warning("uploads failed; they are queued again by the next sync", failed=len(failed),
+                        uploaded=len(pending) - len(failed))
+        return failed
+
+    def write_manifest(self, key_prefix, extra=None):
+        """
+        Upload manifest.json listing everything under `key_prefix`. Call this last.
+        Queued uploads that failed are listed under "failed" (their keys are not in "objects").
+        """
+        failed = self.wait()
+        prefix = key_prefix.rstrip("/") + "/"
+        objects = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith("/manifest.json"):
+                    continue
+                objects.append({"key": obj["Key"], "size": obj["Size"], "etag": obj["ETag"].strip('"')})
+        manifest = {
+            "created": datetime.datetime.utcnow().isoformat() + "Z",
+            "objects": objects,
+        }
+        if failed:
+            manifest["failed"] = sorted(failed)
+        manifest.update(extra or {})
+        body = json.dumps(manifest, indent=2).encode("utf-8")
+        self.client.put_object(
+            Bucket=self.bucket, Key=prefix + "manifest.json", Body=body,
+            ContentType="application/json",
+            ChecksumAlgorithm="SHA256", ChecksumSHA256=_sha256(body),
+        )
+        log.info("wrote manifest", objects=len(objects), dest=f"s3://{self.bucket}/{prefix}manifest.json")
+        return manifest
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,234 @@
+# pipeline/stages.py
+"""
+The per-listing pipeline shared by run_scraper and the orchestrator:
+
+    fetched   -> page text from module.get_vehicle_page_html
+    extracted -> GPT extraction + make_extracted_info_compliant + diagram
+    written   -> rows handed to `sink` (run_scraper appends them to the CSVs)
+    images    -> image URLs, download, watermark
+
+Every stage takes its slot from the shared ResourceBudget, and when a
+RunJournal is passed, each stage is recorded and skipped on resume.
+Each step is timed with core.metrics (inside its budget slot, so queueing
+for a slot is not counted as work).
+
+Where dealers' own run() functions differed, the registry spec says how: which
+row field names the photo folder, the photo layout, and whether a listing whose
+diagram call returns nothing gets an empty diagram row or none (diagram_row is
+then None, and sinks write only the vehicle row).
+
+With an InventorySnapshot (pipeline/inventory.py), a listing whose discovery
+summary is unchanged since the last run skips fetched/extracted and reuses
+the saved rows. Its photos are linked back from the image store when that
+run recorded them and the store still has them, and fetched otherwise.
+"""
+
+import os
+
+from core import cpu, metrics
+from core.concurrency import get_budget
+from core.log import get_logger
+from core.output_fields import vehicle_attributes, diagram_attributes
+from scrapers import registry
+
+log = get_logger(__name__)
+
+WATERMARK_PATH = os.path.join("data", "raw", "group.png")
+
+
+def prefetch(name, module, urls, journal=None, snapshot=None):
+    """Hand the dealer's prefetch hook every URL that still needs its page fetched."""
+    hook = registry.get_spec(name).get("prefetch")
+    if not hook:
+        return
+    todo = [url for url in urls
+            if not (journal and (journal.done(url, "fetched") or journal.done(url, "extracted")))
+            and not (snapshot and snapshot.is_unchanged(url))]
+    if todo:
+        getattr(module, hook)(todo)
+
+
+def _fetch(name, module, url, budget, journal):
+    if journal and journal.done(url, "fetched"):
+        return journal.data(url, "fetched")
+    spec = registry.get_spec(name)
+    if spec.get("prefetch_wait"):
+        # a prefetched page is fetched elsewhere; only collecting it counts against the budget
+        with metrics.stage("prefetch_wait", name, url):
+            getattr(module, spec["prefetch_wait"])(url)
+    with budget.slot(spec["fetch"]), metrics.stage("fetch", name, url) as rec:
+        vehicle_text = module.get_vehicle_page_html(url)
+        rec["bytes"] = len((vehicle_text or "").encode("utf-8"))
+    if not vehicle_text:
+        if journal:
+            journal.record_failure(url, "fetched", "no text")
+        return None
+    if journal:
+        journal.record(url, "fetched", vehicle_text)
+    return vehicle_text
+
+
+def _llm_extract(name, module, url, vehicle_text, budget, journal):
+    """GPT extraction -> dict with the page text attached, or None."""
+    with budget.slot("llm"), metrics.stage("extract", name, url):
+        extracted = module.extract_vehicle_info(vehicle_text)
+    if not isinstance(extracted, dict):
+        if journal:
+            journal.record_failure(url, "extracted", "extraction returned non-dict")
+        return None
+    extracted["Original info description"] = vehicle_text
+    return extracted
+
+
+def _normalize(name, module, url, extracted):
+    with metrics.stage("normalize", name, url):
+        # difflib scoring is pure CPU: run it off this thread (core.cpu)
+        compliant = cpu.run(module.make_extracted_info_compliant, extracted)
+    compliant["original_image_url"] = url
+    compliant["dealerName"] = name
+    return compliant
+
+
+def _diagram(name, module, url, compliant, budget, journal):
+    """Diagram call + final rows; records "extracted"."""
+    with budget.slot("llm"), metrics.stage("diagram", name, url):
+        diagram = module.complete_diagram_info({"Listing": url}, compliant)
+
+    vehicle_row = {attr: compliant.get(attr, "") for attr in vehicle_attributes}
+    if not diagram and registry.get_spec(name).get("no_diagram") == "skip":
+        log.warning("no diagram info; no diagram row", dealer=name, url=url)
+        diagram_row = None
+    else:
+        diagram = dict(diagram or {}, Listing=url, original_image_url=url)
+        diagram_row = {attr: diagram.get(attr, "") for attr in diagram_attributes}
+    if journal:
+        journal.record(url, "extracted", {"vehicle": vehicle_row, "diagram": diagram_row})
+    return vehicle_row, diagram_row
+
+
+def _extract(name, module, url, vehicle_text, budget, journal):
+    if journal and journal.done(url, "extracted"):
+        rows = journal.data(url, "extracted")
+        return rows["vehicle"], rows["diagram"]
+    extracted = _llm_extract(name, module, url, vehicle_text, budget, journal)
+    if extracted is None:
+        return None
+    compliant = _normalize(name, module, url, extracted)
+    return _diagram(name, module, url, compliant, budget, journal)
+
+
+def _reuse(name, url, journal, snapshot):
+    """Rows that need no fetch or LLM work: (rows, from_snapshot), or (None, False)."""
+    if journal and journal.done(url, "extracted"):
+        rows = journal.data(url, "extracted")
+        return (rows["vehicle"], rows["diagram"]), False
+    if snapshot:
+        rows = snapshot.unchanged(url)
+        if rows is not None:
+            log.debug("unchanged since last run; reusing rows", dealer=name, url=url)
+            if journal:
+                journal.record(url, "extracted", {"vehicle": rows[0], "diagram": rows[1]})
+            return rows, True
+    return None, False
+
+
+def _write(name, url, rows, sink, journal):
+    if sink and not (journal and journal.done(url, "written")):
+        with metrics.stage("write_csv", name, url):
+            sink(*rows)
+        if journal:
+            journal.record(url, "written")
+
+
+def photo_stock(name, vehicle_row):
+    """The name of a listing's photo folder ("" when it gets no photos)."""
+    spec = registry.get_spec(name)
+    for field in spec.get("stock", ["Stock Number"]):
+        stock = str(vehicle_row.get(field) or "").strip()
+        if stock:
+            return stock
+    return spec.get("stock_default", "")
+
+
+def _listing_images(name, url, rows, image_root, budget, journal, snapshot, reused):
+    stock = photo_stock(name, rows[0])
+    if not (registry.get_spec(name)["images"] and stock):
+        return
+    if reused and snapshot.images_done(url):
+        from core import image_store
+
+        photos = snapshot.photos(url)
+        if photos is not None and image_store.enabled() and image_store.relink(photos, image_root):
+            log.debug("photos unchanged since last run; linked from the image store", dealer=name, url=url)
+            return
+        log.info("photos of an unchanged unit are not in the image store; fetching them", dealer=name, url=url)
+    photos = _images(name, url, stock, image_root, budget, journal)
+    if photos is not False and snapshot:
+        snapshot.mark_images(url, photos)
+
+
+def _images(name, url, stock, image_root, budget, journal):
+    """
+    Fetch, download and watermark the listing's photos. Returns
+    {path under image_root: image store file} for the files it linked (None when
+    that is unknown: image store off, or done by an earlier run in the journal),
+    or False if the stage failed.
+    """
+    if journal and journal.done(url, "images"):
+        return None
+    from core import image_store
+    from core.image_utils import extract_image_urls_from_page, download_images, watermark_images
+
+    photos = dict({"prefix": "", "watermarked": "{stock}-watermarked"}, **registry.get_spec(name).get("photos", {}))
+    target = os.path.join(image_root, stock)
+    try:
+        with budget.slot(registry.get_spec(name)["fetch"]), metrics.stage("image_urls", name, url):
+            image_urls = extract_image_urls_from_page(url, dealer=name)
+        with image_store.recording() as links:
+            if image_urls:
+                with budget.slot("http"), metrics.stage("download", name, url) as rec:
+                    downloaded = download_images(image_urls, target, dealer=name,
+                                                 prefix=photos["prefix"].format(stock=stock))
+                    rec["bytes"] = sum(os.path.getsize(p) for p in downloaded if os.path.exists(p))
+                with metrics.stage("watermark", name, url):
+                    watermark_images(downloaded, os.path.join(image_root, photos["watermarked"].format(stock=stock)),
+                                     WATERMARK_PATH)
+            else:
+                log.info("no image urls found", dealer=name, url=url)
+        if journal:
+            journal.record(url, "images")
+        if not image_store.enabled():
+            return None
+        return {os.path.relpath(dest, image_root).replace(os.sep, "/"): os.path.relpath(src, image_store.STORE_DIR)
+                for dest, src in links.items()}
+    except Exception as e:
+        log.error("image stage failed", dealer=name, url=url, error=str(e))
+        if journal:
+            journal.record_failure(url, "images", e)
+        return False
+
+
+def process_listing(name, module, url, image_root, budget=None, journal=None, sink=None, snapshot=None):
+    """
+    Run every stage for one listing.
+    `sink(vehicle_row, diagram_row)` is called once per listing (never again on resume).
+    Returns (vehicle_row, diagram_row), or None if the listing was skipped.
+    """
+    budget = budget or get_budget()
+
+    rows, reused = _reuse(name, url, journal, snapshot)
+    if rows is None:
+        vehicle_text = _fetch(name, module, url, budget, journal)
+        if not vehicle_text:
+            log.warning("no page text; skipping", dealer=name, url=url)
+            return None
+        rows = _extract(name, module, url, vehicle_text, budget, journal)
+        if rows is None:
+            log.warning("extraction returned non-dict; skipping", dealer=name, url=url)
+            return None
+        if snapshot:
+            snapshot.update(url, *rows)
+
+    _write(name, url, rows, sink, journal)
+    _listing_images(name, url, rows, image_root, budget, journal, snapshot, reused)
+    return rows
@@ -7,15 +7,35 @@ Packages both "results/" and "myresults/" directories into a single date-stamped
 Usage:
     python zip_only.py
     python zip_only.py --output jasper_results_2025-07-09_coltonmkt.zip
+    python zip_only.py --mode deflate   # old behaviour: deflate every file serially
 
 It uses the SCRAPER_NAME env variable if available for the filename.
+
+The default "fast" mode stores images (JPEG/PNG/WebP, already compressed) as-is
+and only deflates text members such as CSV/HTML. Large text members are read
+on worker threads a few files ahead of the writer (at most workers * 2 at a
+time, so memory stays bounded). Deflating itself is not parallel: it runs on
+the writer thread through ZipFile's own writer, so the saving comes from not
+deflating media and from overlapping disk reads with compression.
 """
 
 import os
 import sys
 import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Media formats that are already compressed; deflating them only burns CPU.
+STORED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif', '.zip', '.gz')
+
+# Text members at or above this size are read ahead on a worker thread.
+READ_AHEAD_MIN_BYTES = 256 * 1024
+
+# The folders that make up a results archive, as (folder_path, arc_root) pairs.
+RESULT_FOLDERS = [("results", "results"), ("myresults", "myresults")]
+
+
 def zip_folder(zip_file: zipfile.ZipFile, folder_path: str, arc_root: str) -> None:
     """
     Walk through `folder_path` and add all files/subfolders under it into `zip_file`.
@@ -28,10 +48,89 @@ def zip_folder(zip_file: zipfile.ZipFile, folder_path: str, arc_root: str) -> No
             arc_name = os.path.join(arc_root, rel_path)
             zip_file.write(abs_path, arc_name)
 
+
+def compression_for(path: str) -> int:
+    """Return ZIP_STORED for already-compressed media, ZIP_DEFLATED for everything else."""
+    if path.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def iter_members(folder_path: str, arc_root: str):
+    """Yield (abs_path, arc_name) for every file under `folder_path`, in a stable order."""
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for f in sorted(files):
+            abs_path = os.path.join(root, f)
+            rel_path = os.path.relpath(abs_path, folder_path)
+            yield abs_path, os.path.join(arc_root, rel_path)
+
+
+def _read_member(abs_path: str) -> bytes:
+    """Read one file ahead of the writer (runs on a worker thread)."""
+    with open(abs_path, "rb") as f:
+        return f.read()
+
+
+def _write_read_ahead(zip_file: zipfile.ZipFile, abs_path: str, arc_name: str, data: bytes) -> None:
+    """Deflate a member whose bytes were read by _read_member, through the public zf.open(..., "w") writer."""
+    zinfo = zipfile.ZipInfo.from_file(abs_path, arc_name)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    with zip_file.open(zinfo, "w", force_zip64=len(data) > zipfile.ZIP64_LIMIT) as dest:
+        dest.write(data)
+
+
+def write_results_zip(fileobj, folders=None, workers: int = 4) -> int:
+    """
+    Write `folders` ([(folder_path, arc_root), ...]) into `fileobj` as one ZIP.
+
+    `fileobj` may be a path, a regular file or a non-seekable stream such as the
+    write end of a pipe feeding an S3 upload. Media is stored, text is deflated,
+    and text members >= READ_AHEAD_MIN_BYTES are read ahead on `workers`
+    threads, with at most workers * 2 of them in memory (deflate runs on the
+    calling thread).
+    Returns the number of members written.
+    """
+    folders = folders or RESULT_FOLDERS
+    window = max(1, workers * 2)
+
+    count = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+         zipfile.ZipFile(fileobj, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        ahead = deque()   # (abs_path, arc_name, future or None), in archive order
+
+        def write_next():
+            abs_path, arc_name, future = ahead.popleft()
+            if future is not None:
+                _write_read_ahead(zf, abs_path, arc_name, future.result())
+            else:
+                zf.write(abs_path, arc_name, compress_type=compression_for(abs_path))
+
+        for folder_path, arc_root in folders:
+            for abs_path, arc_name in iter_members(folder_path, arc_root):
+                future = None
+                if (compression_for(abs_path) == zipfile.ZIP_DEFLATED
+                        and os.path.getsize(abs_path) >= READ_AHEAD_MIN_BYTES):
+                    future = pool.submit(_read_member, abs_path)
+                ahead.append((abs_path, arc_name, future))
+                if len(ahead) >= window:
+                    write_next()
+                    count += 1
+        while ahead:
+            write_next()
+            count += 1
+    return count
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Zips results/ and myresults/ folders")
     parser.add_argument("--output", help="Output ZIP file name", default=None)
+    parser.add_argument(
+        "--mode", choices=["fast", "deflate"], default="fast",
+        help="fast: store media, deflate text with read-ahead (default); deflate: deflate everything serially"
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Read-ahead threads for --mode fast")
     args = parser.parse_args()
 
     # Get SCRAPER_NAME from env if available
@@ -51,12 +150,16 @@ def main():
         print("Error: ./myresults/ folder not found. Nothing to zip.")
         sys.exit(1)
 
-    print(f"-> Creating ZIP file: {zip_filename}")
-    with zipfile.ZipFile(zip_filename, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
-        print("   -> Adding 'results/' …")
-        zip_folder(zf, "results", arc_root="results")
-        print("   -> Adding 'myresults/' …")
-        zip_folder(zf, "myresults", arc_root="myresults")
+    print(f"-> Creating ZIP file: {zip_filename} (mode={args.mode})")
+    if args.mode == "fast":
+        count = write_results_zip(zip_filename, RESULT_FOLDERS, workers=args.workers)
+        print(f"   -> Added {count} files from 'results/' and 'myresults/'")
+    else:
+        with zipfile.ZipFile(zip_filename, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+            print("   -> Adding 'results/' …")
+            zip_folder(zf, "results", arc_root="results")
+            print("   -> Adding 'myresults/' …")
+            zip_folder(zf, "myresults", arc_root="myresults")
 
     print(f"Done. Created `{zip_filename}` in the project root.")
 
@@ -9,16 +9,13 @@ import difflib
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse, parse_qs, urlencode
-import openai
 from core.output import write_to_csv
+from core import metrics
+from core import cpu, fetch, htmlparse, openai_utils
+from core.log import get_logger
 # Disable SSL warnings for requests (not recommended for production)
 
-from PIL import Image, ImageDraw, ImageFont, ImageOps, ImageFilter, ImageEnhance
-from PIL.Image import Resampling
-import io
-import cairosvg
-
-from core.output_fields import vehicle_attributes, diagram_attributes
+from core.output_fields import vehicle_attributes, diagram_attributes, llm_vehicle_fields, numeric_vehicle_attributes
 from core.image_utils import extract_image_urls_from_page, download_images, watermark_images
 
 
@@ -27,12 +24,12 @@ downloadImages = True
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 # ── Configuration ───────────────────────────────────────────────────────────────
-# (Pull OPENAI_API_KEY from .env via dotenv if you wish, or rely on environment variable.)
+# (Pull OPENAI_API_KEY / LLM_BACKEND settings from .env via dotenv if you wish, or rely on environment variables;
+#  core.openai_utils picks the backend when the first request is made.)
 from dotenv import load_dotenv
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY", "")
-if not openai.api_key:
-    raise RuntimeError("OPENAI_API_KEY not set. Aborting.")
+
+log = get_logger(__name__)
 
 WATERMARK_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data/raw/group.png'))
 
@@ -561,31 +558,18 @@ def complete_diagram_info(diagram_info, compliant_info):
     mymessages = [
         {"role": "system", "content": f"You are a vehicle data extraction assistant. Extract information from the text and return it in a JSON format with these fields:{myfields}"},
         {"role": "user", "content": f"Extract vehicle information from this text: {mytext}"}]
-    print("mymessages")
-    print(mymessages)
+    log.debug("diagram request", url=compliant_info.get('original_image_url', ''), messages=lambda: mymessages)
     try:
-        response = openai.ChatCompletion.create(model="gpt-3.5-turbo",
-                                                messages=mymessages,
-                                                temperature=0.1,
-                                                max_tokens=1000)
-
-        #extracted_info = extract_json(response.choices[0].message.content)
-        extracted_info = response.choices[0].message.content
-        print("GREGORITY's first debug")
-        # Try to parse and re-serialize to ensure valid JSON format
-        try:
-            extracted_info = json.loads(extracted_info)
-            extracted_info = {k: '' if v is None else v for k, v in extracted_info.items()}
-            extracted_info.update(diagram_info)
-            return extracted_info
-        except json.JSONDecodeError:
-            print("Warning: Response was not valid JSON")
+        extracted_info = openai_utils.complete_json(mymessages, openai_utils.prompt_fields(myfields), task="diagram")
+        if extracted_info is None:
+            log.warning("diagram response was not valid JSON")
             return None
+        extracted_info.update(diagram_info)
+        return extracted_info
 
     except Exception as e:
-        print(f"Error during extraction: {str(e)}")
+        log.error("diagram extraction failed", error=str(e))
         return None
-    print('I should not see this')
 
 
     return ''
@@ -594,11 +578,8 @@ def complete_diagram_info(diagram_info, compliant_info):
 # ── (A) 2) Get all listing URLs from a CSV file ─────────────────────────────────
 # ── (B) 2) Fetch raw page HTML / text ──────────────────────────────────────────
 def get_vehicle_page_html(url):
-    print('url: ', url)
+    log.debug("fetching listing page", url=url)
     try:
-        # Create a session to maintain cookies
-        session = requests.Session()
-
         # Modified headers - remove Accept-Encoding to let requests handle it
         headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
@@ -610,21 +591,18 @@ def get_vehicle_page_html(url):
         }
 
         # Make the request with additional parameters
-        response = session.get(
+        response = fetch.get(
             url,
+            dealer="five_star",
             headers=headers,
             allow_redirects=True,
-            timeout=30,
             verify=False
         )
 
-        print(f"Response headers: {dict(response.headers)}")
+        log.debug("listing response", url=url, status=response.status_code, headers=lambda: dict(response.headers))
 
         if response.status_code == 200:
             # Detect the correct encoding if possible
-            if 'content-type' in response.headers:
-                print(f"Content-Type header: {response.headers['content-type']}")
-
             # Let Requests handle the encoding automatically
             try:
                 decoded_content = response.text
@@ -635,20 +613,17 @@ def get_vehicle_page_html(url):
                 for encoding in encodings_to_try:
                     try:
                         decoded_content = response.content.decode(encoding)
-                        print(f"Successfully decoded with {encoding}")
+                        log.debug("decoded listing page", url=url, encoding=encoding)
                         break
                     except UnicodeDecodeError:
                         continue
                 if not decoded_content:
-                    print("Failed to decode with all attempted encodings")
+                    log.warning("failed to decode listing page", url=url)
                     return None
 
-            print(f"Status Code: {response.status_code}")
-            print(f"Final URL: {response.url}")
-
-            soup = BeautifulSoup(decoded_content, 'lxml')
-            # Extract all text
-            full_text = soup.get_text(separator=' ', strip=True)
+            # Extract all text (in a core.cpu worker when the pool is on; in-thread the
+            # tree is shared with the gallery lookup in core.image_utils)
+            full_text = cpu.run(htmlparse.section_text, decoded_content, "/html") or ""
 
             # Find index of "You may also like"
             marker = "You may also like"
@@ -662,28 +637,22 @@ def get_vehicle_page_html(url):
                 # Marker not found; return full text
                 text_content = full_text
 
-            print(f"Extracted content length: {len(text_content)}")
-
-            if text_content:
-                print("First 500 characters of extracted content:")
-                print(text_content[:500])
-            else:
-                print("No content extracted")
+            log.debug("extracted listing text", url=response.url, chars=len(text_content),
+                      head=lambda: text_content[:500])
+            if not text_content:
+                log.warning("no content extracted", url=url)
 
             return text_content
 
         else:
-            print(f"Failed to fetch page. Status code: {response.status_code}")
+            log.warning("failed to fetch listing page", url=url, status=response.status_code)
             return None
 
     except requests.RequestException as e:
-        print(f"Error fetching the webpage: {str(e)}")
+        log.warning("error fetching listing page", url=url, error=str(e))
         return None
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
-        print(f"Error type: {type(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        log.exception("unexpected error fetching listing page", url=url, error=str(e))
         return None
 
 # original function
@@ -734,102 +703,45 @@ The field ""Unique id"" should always be empty.
     ]
 
     try:
-        response = openai.ChatCompletion.create(model="gpt-3.5-turbo",
-                                                messages=messages,
-                                                temperature=0.1,
-                                                max_tokens=1000)
-
-        extracted_info = response.choices[0].message.content
-        print("jeremy's first debug")
-        print(extracted_info)
-        # Try to parse and re-serialize to ensure valid JSON format
-        try:
-            extracted_info = json.loads(extracted_info)
-            return extracted_info
-        except json.JSONDecodeError:
-            print("Warning: Response was not valid JSON")
-            return None
+        extracted_info = openai_utils.complete_json(messages, llm_vehicle_fields, numeric=numeric_vehicle_attributes)
+        if extracted_info is None:
+            log.warning("extraction response was not valid JSON")
+        return extracted_info
 
     except Exception as e:
-        print(f"Error during extraction: {str(e)}")
+        log.error("extraction failed", error=str(e))
         return None
 
 
 def get_listings():
     """
-    Step 1: Try using Bright Data proxy from environment variables.
-    Step 2: If forbidden, retry with no proxy.
-    Each strategy is clearly commented for future debugging and tracking.
+    Inventory page -> truck detail URLs.
+    Routing (Bright Data first, then direct) and the failover when the proxy is
+    forbidden or returns a page without truck links come from core.fetch's
+    five_star policy. Set FIVESTAR_DEBUG=1 to keep the fetched HTML.
     """
     url = "https://www.5startrucksales.us/semi-trucks/"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
     }
-    # Set up proxies from env (.env loaded by dotenv or ECS task env)
-    # proxy_host = os.environ.get("BRIGHTDATA_PROXY_HOST")
-    # proxy_port = os.environ.get("BRIGHTDATA_PROXY_PORT")
-    # proxy_user = os.environ.get("BRIGHTDATA_PROXY_USER")
-    # proxy_pass = os.environ.get("BRIGHTDATA_PROXY_PASS")
-    proxy_host = os.getenv('BRIGHTDATA_FIVESTAR_PROXY_HOST', 'brd.superproxy.io')
-    proxy_port = os.getenv('BRIGHTDATA_FIVESTAR_PROXY_PORT', '33335')
-    proxy_user = os.getenv('BRIGHTDATA_FIVESTAR_PROXY_USER')
-    proxy_pass = os.getenv('BRIGHTDATA_FIVESTAR_PROXY_PASS')
-    use_proxy = all([proxy_host, proxy_port, proxy_user, proxy_pass])
-    links = []
-
-    # --------------- Attempt 1: Bright Data Proxy --------------------
-    if use_proxy:
-        proxies = {
-            "http": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}",
-            "https": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}",
-        }
-        print(f"[five_star][proxy] Using proxy settings:")
-        # print(f"  BRIGHTDATA_PROXY_USER = {proxy_user}")
-        print(f"  BRIGHTDATA_FIVESTAR_PROXY_USER = {proxy_user}")
-        # print(f"  BRIGHTDATA_PROXY_PASS = {'SET' if proxy_pass else 'NOT SET'}")
-        print(f"  BRIGHTDATA_FIVESTAR_PROXY_PASS = {'SET' if proxy_pass else 'NOT SET'}")
-        # print(f"  BRIGHTDATA_PROXY_HOST = {proxy_host}")
-        print(f"  BRIGHTDATA_FIVESTAR_PROXY_HOST = {proxy_host}")
-        # print(f"  BRIGHTDATA_PROXY_PORT = {proxy_port}")
-        print(f"  BRIGHTDATA_FIVESTAR_PROXY_PORT = {proxy_port}")
-
-        print("[five_star][proxy] Trying Bright Data proxy first.")
-        try:
-            response = requests.get(url, headers=headers, proxies=proxies, timeout=45, verify=False)
-            print(f"[five_star][proxy] Status code: {response.status_code}")
-            if response.status_code == 403:
-                print("[five_star][proxy] Proxy forbidden, will try direct (local) request next.")
-                raise Exception("Proxy forbidden")
-            with open("results/five_star_debug_proxy.html", "w", encoding="utf-8") as f:
-                f.write(response.text)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            links = [a["href"] for a in soup.find_all("a", href=True)
-                        if "/trucks/" in a["href"] or "www.5startrucksales.us/trucks/" in a["href"]]
-            print(f"[five_star][proxy] Found {len(links)} truck links.")
-            # Only return if we got links!
-            if links:
-                return [href if href.startswith("http") else f"https://www.5startrucksales.us{href}" for href in links]
-        except Exception as e:
-            print(f"[five_star][proxy] ERROR: {e} -- Will now try direct (no-proxy) fetch.")
 
-    # --------------- Attempt 2: No Proxy --------------------
-    print("[five_star][direct] Trying direct (local) request.")
+    def truck_links(html):
+        return [href for href in htmlparse.select(html, "//a/@href")
+                if "/trucks/" in href or "www.5startrucksales.us/trucks/" in href]
+
     try:
-        response = requests.get(url, headers=headers, timeout=45)
-        print(f"[five_star][direct] Status code: {response.status_code}")
+        response = fetch.get(url, dealer="five_star:listings", headers=headers, verify=False,
+                             accept=lambda resp: bool(truck_links(resp.text)))
+        log.info("discovery response", status=response.status_code, route=response.route)
         if os.environ.get('FIVESTAR_DEBUG', '0') == '1':
-            with open("results/five_star_debug_direct.html", "w", encoding="utf-8") as f:
+            with open(f"results/five_star_debug_{response.route}.html", "w", encoding="utf-8") as f:
                 f.write(response.text)
-
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        links = [a["href"] for a in soup.find_all("a", href=True)
-                    if "/trucks/" in a["href"] or "www.5startrucksales.us/trucks/" in a["href"]]
-        print(f"[five_star][direct] Found {len(links)} truck links.")
+        links = truck_links(response.text)
+        log.info("found truck links", via=response.route, links=len(links))
         return [href if href.startswith("http") else f"https://www.5startrucksales.us{href}" for href in links]
     except Exception as e:
-        print(f"[five_star][direct] ERROR: {e}")
+        log.error("discovery failed", error=str(e))
         return []
 
 # -------------- CHANGE LOG -----------------
@@ -11,47 +11,40 @@ import time
 import csv
 import requests
 from urllib.parse import urljoin, urlparse, parse_qs, urlencode
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
 # --- For Selenium browser automation ---
-# import undetected_chromedriver as uc
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+# (imported inside the functions that start a browser, so importing this module stays cheap)
 # -- For JSON extraction ---
 from core.output import write_to_csv
+from core import metrics, ratelimit
+from core import cpu, fetch, htmlparse, openai_utils
+from core.log import get_logger
 from core.normalization import complete_diagram_info
 from core.image_utils import extract_image_urls_from_page, download_images as util_download_images, watermark_images
 # -- For output fields ---
-from core.output_fields import vehicle_attributes, diagram_attributes
+from core.output_fields import vehicle_attributes, diagram_attributes, llm_vehicle_fields, numeric_vehicle_attributes
 
 # --- Disable SSL Warnings ---
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# --- Load API key from environment ---
+# --- Load settings (proxy, LLM backend) from .env ---
 load_dotenv()
-import openai
-openai.api_key = os.getenv("OPENAI_API_KEY", "")
-if not openai.api_key:
-    raise RuntimeError("OPENAI_API_KEY is not set. Aborting.")
-
-
-from seleniumwire import webdriver  # Use seleniumwire for proxy auth
 
+log = get_logger(__name__)
 
 def get_driver_with_brightdata_proxy():
-    PROXY_HOST = os.environ.get("BRIGHTDATA_PROXY_HOST")
-    PROXY_PORT = int(os.environ.get("BRIGHTDATA_PROXY_PORT"))
-    PROXY_USER = os.environ.get("BRIGHTDATA_PROXY_USER")
-    PROXY_PASS = os.environ.get("BRIGHTDATA_PROXY_PASS")
+    from seleniumwire import webdriver  # Use seleniumwire for proxy auth
+
+    proxy = fetch.proxy_url("brightdata")
+    if not proxy:
+        raise RuntimeError("BRIGHTDATA_PROXY_HOST/PORT/USER/PASS must be set for FTLGR.")
 
     seleniumwire_options = {
         'proxy': {
-            'http': f'http://{PROXY_USER}:{PROXY_PASS}@{PROXY_HOST}:{PROXY_PORT}',
-            'https': f'https://{PROXY_USER}:{PROXY_PASS}@{PROXY_HOST}:{PROXY_PORT}',
+            'http': proxy,
+            'https': proxy.replace('http://', 'https://', 1),
             'no_proxy': 'localhost,127.0.0.1'
         }
     }
@@ -146,104 +139,90 @@ def extract_json(raw):
         return {}
 
 
-def get_sleeper_listings():
-    """
-    Paginate through sleeper pages using Selenium (with Bright Data proxy) and collect truck URLs.
-    """
-    from selenium.webdriver.common.by import By
+def turn_page(driver, next_btn):
+    """Click Next when ftlgr.com's rate limit allows, then wait for the old page to go away. False if the click fails."""
+    from selenium.common.exceptions import TimeoutException
     from selenium.webdriver.support.ui import WebDriverWait
     from selenium.webdriver.support import expected_conditions as EC
-    from urllib.parse import urljoin
-    import time
-
-    base_url = "https://www.ftlgr.com/trucks-for-sale/?type=sleeper"
-    links = set()
-    driver = get_driver_with_brightdata_proxy()  # Use proxy driver
 
-    driver.get(base_url)
-    page_num = 1
-
-    while True:
-        print(f"[Selenium] Scraping page {page_num}: {driver.current_url}")
-        try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "a.page-link"))
-            )
-        except Exception:
-            print("[Selenium] Could not find page links—might be on last page.")
-
-        # Collect truck links
-        for a in driver.find_elements(By.CSS_SELECTOR, "a[href^='/trucks/?vid=']"):
-            href = a.get_attribute("href")
-            full_url = urljoin("https://www.ftlgr.com", href)
-            links.add(full_url)
-
-        # Try to click "Next" (not disabled)
-        try:
-            next_btn = driver.find_element(
-                By.XPATH,
-                "//a[contains(@class,'page-link') and contains(text(),'Next') and not(ancestor::li[contains(@class,'disabled')])]"
-            )
-            next_btn.click()
-            time.sleep(2)
-            page_num += 1
-        except Exception:
-            print("[Selenium] No more pages or could not find Next button. Done paginating.")
-            break
-
-    driver.quit()
-    print(f"[get_sleeper_listings] Total sleeper listings: {len(links)}")
-    return list(links)
+    ratelimit.acquire("www.ftlgr.com")
+    started = time.perf_counter()
+    try:
+        next_btn.click()
+    except Exception as e:
+        log.debug("could not click Next", error=str(e))
+        return False
+    try:
+        WebDriverWait(driver, 20).until(EC.staleness_of(next_btn))
+    except TimeoutException:
+        pass
+    ratelimit.observe("www.ftlgr.com", latency=time.perf_counter() - started)
+    return True
 
 
-def get_daycab_listings():
+def iter_type_listings(truck_type):
     """
-    Paginate through daycab pages using Selenium (with Bright Data proxy) and collect truck URLs.
+    Paginate through one truck type's pages using Selenium (with Bright Data proxy),
+    yielding each new truck URL as its page is read. If the browser fails part-way,
+    the URLs already yielded stand.
     """
     from selenium.webdriver.common.by import By
     from selenium.webdriver.support.ui import WebDriverWait
     from selenium.webdriver.support import expected_conditions as EC
     from urllib.parse import urljoin
-    import time
 
-    base_url = "https://www.ftlgr.com/trucks-for-sale/?type=daycab"
+    base_url = f"https://www.ftlgr.com/trucks-for-sale/?type={truck_type}"
     links = set()
     driver = get_driver_with_brightdata_proxy()  # Use proxy driver
 
-    driver.get(base_url)
-    page_num = 1
+    try:
+        ratelimit.acquire(base_url)
+        driver.get(base_url)
+        page_num = 1
 
-    while True:
-        print(f"[Selenium] Scraping page {page_num}: {driver.current_url}")
-        try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "a.page-link"))
-            )
-        except Exception:
-            print("[Selenium] Could not find page links—might be on last page.")
-
-        # Collect truck links
-        for a in driver.find_elements(By.CSS_SELECTOR, "a[href^='/trucks/?vid=']"):
-            href = a.get_attribute("href")
-            full_url = urljoin("https://www.ftlgr.com", href)
-            links.add(full_url)
-
-        # Try to click "Next" (not disabled)
-        try:
-            next_btn = driver.find_element(
-                By.XPATH,
-                "//a[contains(@class,'page-link') and contains(text(),'Next') and not(ancestor::li[contains(@class,'disabled')])]"
-            )
-            next_btn.click()
-            time.sleep(2)
+        while True:
+            log.debug("scraping listings page", page=page_num, url=driver.current_url)
+            try:
+                WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "a.page-link"))
+                )
+            except Exception:
+                log.debug("could not find page links, might be on last page", page=page_num)
+
+            # Collect truck links (read them all before yielding: the page may change while we wait)
+            page_links = [urljoin("https://www.ftlgr.com", a.get_attribute("href"))
+                          for a in driver.find_elements(By.CSS_SELECTOR, "a[href^='/trucks/?vid=']")]
+            for full_url in page_links:
+                if full_url not in links:
+                    links.add(full_url)
+                    yield full_url
+
+            # Try to click "Next" (not disabled)
+            try:
+                next_btn = driver.find_element(
+                    By.XPATH,
+                    "//a[contains(@class,'page-link') and contains(text(),'Next') and not(ancestor::li[contains(@class,'disabled')])]"
+                )
+            except Exception:
+                log.debug("no Next button, done paginating", page=page_num)
+                break
+            if not turn_page(driver, next_btn):
+                break
             page_num += 1
-        except Exception:
-            print("[Selenium] No more pages or could not find Next button. Done paginating.")
-            break
+    except Exception as e:
+        log.error("listing pagination failed; keeping listings found so far", type=truck_type,
+                  found=len(links), error=str(e))
+    finally:
+        driver.quit()
+    log.info("type listings", truck_type=truck_type, listings=len(links))
 
-    driver.quit()
-    print(f"[get_daycab_listings] Total daycab listings: {len(links)}")
-    return list(links)
+
+def get_sleeper_listings():
+    return list(iter_type_listings("sleeper"))
+
+
+def get_daycab_listings():
+    return list(iter_type_listings("daycab"))
 
 
 # ── Helper function to find the most relevant option based on similarity ─────────────
@@ -261,32 +240,65 @@ def find_most_relevant_option(input_value, options):
     return best_match
 
 
+def iter_listings():
+    """Sleeper then daycab listing URLs, each once, as the pages are paginated."""
+    seen = set()
+    for truck_type in ("sleeper", "daycab"):
+        for url in iter_type_listings(truck_type):
+            if url not in seen:
+                seen.add(url)
+                yield url
+    log.info("collected listings", unique=len(seen))
+
+
 def get_listings():
     """
     Return a combined list of sleeper + daycab listing URLs.
     """
-    all_listings = set()
-
-    print("\n[get_listings] Fetching sleeper listings...")
-    sleeper = get_sleeper_listings()
-    all_listings.update(sleeper)
-    print(f"[get_listings] {len(sleeper)} sleeper listings.\n")
+    return list(iter_listings())
 
-    print("[get_listings] Fetching daycab listings...")
-    daycab = get_daycab_listings()
-    all_listings.update(daycab)
-    print(f"[get_listings] {len(daycab)} daycab listings.\n")
+# ── Step 2: Fetch raw text for one “ftlgr” listing ───────────────────────────────
+# Common “vehicle detail” containers, tried in order (first match of each)
+DETAIL_SELECTORS = [
+    "//main[@role='main']",
+    f"//div[{htmlparse.has_class('vehicle-detail')}]",
+    f"//div[{htmlparse.has_class('listing-detail')}]",
+    f"//div[{htmlparse.has_class('vehicle-description')}]",
+    "//div[@id='vehicle-info']",
+    f"//div[{htmlparse.has_class('content-area')}]",
+]
+_LOWER_CLASS = "translate(@class, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')"
+DETAIL_FALLBACK = "//*[(self::section or self::div) and ({})]".format(
+    " or ".join(f"contains({_LOWER_CLASS}, '{term}')" for term in ("vehicle", "truck", "detail", "spec", "info")))
+
+
+def detail_text(page):
+    """The vehicle-detail text of a listing page (runs in a core.cpu worker)."""
+    text_content = ""
+
+    # Try common “vehicle detail” selectors first:
+    for selector in DETAIL_SELECTORS:
+        element = htmlparse.first(page, selector)
+        if element is not None:
+            text_content += htmlparse.text(element) + "\n"
+    # If still empty, try any <section> or <div> whose class name contains 'vehicle', 'truck', 'detail', 'spec', or 'info'
+    if not text_content.strip():
+        for section in htmlparse.select(page, DETAIL_FALLBACK):
+            text_content += htmlparse.text(section) + "\n"
+    # If still no content, strip entire <body> (minus header/footer/nav)
+    if not text_content.strip():
+        body = htmlparse.first(page, "//body")
+        if body is not None:
+            text_content = htmlparse.text(body, skip=("header", "footer", "nav"))
+
+    return text_content.strip()
 
-    print(f"[get_listings] Total unique listings: {len(all_listings)}\n")
-    return list(all_listings)
 
-# ── Step 2: Fetch raw text for one “ftlgr” listing ───────────────────────────────
 def get_vehicle_page_html(url: str) -> str:
     """
     Fetch the HTML from a single FTLGR listing and attempt to extract visible text.
     """
     try:
-        session = requests.Session()
         headers = {
             "User-Agent": (
                 "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -301,47 +313,13 @@ def get_vehicle_page_html(url: str) -> str:
             "Origin": "https://www.ftlgr.com",
         }
 
-        # Bright Data proxy config (from env)
-        proxies = {
-            "http": f"http://{os.environ['BRIGHTDATA_PROXY_USER']}:{os.environ['BRIGHTDATA_PROXY_PASS']}@{os.environ['BRIGHTDATA_PROXY_HOST']}:{os.environ['BRIGHTDATA_PROXY_PORT']}",
-            "https": f"http://{os.environ['BRIGHTDATA_PROXY_USER']}:{os.environ['BRIGHTDATA_PROXY_PASS']}@{os.environ['BRIGHTDATA_PROXY_HOST']}:{os.environ['BRIGHTDATA_PROXY_PORT']}",
-        }
-
-        resp = session.get(url, headers=headers, allow_redirects=True, timeout=30, verify=False, proxies=proxies)
+        # routed through Bright Data by core.fetch's ftlgr policy
+        resp = fetch.get(url, dealer="ftlgr", headers=headers, allow_redirects=True, verify=False)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "lxml")
-        text_content = ""
-
-        # Try common “vehicle detail” selectors first:
-        selectors = [
-            ("main", {"role": "main"}),
-            ("div", {"class": "vehicle-detail"}),
-            ("div", {"class": "listing-detail"}),
-            ("div", {"class": "vehicle-description"}),
-            ("div", {"id": "vehicle-info"}),
-            ("div", {"class": "content-area"}),
-        ]
-        for tag, attrs in selectors:
-            element = soup.find(tag, attrs)
-            if element:
-                text_content += element.get_text(separator=" ", strip=True) + "\n"
-        # If still empty, try any <section> or <div> whose class name contains 'vehicle', 'truck', 'detail', 'spec', or 'info'
-        if not text_content.strip():
-            for section in soup.find_all(["section", "div"], class_=lambda x: x and any(
-                term in str(x).lower() for term in ("vehicle", "truck", "detail", "spec", "info"))):
-                text_content += section.get_text(separator=" ", strip=True) + "\n"
-        # If still no content, strip entire <body> (minus header/footer/nav)
-        if not text_content.strip():
-            body = soup.find("body")
-            if body:
-                for rem in body.find_all(["header", "footer", "nav"]):
-                    rem.decompose()
-                text_content = body.get_text(separator=" ", strip=True)
-
-        return text_content.strip()
+        return cpu.run(detail_text, resp.text)
 
     except Exception as e:
-        print(f"[get_vehicle_page_html] Error fetching {url}: {e}")
+        log.error("error fetching listing page", url=url, error=str(e))
         return ""
 
 # ── Step 3: Use OpenAI to extract JSON from raw text ──────────────────────────────
@@ -392,24 +370,10 @@ Just above the phone number is “City, ST.” Use the ST abbreviation to set bo
     user_msg = {"role": "user", "content": f"Extract vehicle information from this text: {text}"}
 
     try:
-        resp = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[system_msg, user_msg],
-            temperature=0.1,
-            max_tokens=1000
-        )
-        raw = resp.choices[0].message.content
-        print("[extract_vehicle_info] Raw GPT->JSON (first 200 chars):", raw[:200].replace("\n", " ") + " …")
-        # Try parsing out the JSON object:
-        cleaned = re.sub(r"^```json\s*|\s*```$", "", raw.strip())
-        try:
-            return json.loads(cleaned)
-        except json.JSONDecodeError:
-            # Fallback to regex‐extraction
-            obj = extract_json(cleaned)
-            return obj or {}
+        return openai_utils.complete_json([system_msg, user_msg], llm_vehicle_fields,
+                                          numeric=numeric_vehicle_attributes) or {}
     except Exception as e:
-        print(f"[extract_vehicle_info] OpenAI error: {e}")
+        log.error("extraction failed", error=str(e))
         return {}
 
 # ── Step 4: Enforce field constraints ───────────────────────────────────────────────
@@ -8,14 +8,10 @@ import time
 import difflib
 import requests
 import random
+from types import MappingProxyType
 import pandas as pd
 
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-import openai
-
-import chromedriver_autoinstaller
-chromedriver_autoinstaller.install()
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -25,11 +21,13 @@ from selenium.common.exceptions import TimeoutException, WebDriverException
 # from selenium.webdriver.chrome.service import Service
 # from webdriver_manager.chrome import ChromeDriverManager
 # driver = webdriver.Chrome(options=opts)
-from core.output_fields import vehicle_attributes, diagram_attributes
+from core.output_fields import vehicle_attributes, diagram_attributes, llm_vehicle_fields, numeric_vehicle_attributes
 
 
 # CSV reconciliation (for output and reordering)
 from core.output import write_to_csv  # (If you use the utility version for writing rows)
+from core import cpu, metrics, ratelimit, htmlparse, openai_utils
+from core.log import get_logger
 from core.image_utils import extract_image_urls_from_page, download_images, watermark_images
 
 from pipeline.run_reconciliation import process_vehicle_data, reorder_and_save_results
@@ -43,13 +41,12 @@ except ImportError:
     def add_watermark(input_path, watermark_path, output_path):
         print(f"Skipped watermark: {input_path}")
 
+log = get_logger(__name__)
+
 # --------------------------------------------------
-# 0) Initialize OpenAI client from .env
+# 0) Load settings from .env (the LLM backend itself is set up by core.openai_utils)
 # --------------------------------------------------
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY", "")
-if not openai.api_key:
-    raise RuntimeError("OPENAI_API_KEY is not set in the environment. Aborting.")
 
 
 # ----------------- All FYDA URLs  -----------------
@@ -74,7 +71,16 @@ FYDA_CATEGORIES = {
 # --------------------------------------------------
 # Selenium driver setup
 # --------------------------------------------------
+_chromedriver_ready = False
+
 def get_driver():
+    # Install a matching chromedriver the first time a browser is needed
+    global _chromedriver_ready
+    if not _chromedriver_ready:
+        import chromedriver_autoinstaller
+        chromedriver_autoinstaller.install()
+        _chromedriver_ready = True
+
     opts = webdriver.ChromeOptions()
     opts.add_argument("--headless")  
     opts.add_argument("--no-sandbox")
@@ -88,21 +94,65 @@ def get_driver():
     opts.add_experimental_option("excludeSwitches", ["enable-automation"])
     opts.add_experimental_option("useAutomationExtension", False)
 
-    # chromedriver_autoinstaller has already run at the top of your file!
     driver = webdriver.Chrome(options=opts)
     driver.set_page_load_timeout(30)
     return driver
 
 
 # ----------------- Scrape FYDA listings -----------------
-def get_all_fyda_listings():
-    all_urls = set()
+# url -> {url, stock, price, title} parsed from the search-result rows of the last
+# discovery, for pipeline/inventory.py (detail pages are the slow part of Fyda)
+_summaries = {}
+
+PRICE_RE = re.compile(r"\$\s?([\d,]{3,})")
+STOCK_RE = re.compile(r"Stock\s*(?:#|No\.?|Number)?\s*:?\s*([A-Z0-9][A-Z0-9-]{2,})", re.I)
+MILEAGE_RE = re.compile(r"([\d,]{3,})\s*(?:mi\b|miles)", re.I)
+
+TEMPLATE_SECTION = "//div[@id='main']//div[@id='content']//div[@id='template']"
+VEHICLE_ROWS = "//div[contains(@class, 'vehicle_row')]"
+
+# Selenium waits end as soon as the page is ready; these are only the ceilings
+BOT_WALL = "Pardon Our Interruption"
+PAGE_WAIT_S = 30
+DETAIL_READY = (By.XPATH, TEMPLATE_SECTION)
+ROWS_READY = (By.CSS_SELECTOR, "div[class*='vehicle_row']")
+
+
+def row_summary(url, text):
+    """Stock, price, title and mileage from one search-result row's text ("" where not found)."""
+    price = PRICE_RE.search(text)
+    stock = STOCK_RE.search(text)
+    mileage = MILEAGE_RE.search(text)
+    cut = min([m.start() for m in (price, stock, mileage) if m] or [len(text)])
+    return {
+        "url": url,
+        "stock": stock.group(1) if stock else "",
+        "price": price.group(1).replace(",", "") if price else "",
+        "title": text[:cut].strip(" -|:")[:120],
+        "mileage": mileage.group(1).replace(",", "") if mileage else "",
+    }
+
+
+def iter_all_fyda_listings():
+    """Every category's listing URLs, each once, as the result pages are read (summaries kept as they come)."""
+    _summaries.clear()
     for category, url in FYDA_CATEGORIES.items():
-        print(f"Scraping FYDA category: {category}")
-        urls, _ = get_target_listings(url)
-        all_urls.update(urls)
-    print(f"Total unique listings collected: {len(all_urls)}")
-    return list(all_urls)
+        log.info("scraping FYDA category", category=category)
+        for listing_url, text in iter_target_rows(url):
+            if listing_url and listing_url not in _summaries:
+                _summaries[listing_url] = row_summary(listing_url, text)
+                yield listing_url
+    log.info("collected listings", listings=len(_summaries),
+             with_price=sum(1 for s in _summaries.values() if s["price"]))
+
+
+def get_all_fyda_listings():
+    return list(iter_all_fyda_listings())
+
+
+def listing_summaries():
+    """Read-only live view: it fills in while iter_all_fyda_listings runs."""
+    return MappingProxyType(_summaries)
 # ----------------------------------------------------------------------------------
 
 #         # original code 
@@ -628,63 +678,63 @@ def complete_diagram_info(diagram_info, compliant_info):
     mymessages = [
         {"role": "system", "content": f"You are a vehicle data extraction assistant. Extract information from the text and return it in a JSON format with these fields:{myfields}"},
         {"role": "user", "content": f"Extract vehicle information from this text: {mytext}"}]
-    print("mymessages")
-    print(mymessages)
+    log.debug("diagram request", messages=lambda: mymessages)
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=mymessages,
-            temperature=0.1,
-            max_tokens=1000
-        )
-
-        extracted_info = response.choices[0].message.content
-        print("GREGORITY's first debug")
-        # Try to parse and re-serialize to ensure valid JSON format
-        try:
-            extracted_info = json.loads(extracted_info)
-            extracted_info = {k: '' if v is None else v for k, v in extracted_info.items()}
-            extracted_info.update(diagram_info)
-            return extracted_info
-        except json.JSONDecodeError:
-            print("Warning: Response was not valid JSON")
+        extracted_info = openai_utils.complete_json(mymessages, openai_utils.prompt_fields(myfields), task="diagram")
+        if extracted_info is None:
+            log.warning("diagram response was not valid JSON")
             return None
+        extracted_info.update(diagram_info)
+        return extracted_info
 
     except Exception as e:
-        print(f"Error during extraction: {str(e)}")
+        log.error("diagram extraction failed", error=str(e))
         return None
-    print('I should not see this')
 
 
     return ''
 
 # --------------------------------------------------
 # Get page text
+def navigate(driver, url, ready, action=None):
+    """
+    Load `url` (or run `action`, e.g. driver.refresh) when fyda's rate limit allows,
+    wait until `ready` (a locator) or the bot wall is on the page, and report the
+    timing to core.ratelimit. Returns True if the bot wall came up.
+    """
+    ratelimit.acquire(url)
+    started = time.perf_counter()
+    (action or (lambda: driver.get(url)))()
+    try:
+        WebDriverWait(driver, PAGE_WAIT_S).until(
+            lambda d: d.find_elements(*ready) or BOT_WALL in d.page_source
+        )
+    except TimeoutException:
+        log.debug("page not ready after wait", url=url, seconds=PAGE_WAIT_S)
+    blocked = BOT_WALL in driver.page_source
+    ratelimit.observe(url, latency=time.perf_counter() - started, blocked=blocked)
+    return blocked
+
+
 def get_vehicle_page_html(url):
     driver = None
     try:
         driver = get_driver()
-        print("Loading vehicle page:", url)
-        driver.get(url)
-        time.sleep(12)  # Adjust as needed for site speed
+        log.debug("loading vehicle page", url=url)
+        blocked = navigate(driver, url, DETAIL_READY)
 
         # Check for CAPTCHA/blocking page
-        if "Pardon Our Interruption" in driver.page_source:
+        if blocked:
             print("\nCAPTCHA detected! Please follow these steps:")
             print("1. Look at the browser window that opened")
             print("2. Complete the CAPTCHA verification")
             print("3. Wait a few seconds after completing the CAPTCHA")
             input("4. Press Enter once you've solved the CAPTCHA...\n")
 
-            time.sleep(5)
-            driver.refresh()
-            time.sleep(10)
-            if "Pardon Our Interruption" in driver.page_source:
+            if navigate(driver, url, DETAIL_READY, driver.refresh):
                 print("Still blocked after CAPTCHA. Trying one more time...")
-                time.sleep(30)
-                driver.refresh()
-                time.sleep(10)
-                if "Pardon Our Interruption" in driver.page_source:
+                # the wall slowed fyda's bucket down, so this waits out the backoff
+                if navigate(driver, url, DETAIL_READY, driver.refresh):
                     print("Access blocked. Consider:")
                     print("- Using a different IP address")
                     print("- Adding delays between requests")
@@ -694,36 +744,35 @@ def get_vehicle_page_html(url):
 
         # Scroll to load content
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(4)
-
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        main_section = soup.find('div', id='main')
-        if not main_section:
-            print("Could not find div#main.")
-            with open("debug_detail.html", "w", encoding="utf-8") as f:
-                f.write(soup.prettify())
-            return ""
-        content_section = main_section.find('div', id='content')
-        if not content_section:
-            print("Could not find div#content inside div#main.")
-            with open("debug_detail.html", "w", encoding="utf-8") as f:
-                f.write(main_section.prettify())
-            return ""
-        template_section = content_section.find('div', id='template')
-        if not template_section:
-            print("Could not find div#template inside div#content.")
+        try:
+            WebDriverWait(driver, 10).until(lambda d: d.execute_script("return document.readyState") == "complete")
+        except TimeoutException:
+            pass
+
+        page = driver.page_source
+        text = cpu.run(htmlparse.section_text, page, TEMPLATE_SECTION, 'id="main"')
+        if text is None:
+            # say which level is missing and keep the deepest one found for debugging
+            missing, closest = "div#main", htmlparse.document(page)
+            for expr, inner in (("//div[@id='main']", "div#content inside div#main"),
+                                ("//div[@id='main']//div[@id='content']", "div#template inside div#content")):
+                found = htmlparse.first(page, expr)
+                if found is None:
+                    break
+                missing, closest = inner, found
+            log.warning("could not find template section", missing=missing, url=url)
             with open("debug_detail.html", "w", encoding="utf-8") as f:
-                f.write(content_section.prettify())
+                f.write(htmlparse.to_html(closest))
             return ""
 
         # Optional: Save the extracted HTML for debugging if needed
         # with open("template_section.html", "w", encoding="utf-8") as f:
-        #     f.write(template_section.prettify())
+        #     f.write(htmlparse.to_html(htmlparse.first(page, TEMPLATE_SECTION)))
 
-        return template_section.get_text(separator=" ", strip=True)
+        return text
 
     except Exception as e:
-        print(f"Error processing URL {url}: {str(e)}")
+        log.error("error processing vehicle page", url=url, error=str(e))
         return ""
     finally:
         if driver:
@@ -785,84 +834,75 @@ The field ""Unique id"" should always be empty.
     ]
 
     try:
-        # Updated OpenAI API call for v1.0.0+
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.1,
-            max_tokens=1000
-        )
-        extracted_info = response.choices[0].message.content
-        try:
-            extracted_info = json.loads(extracted_info)
-            return extracted_info
-        except json.JSONDecodeError:
-            print("Warning: Response was not valid JSON")
-            print('this is the extracted info')
-            print(extracted_info)
-            print("!!!! Warning: Response was not valid JSON")
-            return None
+        extracted_info = openai_utils.complete_json(messages, llm_vehicle_fields, numeric=numeric_vehicle_attributes)
+        if extracted_info is None:
+            log.warning("extraction response was not valid JSON")
+        return extracted_info
     except Exception as e:
-        print(f"Error during extraction: {str(e)}")
+        log.error("extraction failed", error=str(e))
         return None
 
 #  original code
 # --------------------------------------------------
 # Collect detail URLs
 def get_target_listings(url):
+    all_urls, all_texts = [], []
+    for href, text in iter_target_rows(url):
+        all_urls.append(href)
+        all_texts.append(text)
+    return all_urls, all_texts
+
+
+def iter_target_rows(url):
+    """
+    Yield (detail URL, row text) for each vehicle row as each results page is parsed
+    ("" for a row without a link). Errors end the walk; rows already yielded stand.
+    """
     # url = "https://www.fydafreightliner.com/pre-owned-trucks-for-sale-ky-oh-pa--xPreOwnedInventory"
 
     base_url = "https://www.fydafreightliner.com"
-    all_urls = []
-    all_texts = []
+    found = 0
 
     driver = None
     try:
         driver = get_driver()
         print(f"Navigating to URL: {url}")
-        driver.get(url)
-        time.sleep(10)  # Initial wait for page load
+        if navigate(driver, url, ROWS_READY):
+            log.warning("bot wall on listing page", url=url)
 
         while True:  # Loop for pagination
             # Scroll to load potential lazy-loaded content
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(5)
 
             try:
                 # Wait for vehicle rows to be present
-                WebDriverWait(driver, 30).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "div[class*='vehicle_row']"))
-                )
+                WebDriverWait(driver, PAGE_WAIT_S).until(EC.presence_of_element_located(ROWS_READY))
                 print("Vehicle listings found!")
             except TimeoutException:
                 print("Could not find vehicle listings after wait.")
                 break
 
-            # Get the page source and parse with BeautifulSoup
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            
-            # Find all divs that contain 'vehicle_row' in their class
-            vehicle_rows = soup.find_all('div', class_=lambda x: x and 'vehicle_row' in x)
-            
+            # Get the page source and parse it (from the first vehicle row on)
+            vehicle_rows = htmlparse.select(driver.page_source, VEHICLE_ROWS, hint="vehicle_row")
+
             for row in vehicle_rows:
                 # Find the link in the vehicle row
-                link = row.find('a')
-                if link and link.get('href'):
+                link = htmlparse.first(row, ".//a")
+                if link is not None and link.get('href'):
                     href = link.get('href')
                     # Make sure we have a full URL
                     if href.startswith('/'):
                         href = base_url + href
                     elif not href.startswith('http'):
                         href = base_url + '/' + href
-                    all_urls.append(href)
-                    all_texts.append(row.get_text(strip=True))
+                    yield href, htmlparse.text(row)
                 else:
                     # If we can't find a URL, still add empty values to maintain alignment
-                    all_urls.append("")
-                    all_texts.append(row.get_text(strip=True))
-                print(f"Found vehicle listing: {href if link and link.get('href') else 'No URL found'}")
+                    yield "", htmlparse.text(row)
+                found += 1
+                print(f"Found vehicle listing: {href if link is not None and link.get('href') else 'No URL found'}")
 
-            print(f"Current total listings found: {len(all_urls)}")
+            print(f"Current total listings found: {found}")
 
             # Check for next button and its state
             try:
@@ -877,9 +917,19 @@ def get_target_listings(url):
                 
                 # Click the next button if it's not disabled
                 print("Clicking next page...")
+                first_row = driver.find_elements(*ROWS_READY)[:1]
+                ratelimit.acquire(url)
+                started = time.perf_counter()
                 next_button.click()
-                time.sleep(10)  # Wait for new page to load
-                
+                # the new page is in once the old rows are replaced
+                if first_row:
+                    try:
+                        WebDriverWait(driver, PAGE_WAIT_S).until(EC.staleness_of(first_row[0]))
+                    except TimeoutException:
+                        log.debug("old rows still on the page after Next", url=url)
+                ratelimit.observe(url, latency=time.perf_counter() - started,
+                                  blocked=BOT_WALL in driver.page_source)
+
             except TimeoutException:
                 print("No next button found or reached last page")
                 break
@@ -887,14 +937,10 @@ def get_target_listings(url):
                 print(f"Error during pagination: {str(e)}")
                 break
 
-        return all_urls, all_texts
-
     except WebDriverException as e:
         print(f"WebDriver error: {str(e)}")
-        return [], []
     except Exception as e:
         print(f"General error: {str(e)}")
-        return [], []
     finally:
         if driver:
             driver.quit()
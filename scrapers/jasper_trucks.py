@@ -9,26 +9,22 @@ import json
 import re
 import difflib
 import requests
-import openai
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from urllib.parse import urljoin
 from core.output import write_to_csv
+from core import metrics
+from core import cpu, fetch, htmlparse, openai_utils
+from core.log import get_logger
 from core.image_utils import extract_image_urls_from_page, download_images, watermark_images
 
-from PIL import Image, ImageDraw, ImageFont, ImageOps, ImageFilter, ImageEnhance
-from PIL.Image import Resampling
-import io
-import cairosvg
-from core.output_fields import vehicle_attributes, diagram_attributes
+from core.output_fields import vehicle_attributes, diagram_attributes, llm_vehicle_fields, numeric_vehicle_attributes
 
 
 
-# ── Load API key from environment ───────────────────────────────────────────────
+# ── Load settings (OPENAI_API_KEY / LLM_BACKEND, ...) from .env ──────────────────
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY", "")
-if not openai.api_key:
-    raise RuntimeError("OPENAI_API_KEY is not set. Aborting.")
+
+log = get_logger(__name__)
 
 # ── Constants ───────────────────────────────────────────────────────────────────
 WATERMARK_PATH = os.path.join('data', 'raw', 'group.png')
@@ -197,31 +193,18 @@ def complete_diagram_info(diagram_info, compliant_info):
     mymessages = [
         {"role": "system", "content": f"You are a vehicle data extraction assistant. Extract information from the text and return it in a JSON format with these fields:{myfields}"},
         {"role": "user", "content": f"Extract vehicle information from this text: {mytext}"}]
-    print("mymessages")
-    print(mymessages)
+    log.debug("diagram request", messages=lambda: mymessages)
     try:
-        response = openai.ChatCompletion.create(model="gpt-3.5-turbo",
-                                                messages=mymessages,
-                                                temperature=0.1,
-                                                max_tokens=1000)
-
-        #extracted_info = extract_json(response.choices[0].message.content)
-        extracted_info = response.choices[0].message.content
-        print("GREGORITY's first debug")
-        # Try to parse and re-serialize to ensure valid JSON format
-        try:
-            extracted_info = json.loads(extracted_info)
-            extracted_info = {k: '' if v is None else v for k, v in extracted_info.items()}
-            extracted_info.update(diagram_info)
-            return extracted_info
-        except json.JSONDecodeError:
-            print("Warning: Response was not valid JSON")
+        extracted_info = openai_utils.complete_json(mymessages, openai_utils.prompt_fields(myfields), task="diagram")
+        if extracted_info is None:
+            log.warning("diagram response was not valid JSON")
             return None
+        extracted_info.update(diagram_info)
+        return extracted_info
 
     except Exception as e:
-        print(f"Error during extraction: {str(e)}")
+        log.error("diagram extraction failed", error=str(e))
         return None
-    print('I should not see this')
 
 
     return ''
@@ -243,128 +226,88 @@ def find_most_relevant_option(input_value, options):
 
 # original function
 # ── Step 1: Get all listing URLs from JasperTrucks ─────────────────────────────────
-def get_target_listings():
-    base_url = "https://www.jaspertrucks.com/inventory.aspx"
-    initial_params1 = {
-        "new": "",
-        "subtype": "Non-Sleeper",
-        "make": "",
-        "model": "",
-        "enginemake": "",
-        "enginemodel": "",
-        "lyear": "",
-        "hyear": ""
-    }
-
+JASPER_INVENTORY = "https://www.jaspertrucks.com/inventory.aspx"
+JASPER_SUBTYPES = ("Non-Sleeper", "Sleeper")
+NEXT_PAGE = f"//a[{htmlparse.has_class('page-next')}]/@href"
+SPEC_SHEET_BLOCKS = "|".join(f"//{tag}" for tag in ('p', 'div', 'span', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'td', 'th', 'li'))
 
-    initial_params2 = {
-        "new": "",
-        "subtype": "Sleeper",
-        "make": "",
-        "model": "",
-        "enginemake": "",
-        "enginemodel": "",
-        "lyear": "",
-        "hyear": ""
-    }
 
-
-
-    # Use a set to store unique listings
-    all_listings = set()
+def iter_target_listings():
+    """
+    Yield each listing URL (once) as soon as its inventory page is parsed, walking
+    every page of each subtype. A page that fails to load ends that subtype only;
+    whatever was already yielded stands.
+    """
+    seen = set()
 
     def fetch_page(url, params=None):
-        response = requests.get(url, params=params)
+        response = fetch.get(url, dealer="jasper", params=params)
         response.raise_for_status()
-        return BeautifulSoup(response.text, 'html.parser')
+        return htmlparse.document(response.text)
 
-    def process_page(soup):
-        page_listings = set()  # Use a set for page listings too
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href']
+    def process_page(page):
+        page_listings = []
+        for href in htmlparse.select(page, "//a/@href"):
             if '/inventory/SpecSheet_res/' in href:
-                full_url = urljoin('https://www.jaspertrucks.com', href)
-                page_listings.add(full_url)  # Add to set instead of list
+                page_listings.append(urljoin('https://www.jaspertrucks.com', href))
         return page_listings
 
-    def get_next_page_url(soup):
-        next_page = soup.find('a', class_='page-next')
-        if next_page and next_page.get('href'):
-            return next_page['href']
-        return None
-
-    # Start with the first page
-    current_params = initial_params1
-    page_num = 1
-
-    while True:
-        print(f"Fetching page {page_num}...")
-        if page_num > 1:
-            current_params['Page'] = page_num
-
-        soup = fetch_page(base_url, current_params)
-        page_listings = process_page(soup)
-
-        # Track number of new listings added
-        previous_count = len(all_listings)
-        all_listings.update(page_listings)
-        new_listings = len(all_listings) - previous_count
-
-        print(f"PAERAM1 Found {len(page_listings)} listings on page {page_num}, {new_listings} new unique listings")
-
-        # Check for next page
-        next_page = get_next_page_url(soup)
-        if not next_page:
-            break
-
-        page_num += 1
-
-    current_params = initial_params2
-    page_num = 1
+    for n, subtype in enumerate(JASPER_SUBTYPES, start=1):
+        params = {"new": "", "subtype": subtype, "make": "", "model": "", "enginemake": "",
+                  "enginemodel": "", "lyear": "", "hyear": ""}
+        page_num = 1
+        while True:
+            if page_num > 1:
+                params['Page'] = page_num
+            try:
+                page = fetch_page(JASPER_INVENTORY, params)
+            except Exception as e:
+                log.error("inventory page failed; keeping listings found so far", subtype=subtype, page=page_num,
+                          found=len(seen), error=str(e))
+                break
 
-    while True:
-        print(f"Fetching page {page_num}...")
-        if page_num > 1:
-            current_params['Page'] = page_num
+            page_listings = process_page(page)
+            new = [url for url in dict.fromkeys(page_listings) if url not in seen]
+            seen.update(new)
+            log.debug("listings page", params=n, page=page_num, found=len(page_listings), new=len(new))
+            yield from new
 
-        soup = fetch_page(base_url, current_params)
-        page_listings = process_page(soup)
+            # Check for next page
+            if not htmlparse.first(page, NEXT_PAGE):
+                break
+            page_num += 1
 
-        # Track number of new listings added
-        previous_count = len(all_listings)
-        all_listings.update(page_listings)
-        new_listings = len(all_listings) - previous_count
 
-        print(f"PAERAM2 Found {len(page_listings)} listings on page {page_num}, {new_listings} new unique listings")
+def get_target_listings():
+    # Sorted list for consistent output
+    final_listings = sorted(iter_target_listings())
 
-        # Check for next page
-        next_page = get_next_page_url(soup)
-        if not next_page:
-            break
+    log.debug("all unique listings", urls=lambda: final_listings)
+    log.info("collected listings", listings=len(final_listings))
 
-        page_num += 1
+    return final_listings
 
-    # Convert set to sorted list for consistent output
-    final_listings = sorted(list(all_listings))
+def spec_sheet_text(html):
+    """Text of a spec sheet page, one line per block element (runs in a core.cpu worker)."""
+    # Extract all text while preserving structure
+    text_content = []
+    for tag in htmlparse.select(html, SPEC_SHEET_BLOCKS):
+        if tag.getparent().tag not in ['script', 'style']:
+            text = htmlparse.text(tag, sep="")
+            if text:
+                text_content.append(text)
 
-    # Print results
-    print("\nAll unique listings:")
-    for listing in final_listings:
-        print(listing)
-    print(f"\nTotal unique listings found: {len(final_listings)}")
+    return '\n'.join(text_content)
 
-    return final_listings
 
 #  original function
 # ── Step 3: Fetch and parse one vehicle page ───────────────────────────────────────
 def get_vehicle_page_html(url):
-    print('url: ', url)
+    log.debug("fetching listing page", url=url)
     myid = url.split('=')[-1]
     url = f'https://www.jaspertrucks.com/inventory/SpecSheet_res/print.aspx?ID={myid}'
 
     try:
-        session = requests.Session()
-
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -374,37 +317,24 @@ def get_vehicle_page_html(url):
             'Upgrade-Insecure-Requests': '1'}
 
         # Make request with modified headers
-        response = session.get(
+        response = fetch.get(
             url,
+            dealer="jasper",
             headers=headers,
             allow_redirects=True,
-            timeout=30,
             verify=False
         )
 
-        # Print status for debugging
-        print(f"Status Code: {response.status_code}")
-        print(f"Final URL: {response.url}")
+        log.debug("spec sheet response", url=response.url, status=response.status_code)
 
         if response.status_code == 200:
-            # Parse with BeautifulSoup
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Extract all text while preserving structure
-            text_content = []
-            for tag in soup.find_all(['p', 'div', 'span', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'td', 'th', 'li']):
-                if tag.parent.name not in ['script', 'style']:
-                    text = tag.get_text(strip=True)
-                    if text:
-                        text_content.append(text)
-
-            return '\n'.join(text_content)
+            return cpu.run(spec_sheet_text, response.text)
         else:
-            print(f"Failed to fetch page. Status code: {response.status_code}")
+            log.warning("failed to fetch spec sheet", url=url, status=response.status_code)
             return None
 
     except requests.RequestException as e:
-        print(f"Error fetching the webpage: {str(e)}")
+        log.warning("error fetching spec sheet", url=url, error=str(e))
         return None
 
 #  original function
@@ -456,25 +386,13 @@ The field "Unique id" should always be empty."""},
     ]
 
     try:
-        response = openai.ChatCompletion.create(model="gpt-3.5-turbo",
-                                                messages=messages,
-                                                temperature=0.1,
-                                                max_tokens=1000)
-
-        extracted_info = response.choices[0].message.content
-        print("jeremy's first debug")
-        print(extracted_info)
-        # Try to parse and re-serialize to ensure valid JSON format
-        extracted_info = clean_json_string(extracted_info)
-        try:
-            extracted_info = json.loads(extracted_info)
-            return extracted_info
-        except json.JSONDecodeError:
-            print("Warning: Response was not valid JSON")
-            return None
+        extracted_info = openai_utils.complete_json(messages, llm_vehicle_fields, numeric=numeric_vehicle_attributes)
+        if extracted_info is None:
+            log.warning("extraction response was not valid JSON")
+        return extracted_info
 
     except Exception as e:
-        print(f"Error during extraction: {str(e)}")
+        log.error("extraction failed", error=str(e))
         return None
 
 #  original function
@@ -750,9 +668,6 @@ def make_extracted_info_compliant(extracted_info):
                       "3-speed", "4-speed", "5-speed", "6-speed", "7-speed", "8-speed", "9-speed"]
             #val = get_closest_match(value, options)
             val = ""
-            print('GREG AND JEREMY DEBUG OF OS - Transmission Speeds')
-            print('value ', value)
-            print('val ', val)
             value = str(value)
             if value.lower()=='10' :
                 val = "10-speed"
@@ -780,8 +695,7 @@ def make_extracted_info_compliant(extracted_info):
                 val = "8-speed"
             if value.lower()=='9' :
                 val = "9-speed"
-            print('final val ', val)
-            print('GREG AND JEREMY DEBUG OF OS - Transmission Speeds')
+            log.debug("transmission speeds", value=value, val=val)
             return val
 
         elif constraint == "OS - Vehicle Condition":
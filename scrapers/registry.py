@@ -0,0 +1,86 @@
+# scrapers/registry.py
+"""
+Lazy scraper registry.
+
+Listing the dealers never imports a scraper module. Selenium, seleniumwire,
+PIL, cairosvg, pandas and openai are only pulled in when a dealer is actually
+selected and resolved with load(). That keeps `run_scraper --list` and
+`--dry-run` fast and lets them work on machines with no browser.
+
+Each entry says:
+    module   - dotted path of the scraper module
+    listings - name of its "get all listing URLs" function
+    run      - name of its per-listing run(url, veh_csv, diagram_csv, image_root)
+    fetch    - which concurrency budget its page fetch uses ("http" or "browser")
+    images   - whether listings of this dealer get images downloaded/watermarked
+    prefetch - (optional) name of a prefetch(urls) function that starts every
+               detail-page fetch up front; get_vehicle_page_html then just
+               collects the result
+    prefetch_wait - (optional) name of a function(url) that blocks until that URL's
+               prefetched page is ready; it runs before the fetch takes its
+               budget slot, so waiting on a prefetch holds no slot
+    summaries - (optional) name of a function returning {url: summary} from the
+               last discovery, for skipping unchanged units (pipeline/inventory.py)
+    stream   - (optional) name of a generator yielding listing URLs as discovery
+               paginates; the staged engine starts on them right away
+    stock    - (optional) vehicle row fields tried in turn for the listing's photo
+               folder (default ["Stock Number"]); with stock_default, a listing
+               with none of them still gets its photos under that name
+    photos   - (optional) layout of a listing's photos, formatted with {stock}:
+               "prefix" for downloaded file names (default "") and "watermarked"
+               for the watermarked folder under the image root (default "{stock}-watermarked")
+    no_diagram - (optional) what a listing whose diagram call returns nothing gets:
+               "empty" (an empty diagram row, the default) or "skip" (no diagram row)
+"""
+
+import importlib
+import importlib.util
+import threading
+
+SCRAPERS = {
+    "jasper":           {"module": "scrapers.jasper_trucks",     "listings": "get_target_listings",   "run": "run", "fetch": "http",    "images": True,
+                         "stream": "iter_target_listings"},
+    "five_star":        {"module": "scrapers.five_star_trucks",  "listings": "get_listings",          "run": "run", "fetch": "http",    "images": True},
+    "ftlgr":            {"module": "scrapers.ftlgr_trucks",      "listings": "get_listings",          "run": "run", "fetch": "http",    "images": True,
+                         "stream": "iter_listings"},
+    "fyda":             {"module": "scrapers.fyda_freightliner", "listings": "get_all_fyda_listings", "run": "run", "fetch": "browser", "images": True,
+                         "summaries": "listing_summaries", "stream": "iter_all_fyda_listings",
+                         "stock": ["Stock Number", "VehicleVIN"], "stock_default": "unknown",
+                         "photos": {"prefix": "{stock}_", "watermarked": "{stock}/watermarked"}, "no_diagram": "skip"},
+    "shanes_equipment": {"module": "scrapers.shanes_equipment",  "listings": "get_listings",          "run": "run", "fetch": "http",    "images": False,
+                         "prefetch": "prefetch_vehicle_pages", "prefetch_wait": "wait_for_vehicle_page",
+                         "summaries": "listing_summaries", "no_diagram": "skip"},
+}
+
+# importlib is not safe to race on the same module from several threads
+_import_lock = threading.Lock()
+
+
+def names():
+    return list(SCRAPERS)
+
+
+def get_spec(name):
+    if name not in SCRAPERS:
+        raise KeyError(f"Unknown scraper '{name}'. Choose from {names()}")
+    return SCRAPERS[name]
+
+
+def is_available(name):
+    """True if the scraper's module can be found, without executing it."""
+    return importlib.util.find_spec(get_spec(name)["module"]) is not None
+
+
+def load(name):
+    """Import (once) and return the scraper module for `name`."""
+    spec = get_spec(name)
+    with _import_lock:
+        return importlib.import_module(spec["module"])
+
+
+def get_listings_func(name):
+    return getattr(load(name), get_spec(name)["listings"])
+
+
+def get_run_func(name):
+    return getattr(load(name), get_spec(name)["run"])
@@ -9,28 +9,26 @@ import time
 import difflib
 import random
 import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-import openai
+from core import metrics
+from core import cpu, fetch, htmlparse, openai_utils
+from core.log import get_logger
+from core.output_fields import llm_vehicle_fields, numeric_vehicle_attributes
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-import undetected_chromedriver as uc
+# Selenium / undetected_chromedriver are only needed by the commented-out browser
+# code paths below; import them there if those paths are ever revived.
 
 
 #
-# ── 0) Initialize OpenAI client from .env
+# ── 0) Load settings from .env (the LLM backend itself is set up by core.openai_utils)
 #
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY", "")
-if not openai.api_key:
-    raise RuntimeError("OPENAI_API_KEY not found in environment.")
+
+log = get_logger(__name__)
 
 
 # original
@@ -84,9 +82,9 @@ def writeToCSV(data, attributes, filename):
                 row = {attr: item.get(attr, "") for attr in attributes}
                 writer.writerow(row)
 
-        print(f"Successfully wrote data to {filename}")
+        log.debug("wrote rows", path=filename, rows=len(data))
     except Exception as e:
-        print(f"Error writing to CSV {filename}: {str(e)}")
+        log.error("error writing CSV", path=filename, error=str(e))
 
 # original
 def extract_vehicle_info(text):
@@ -111,22 +109,12 @@ def extract_vehicle_info(text):
     ]
 
     try:
-        # Updated OpenAI API call for v1.0.0+
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.1,
-            max_tokens=1000
-        )
-        extracted_info = response.choices[0].message.content
-        try:
-            extracted_info = json.loads(extracted_info)
-            return extracted_info
-        except json.JSONDecodeError:
-            print("Warning: Response was not valid JSON")
-            return None
+        extracted_info = openai_utils.complete_json(messages, llm_vehicle_fields, numeric=numeric_vehicle_attributes)
+        if extracted_info is None:
+            log.warning("extraction response was not valid JSON")
+        return extracted_info
     except Exception as e:
-        print(f"Error during extraction: {str(e)}")
+        log.error("extraction failed", error=str(e))
         return None
 
 # original
@@ -641,31 +629,16 @@ def complete_diagram_info(diagram_info, compliant_info):
     ]
     
     try:
-        # Use the new OpenAI client format
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=mymessages,
-            temperature=0.1,
-            max_tokens=1000
-        )
-
-        extracted_info = response.choices[0].message.content
-        print("API Response:", extracted_info)  # Debug print
-        
-        try:
-            extracted_info = json.loads(extracted_info)
-            # Ensure no null values in the dictionary
-            extracted_info = {k: '' if v is None else v for k, v in extracted_info.items()}
-            # Merge with existing diagram info
-            extracted_info.update(diagram_info)
-            return extracted_info
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
-            print(f"Raw response: {extracted_info}")
+        extracted_info = openai_utils.complete_json(mymessages, openai_utils.prompt_fields(myfields), task="diagram")
+        if extracted_info is None:
+            log.warning("diagram response was not valid JSON")
             return diagram_info  # Return basic diagram info even if extraction fails
+        # Merge with existing diagram info
+        extracted_info.update(diagram_info)
+        return extracted_info
             
     except Exception as e:
-        print(f"Error during diagram info extraction: {str(e)}")
+        log.error("diagram extraction failed", error=str(e))
         return diagram_info  # Return basic diagram info even if API call fails
 
     return diagram_info
@@ -778,193 +751,26 @@ def write_failed_url(url):
     with open('failed.txt', 'a') as f:
         f.write(url + '\n')
 
-# original
-# def get_vehicle_page_html(url):
-#     driver = None
-#     try:
-#         driver = get_driver()
-#         print("Loading vehicle page:", url)
-        
-#         # Add random delay before loading page (2-5 seconds)
-#         time.sleep(random.uniform(2, 5))
-#         driver.get(url)
-
-#         # Add random scroll behavior
-#         def human_like_scroll():
-#             total_height = driver.execute_script("return document.body.scrollHeight")
-#             current_height = 0
-#             scroll_step = random.randint(100, 300)
-            
-#             while current_height < total_height:
-#                 next_height = min(current_height + scroll_step, total_height)
-#                 driver.execute_script(f"window.scrollTo({current_height}, {next_height})")
-#                 current_height = next_height
-#                 time.sleep(random.uniform(0.1, 0.3))  # Random delay between scrolls
-                
-#         # Random initial wait (8-12 seconds)
-#         time.sleep(random.uniform(8, 12))
-        
-#         # Perform human-like scrolling
-#         human_like_scroll()
-
-#         time.sleep(2)
-#         soup = BeautifulSoup(driver.page_source, 'html.parser')
-#         detail_wrapper = soup.find('div', class_='detail-wrapper')
-#         if detail_wrapper:
-#             return detail_wrapper.get_text(strip=True, separator=' ')
-#         else:
-#             print("No detail-wrapper found in HTML.")
-#             return ""
-#     except Exception as e:
-#         print(f"Error processing URL {url}: {str(e)}")
-#         return ""
-#     finally:
-#         if driver:
-#             driver.quit()
-
-# ❌ This version uses undetected-chromedriver + BrightData proxy
-# ❌ Cloudflare closes the browser window immediately
-# def get_vehicle_page_html(url):
-#     driver = None
-#     try:
-#         driver = get_driver()
-#         print(f"[🔍] Loading vehicle page: {url}")
-
-#         # Optional delay before navigation (to mimic natural behavior)
-#         time.sleep(random.uniform(2, 5))
-
-#         try:
-#             driver.get(url)
-#         except Exception as nav_err:
-#             print(f"[❌] Failed to load URL: {url}")
-#             print(f"    Navigation error: {str(nav_err)}")
-#             return ""
-
-#         # Simulate human-like scroll
-#         def human_like_scroll():
-#             try:
-#                 total_height = driver.execute_script("return document.body.scrollHeight")
-#                 current_height = 0
-#                 scroll_step = random.randint(100, 300)
-
-#                 while current_height < total_height:
-#                     next_height = min(current_height + scroll_step, total_height)
-#                     driver.execute_script(f"window.scrollTo({current_height}, {next_height})")
-#                     current_height = next_height
-#                     time.sleep(random.uniform(0.1, 0.3))
-#             except Exception as scroll_err:
-#                 print(f"[⚠️] Scroll error: {scroll_err}")
-
-#         # Let the page settle before scroll
-#         time.sleep(random.uniform(8, 12))
-#         human_like_scroll()
-#         time.sleep(2)
-
-#         # Parse the final page HTML
-#         soup = BeautifulSoup(driver.page_source, 'html.parser')
-#         detail_wrapper = soup.find('div', class_='detail-wrapper')
-#         if detail_wrapper:
-#             return detail_wrapper.get_text(strip=True, separator=' ')
-#         else:
-#             print("[⚠️] No detail-wrapper found on page.")
-#             return ""
-#     except Exception as e:
-#         print(f"[❌] Error processing vehicle URL {url}: {str(e)}")
-#         return ""
-#     finally:
-#         if driver:
-#             try:
-#                 driver.quit()
-#             except Exception as quit_err:
-#                 print(f"[⚠️] Error while quitting driver: {quit_err}")
-
-
-# # ✅ This version fetches vehicle detail page using BrightData Web Unlocker
-# def get_vehicle_page_html(url):
-#     try:
-#         proxy_host = "brd.superproxy.io"
-#         proxy_port = 22225
-#         proxy_user = "brd-customer-hl_7e560da0-zone-aresi"
-#         proxy_pass = "3el9pzsn1tl8"
-
-#         proxies = {
-#             "http": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}",
-#             "https": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}"
-#         }
-
-#         headers = {
-#             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
-#             "Accept-Language": "en-US,en;q=0.9",
-#         }
-
-#         print(f"[🌐] Fetching detail page via Web Unlocker: {url}")
-#         response = requests.get(url, headers=headers, proxies=proxies, timeout=30, verify=False)
-#         with open("results/shane_debug.html", "w", encoding="utf-8") as f:
-#             f.write(response.text)
-#         response.raise_for_status()
-
-#         soup = BeautifulSoup(response.text, 'html.parser')
-#         detail_wrapper = soup.find('div', class_='detail-wrapper')
-#         if detail_wrapper:
-#             return detail_wrapper.get_text(strip=True, separator=' ')
-#         else:
-#             print("[⚠️] No detail-wrapper found.")
-#             return ""
-
-#     except Exception as e:
-#         print(f"[❌] Error fetching vehicle page {url}: {e}")
-#         return ""
-
-
-# # ✅ Pulls vehicle detail page HTML via Web Unlocker API (direct API access)
-# def get_vehicle_page_html(url):
-    import requests
-    import json
-    from bs4 import BeautifulSoup
-
-    api_key = "24b5c8102efcbc27e93429e9f18ba9a8bef51251357b3c1ae93773f303138b60"
-
-    print(f"[🌐] Fetching vehicle detail page via Web Unlocker API: {url}")
-    try:
-        response = requests.post(
-            "https://api.brightdata.com/request",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            },
-            json={
-                "zone": "aresi",
-                "url": url,
-                "method": "GET",
-                "format": "raw"
-            },
-            timeout=30
-        )
-        response.raise_for_status()
-        html = response.text
-
-        with open("results/shane_debug_vehicle.html", "w", encoding="utf-8") as f:
-            f.write(html)
-
-        soup = BeautifulSoup(html, 'html.parser')
-        detail_wrapper = soup.find('div', class_='detail-wrapper')
-        if detail_wrapper:
-            return detail_wrapper.get_text(strip=True, separator=' ')
-        else:
-            print("[⚠️] No detail-wrapper found.")
-            return ""
-
-    except Exception as e:
-        print(f"[❌] Error fetching vehicle page {url}: {e}")
-        return ""
-
 
 # ✅ Fetches rendered vehicle page using BrightData Web Unlocker API
-def get_vehicle_page_html(url):
+UNLOCKER_ENDPOINT = "https://api.brightdata.com/unlocker/v1.0/portal"
+# Web Unlocker and collector API token: the BRIGHTDATA_API_KEY the task definition / .env sets
+UNLOCKER_API_KEY = os.getenv("BRIGHTDATA_API_KEY", "")
+if not UNLOCKER_API_KEY:
+    log.warning("BRIGHTDATA_API_KEY is not set; Web Unlocker and collector requests will be refused")
+# how many rendered detail pages may be in flight at once (each takes 20-60 s on Bright Data's side)
+UNLOCKER_CONCURRENCY = int(os.getenv("SHANES_UNLOCKER_CONCURRENCY", "8"))
+DETAIL_WRAPPER = f"//div[{htmlparse.has_class('detail-wrapper')}]"
+LIST_CONTAINER = "//div[@id='listContainer']"
+
+# url -> Future of its page text, filled by prefetch_vehicle_pages()
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def unlock_vehicle_page(url):
+    """One rendered Web Unlocker request -> text of the page's detail-wrapper ("" on failure)."""
     try:
-        api_key = "24b5c8102efcbc27e93429e9f18ba9a8bef51251357b3c1ae93773f303138b60"
-        endpoint = "https://api.brightdata.com/unlocker/v1.0/portal"  # ✅ Correct endpoint
-
         payload = {
             "url": url,
             "render": True,  # 🧠 Ensures JS is executed server-side
@@ -975,357 +781,82 @@ def get_vehicle_page_html(url):
         }
 
         headers = {
-            "Authorization": f"Bearer {api_key}",
+            "Authorization": f"Bearer {UNLOCKER_API_KEY}",
             "Content-Type": "application/json"
         }
 
-        print(f"[🌐] Fetching vehicle detail page via Web Unlocker API (rendered): {url}")
-        response = requests.post(endpoint, headers=headers, data=json.dumps(payload), timeout=60)
+        log.debug("fetching vehicle page via Web Unlocker (rendered)", url=url)
+        response = fetch.post(UNLOCKER_ENDPOINT, dealer="shanes_equipment", rate_key=url, headers=headers, data=json.dumps(payload))
         response.raise_for_status()
 
         result = response.json()
         html = result.get("response", {}).get("body", "")
 
         if not html:
-            print("[⚠️] No HTML found in response body.")
+            log.warning("no HTML in Web Unlocker response", url=url)
             return ""
 
-        with open("results/shane_detail_debug.html", "w", encoding="utf-8") as f:
-            f.write(html)
+        if os.getenv("SHANES_DEBUG", "0") == "1":
+            with open("results/shane_detail_debug.html", "w", encoding="utf-8") as f:
+                f.write(html)
 
-        soup = BeautifulSoup(html, 'html.parser')
-        detail_wrapper = soup.find('div', class_='detail-wrapper')
-        if detail_wrapper:
-            return detail_wrapper.get_text(strip=True, separator=' ')
+        text = cpu.run(htmlparse.section_text, html, DETAIL_WRAPPER, "detail-wrapper")
+        if text is not None:
+            return text
         else:
-            print("[⚠️] No detail-wrapper found in rendered HTML.")
+            log.warning("no detail-wrapper found in rendered HTML", url=url)
             return ""
 
     except Exception as e:
-        print(f"[❌] Error fetching vehicle page via Web Unlocker API: {e}")
+        log.error("error fetching vehicle page via Web Unlocker", url=url, error=str(e))
         return ""
 
 
+def prefetch_vehicle_pages(urls):
+    """
+    Submit every detail URL to Web Unlocker now, UNLOCKER_CONCURRENCY at a time,
+    instead of one blocking request per listing. Returns immediately;
+    get_vehicle_page_html(url) then only waits for that URL's result.
+    """
+    pool = ThreadPoolExecutor(max_workers=UNLOCKER_CONCURRENCY, thread_name_prefix="unlocker")
+    with _pending_lock:
+        for url in urls:
+            if url not in _pending:
+                _pending[url] = pool.submit(unlock_vehicle_page, url)
+    pool.shutdown(wait=False)
+    log.info("submitted detail pages to Web Unlocker", urls=len(urls), concurrency=UNLOCKER_CONCURRENCY)
+
+
+def wait_for_vehicle_page(url):
+    """
+    Block until a prefetched page is ready, without taking it. pipeline/stages.py
+    calls this before taking an "http" slot, so listings waiting on Web Unlocker
+    never hold the slots other dealers' fetches need.
+    """
+    with _pending_lock:
+        future = _pending.get(url)
+    if future is not None:
+        wait([future])
 
 
+def get_vehicle_page_html(url):
+    with _pending_lock:
+        future = _pending.pop(url, None)
+    return future.result() if future is not None else unlock_vehicle_page(url)
 
 
 
 
-# original
-# def get_target_listings():
-#     url = "https://www.shanesequipment.com/inventory/?/listings/search?ScopeCategoryIDs=27&Category=16013%7C16045&AccountCRMID=8589249&dlr=1&settingscrmid=5114963&lo=2"
-#     inventory_prefix = "https://www.shanesequipment.com/inventory/"
-#     all_urls = set()
-
-#     driver = None
-#     try:
-#         driver = get_driver()
-#         print(f"Navigating to URL: {url}")
-        
-#         # Add random delay before initial page load
-#         time.sleep(random.uniform(3, 6))
-#         driver.get(url)
-        
-#         # Random delay after page load
-#         time.sleep(random.uniform(8, 12))
-
-#         # Add random mouse movements (requires pyautogui)
-#         def random_mouse_movement():
-#             try:
-#                 import pyautogui
-#                 for _ in range(3):
-#                     x = random.randint(100, 1000)
-#                     y = random.randint(100, 600)
-#                     pyautogui.moveTo(x, y, duration=random.uniform(0.5, 1.5))
-#                     time.sleep(random.uniform(0.5, 1.5))
-#             except ImportError:
-#                 pass  # Skip if pyautogui not installed
-
-#         random_mouse_movement()
-
-#         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-#         time.sleep(5)
-
-#         if "Pardon Our Interruption" in driver.page_source:
-#             print("Blocked by anti-bot on main page. Solve the CAPTCHA or try a proxy.")
-#             input("Press Enter once you've solved any CAPTCHA in the browser...")
-#             driver.refresh()
-#             time.sleep(10)
-
-#             if "Pardon Our Interruption" in driver.page_source:
-#                 print("Still blocked. Cannot get listings.")
-#                 return list(all_urls)
-
-#         try:
-#             WebDriverWait(driver, 30).until(
-#                 EC.visibility_of_element_located((By.ID, "listContainer"))
-#             )
-#             print("listContainer found!")
-#         except TimeoutException:
-#             print("Could not find listContainer after a long wait.")
-#             return list(all_urls)
-
-#         while True:
-#             time.sleep(3)
-#             soup = BeautifulSoup(driver.page_source, 'html.parser')
-#             list_container = soup.find('div', id='listContainer')
-#             if list_container:
-#                 links = list_container.find_all('a')
-#                 for link in links:
-#                     href = link.get('href')
-#                     if href:
-#                         if href.startswith('/'):
-#                             href = "https://www.shanesequipment.com" + href
-#                         if href.startswith(inventory_prefix):
-#                             all_urls.add(href)
-
-#                 try:
-#                     next_button = WebDriverWait(driver, 5).until(
-#                         EC.presence_of_element_located((By.CSS_SELECTOR, "button[aria-label='Next Page']"))
-#                     )
-#                     if 'Mui-disabled' in next_button.get_attribute('class'):
-#                         print("Next button disabled, no more pages.")
-#                         break
-#                     next_button.click()
-#                     time.sleep(5)
-#                 except:
-#                     print("No next button, probably last page.")
-#                     break
-#             else:
-#                 print("No listContainer found after initial success.")
-#                 break
-#     except WebDriverException as e:
-#         print(f"WebDriver error: {str(e)}")
-#     except Exception as e:
-#         print(f"General error: {str(e)}")
-#     finally:
-#         if driver:
-#             driver.quit()
 
-#     return list(all_urls)
 
 
-# # ✅ This version fetches Shane's inventory listings via BrightData Web Unlocker
-# def get_target_listings():
-#     try:
-#         proxy_host = "brd.superproxy.io"
-#         proxy_port = 22225
-#         proxy_user = "brd-customer-hl_7e560da0-zone-aresi"
-#         proxy_pass = "3el9pzsn1tl8"
-
-#         proxies = {
-#             "http": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}",
-#             "https": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}"
-#         }
-
-#         headers = {
-#             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
-#             "Accept-Language": "en-US,en;q=0.9",
-#         }
-
-#         url = "https://www.shanesequipment.com/inventory/?/listings/search?ScopeCategoryIDs=27&Category=16013%7C16045&AccountCRMID=8589249&dlr=1&settingscrmid=5114963&lo=2"
-#         print(f"[🌐] Fetching listings page via Web Unlocker: {url}")
-#         response = requests.get(url, headers=headers, proxies=proxies, timeout=30, verify=False)
-#         with open("results/shane_debug.html", "w", encoding="utf-8") as f:
-#             f.write(response.text)
-#         response.raise_for_status()
-
-#         soup = BeautifulSoup(response.text, "html.parser")
-#         listings = soup.find_all("div", class_="listings-container")
-
-#         urls = []
-#         for div in listings:
-#             a_tags = div.find_all("a", href=True)
-#             for a in a_tags:
-#                 href = a["href"]
-#                 if href.startswith("/inventory/"):
-#                     full_url = f"https://www.shanesequipment.com{href}"
-#                     urls.append(full_url)
-
-#         print(f"[✅] Found {len(urls)} vehicle URLs.")
-#         return urls
-
-#     except Exception as e:
-#         print(f"[❌] Failed to get target listings: {e}")
-#         return []
-
-# # ✅ Pulls listings page HTML via BrightData Web Unlocker API (direct API access)
-# def get_target_listings():
-#     import requests
-#     import json
-#     from bs4 import BeautifulSoup
-#     import os
-
-#     api_key = "24b5c8102efcbc27e93429e9f18ba9a8bef51251357b3c1ae93773f303138b60"
-#     url = "https://www.shanesequipment.com/inventory/?/listings/search?ScopeCategoryIDs=27&Category=16013%7C16045&AccountCRMID=8589249&dlr=1&settingscrmid=5114963&lo=2"
-
-#     print(f"[🌐] Fetching listings page via Web Unlocker API: {url}")
 
-#     try:
-#         response = requests.post(
-#             "https://api.brightdata.com/request",
-#             headers={
-#                 "Content-Type": "application/json",
-#                 "Authorization": f"Bearer {api_key}"
-#             },
-#             json={
-#                 "zone": "aresi",
-#                 "url": url,
-#                 "method": "GET",
-#                 "format": "raw"
-#             },
-#             timeout=30
-#         )
-#         response.raise_for_status()
-#         html = response.text
-
-#         # Debug output
-#         with open("results/shane_debug.html", "w", encoding="utf-8") as f:
-#             f.write(html)
-
-#         soup = BeautifulSoup(html, "html.parser")
-#         container = soup.find("div", {"id": "listContainer"})
-#         if not container:
-#             print("[⚠️] listContainer not found.")
-#             return []
-
-#         urls = []
-#         for a in container.find_all("a", href=True):
-#             href = a["href"]
-#             if href.startswith("/inventory/"):
-#                 full_url = f"https://www.shanesequipment.com{href}"
-#                 urls.append(full_url)
-
-#         print(f"[✅] Found {len(urls)} vehicle URLs.")
-#         return urls
-
-#     except Exception as e:
-#         print(f"[❌] Failed to get target listings: {e}")
-#         return []
-
-# # ✅ Fully render Shane's page using BrightData Web Unlocker with `render: true`
-# def get_target_listings():
-#     API_KEY = "24b5c8102efcbc27e93429e9f18ba9a8bef51251357b3c1ae93773f303138b60"
-#     ZONE = "aresi"
-#     url = "https://www.shanesequipment.com/inventory/?/listings/search?ScopeCategoryIDs=27&Category=16013%7C16045&AccountCRMID=8589249&dlr=1&settingscrmid=5114963&lo=2"
-
-#     headers = {
-#         "Authorization": f"Bearer {API_KEY}",
-#         "Content-Type": "application/json"
-#     }
-
-#     payload = {
-#         "zone": ZONE,
-#         "url": url,
-#         "render": True
-#     }
-
-#     print(f"[🌐] Fetching listings page via Web Unlocker API (rendered): {url}")
-#     try:
-#         response = requests.post("https://api.brightdata.com/web-unlock/request", headers=headers, json=payload, timeout=90)
-#         response.raise_for_status()
-#         html = response.json().get("response", {}).get("body", "")
-
-#         with open("results/shane_debug_rendered.html", "w", encoding="utf-8") as f:
-#             f.write(html)
-
-#         soup = BeautifulSoup(html, "html.parser")
-#         list_container = soup.find("div", id="listContainer")
-
-#         urls = []
-#         if list_container:
-#             links = list_container.find_all("a", href=True)
-#             for link in links:
-#                 href = link["href"]
-#                 if href.startswith("/inventory/"):
-#                     urls.append(f"https://www.shanesequipment.com{href}")
-#         else:
-#             print("[⚠️] listContainer not found.")
-
-#         print(f"[✅] Found {len(urls)} vehicle URLs.")
-#         return urls
-
-#     except Exception as e:
-#         print(f"[❌] Failed to fetch rendered listings: {e}")
-#         return []
-
-# ✅ Use BrightData Web Unlocker with `render: true` (correct flow)
-# def get_target_listings():
-#     API_KEY = "24b5c8102efcbc27e93429e9f18ba9a8bef51251357b3c1ae93773f303138b60"
-#     ZONE = "aresi"
-#     TARGET_URL = "https://www.shanesequipment.com/inventory/?/listings/search?ScopeCategoryIDs=27&Category=16013%7C16045&AccountCRMID=8589249&dlr=1&settingscrmid=5114963&lo=2"
-
-#     trigger_url = "https://api.brightdata.com/dca/trigger"
-#     fetch_url_base = "https://api.brightdata.com/dca/fetch"
-
-#     headers = {
-#         "Authorization": f"Bearer {API_KEY}",
-#         "Content-Type": "application/json"
-#     }
-
-#     payload = {
-#         "collector": "browser",  # ← key value for JS-rendered pages
-#         "zone": ZONE,
-#         "args": {
-#             "url": TARGET_URL,
-#             "render": True
-#         }
-#     }
-
-#     print(f"[🌐] Triggering render job: {TARGET_URL}")
-#     try:
-#         # Step 1: Trigger
-#         trigger_response = requests.post(trigger_url, headers=headers, json=payload)
-#         trigger_response.raise_for_status()
-#         job_id = trigger_response.json().get("job_id")
-#         if not job_id:
-#             print("[❌] Failed to get job ID.")
-#             return []
-
-#         # Step 2: Poll for result
-#         for _ in range(20):  # wait max ~60 sec
-#             time.sleep(3)
-#             fetch_response = requests.get(f"{fetch_url_base}?job_id={job_id}", headers=headers)
-#             if fetch_response.status_code == 200:
-#                 break
-#         else:
-#             print("[❌] Timed out waiting for render job.")
-#             return []
-
-#         html = fetch_response.text
-#         with open("results/shane_debug_rendered.html", "w", encoding="utf-8") as f:
-#             f.write(html)
-
-#         # Step 3: Parse vehicle links
-#         soup = BeautifulSoup(html, "html.parser")
-#         list_container = soup.find("div", id="listContainer")
-
-#         urls = []
-#         if list_container:
-#             links = list_container.find_all("a", href=True)
-#             for link in links:
-#                 href = link["href"]
-#                 if href.startswith("/inventory/"):
-#                     urls.append(f"https://www.shanesequipment.com{href}")
-#         else:
-#             print("[⚠️] listContainer not found in rendered page.")
-
-#         print(f"[✅] Found {len(urls)} vehicle URLs.")
-#         return urls
-
-#     except Exception as e:
-#         print(f"[❌] Failed during Web Unlocker render flow: {e}")
-#         return []
 
 
 # ✅ Uses Web Unlocker API to fetch rendered search results page
 def get_target_listings():
+    url = "https://www.shanesequipment.com/inventory/?/listings/search?ScopeCategoryIDs=27&Category=16013%7C16045&AccountCRMID=8589249&dlr=1&settingscrmid=5114963&lo=2"
     try:
-        api_key = "24b5c8102efcbc27e93429e9f18ba9a8bef51251357b3c1ae93773f303138b60"
-        endpoint = "https://api.brightdata.com/unlocker/v1.0/portal"
-
-        url = "https://www.shanesequipment.com/inventory/?/listings/search?ScopeCategoryIDs=27&Category=16013%7C16045&AccountCRMID=8589249&dlr=1&settingscrmid=5114963&lo=2"
         payload = {
             "url": url,
             "render": True,
@@ -1336,58 +867,40 @@ def get_target_listings():
         }
 
         headers = {
-            "Authorization": f"Bearer {api_key}",
+            "Authorization": f"Bearer {UNLOCKER_API_KEY}",
             "Content-Type": "application/json"
         }
 
-        print(f"[🌐] Fetching listings page via Web Unlocker API: {url}")
-        response = requests.post(endpoint, headers=headers, data=json.dumps(payload), timeout=60)
+        log.info("fetching listings page via Web Unlocker", url=url)
+        response = fetch.post(UNLOCKER_ENDPOINT, dealer="shanes_equipment", rate_key=url, headers=headers, data=json.dumps(payload))
         response.raise_for_status()
 
         result = response.json()
         html = result.get("response", {}).get("body", "")
 
         if not html:
-            print("[⚠️] Empty HTML received.")
+            log.warning("empty HTML from Web Unlocker", url=url)
             return []
 
-        # Optional: write debug HTML to file
-        with open("results/shane_debug.html", "w", encoding="utf-8") as f:
-            f.write(html)
-
-        soup = BeautifulSoup(html, "html.parser")
-        list_container = soup.find("div", {"id": "listContainer"})
+        list_container = htmlparse.first(html, LIST_CONTAINER, hint='"listContainer"')
 
         urls = []
-        if list_container:
-            a_tags = list_container.find_all("a", href=True)
-            for a in a_tags:
-                href = a["href"]
+        if list_container is not None:
+            for href in htmlparse.select(list_container, ".//a/@href"):
                 if href.startswith("/inventory/"):
                     full_url = f"https://www.shanesequipment.com{href}"
                     urls.append(full_url)
         else:
-            print("[⚠️] listContainer not found.")
+            log.warning("listContainer not found", url=url)
 
-        print(f"[✅] Found {len(urls)} vehicle URLs.")
+        log.info("found vehicle urls", urls=len(urls))
         return urls
 
     except Exception as e:
-        print(f"[❌] Failed to fetch rendered listings: {e}")
+        log.error("failed to fetch rendered listings", url=url, error=str(e))
         return []
 
 
-
-
-
-
-
-
-
-
-
-
-
 # original
 def get_failed_listings():
     if not os.path.exists('failed.txt'):
@@ -1740,12 +1253,7 @@ def main():
         print(f'\nProcessing listing {n}/{total_listings}')
         print(f'URL: {listing}')
         mylistings.append(listing)
-        # Add random delay between processing listings (30-60 seconds)
-        if n > 1:  # Skip delay for first item
-            delay = random.uniform(30, 60)
-            print(f"Waiting {delay:.1f} seconds before next request...")
-            time.sleep(delay)
-            
+        # pacing is core.ratelimit's job (the Web Unlocker fetch waits for www.shanesequipment.com's bucket)
         run(listing, vehicle_info_file, diagram_file, images_dir)
         print('===================')
     
@@ -1775,8 +1283,101 @@ Access blocked. Consider:
 - Using a proxy service
 """
 
+# ── Bulk discovery through the Bright Data collector (see scripts/shane_collector_test.py)
+# One job returns the whole inventory with its basic fields, so there is no
+# search page to render and no pagination to miss. BRIGHTDATA_API_BASE points
+# the job API at a local stand-in (bench/replay_server.py answers /dca/*).
+BRIGHTDATA_API_BASE = os.getenv("BRIGHTDATA_API_BASE", "https://api.brightdata.com").rstrip("/")
+COLLECTOR_ID = os.getenv("SHANES_COLLECTOR_ID", "c_mcuwb7kgy0gbasps8")
+COLLECTOR_POLL_S = float(os.getenv("SHANES_COLLECTOR_POLL", "10"))
+COLLECTOR_TIMEOUT_S = float(os.getenv("SHANES_COLLECTOR_TIMEOUT", "300"))
+COLLECTOR_TRIGGER_TIMEOUT_S = float(os.getenv("SHANES_COLLECTOR_TRIGGER_TIMEOUT", "60"))
+# "collector" (default) or "page" for the old rendered search page
+DISCOVERY_MODE = os.getenv("SHANES_DISCOVERY", "collector")
+
+# dataset field names differ between collector versions; first one present wins
+SUMMARY_FIELDS = {
+    "url":     ("url", "listing_url", "link", "detail_url", "href"),
+    "stock":   ("stock", "stock_number", "stock_no", "stock_num"),
+    "price":   ("price", "retail_price", "list_price"),
+    "title":   ("title", "name", "listing_title"),
+    "mileage": ("mileage", "miles", "odometer"),
+}
+
+# url -> summary from the last collector run, for pipeline/inventory.py
+_summaries = {}
+
+
+def trigger_collector():
+    """
+    Start one collector job. Sent once, with a plain requests.post: the dealer's fetch
+    policy would retry a 5xx/timeout or fail over, and every retry of a trigger
+    can start (and bill) another job. A failed trigger falls back to the search page.
+    """
+    headers = {"Authorization": f"Bearer {UNLOCKER_API_KEY}", "Content-Type": "application/json"}
+    url = f"{BRIGHTDATA_API_BASE}/dca/trigger"
+    response = requests.post(url, params={"collector": COLLECTOR_ID, "queue_next": 1}, headers=headers,
+                             json=[{}], timeout=COLLECTOR_TRIGGER_TIMEOUT_S)
+    response.raise_for_status()
+    job_id = response.json()["collection_id"]
+    log.info("collector job triggered", collector=COLLECTOR_ID, job=job_id)
+    return job_id
+
+
+def poll_collector(job_id, poll_interval=None, timeout=None):
+    """Wait for the job's dataset. 202 (or a status object) means still running."""
+    poll_interval = COLLECTOR_POLL_S if poll_interval is None else poll_interval
+    timeout = COLLECTOR_TIMEOUT_S if timeout is None else timeout
+    headers = {"Authorization": f"Bearer {UNLOCKER_API_KEY}"}
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        r = fetch.get(f"{BRIGHTDATA_API_BASE}/dca/dataset", dealer="shanes_equipment", params={"id": job_id},
+                      headers=headers, cache=False)
+        if r.status_code == 200 and r.headers.get("content-type", "").startswith("application/json"):
+            data = r.json()
+            if isinstance(data, list):
+                return data
+            log.debug("collector job not ready", job=job_id, status=data.get("status") if isinstance(data, dict) else None)
+        elif r.status_code != 202:
+            log.warning("unexpected collector poll response", job=job_id, status=r.status_code, body=lambda: r.text[:300])
+        time.sleep(poll_interval)
+    raise TimeoutError(f"collector job {job_id} not done after {timeout:.0f}s")
+
+
+def _summary(record):
+    out = {}
+    for field, keys in SUMMARY_FIELDS.items():
+        out[field] = next((str(record[k]).strip() for k in keys if record.get(k) not in (None, "")), "")
+    if out["url"].startswith("/"):
+        out["url"] = f"https://www.shanesequipment.com{out['url']}"
+    return out
+
+
+def collect_inventory():
+    """Every unit in the collector's dataset as {url, stock, price, title, mileage}."""
+    data = poll_collector(trigger_collector())
+    summaries = [s for s in (_summary(rec) for rec in data if isinstance(rec, dict)) if s["url"]]
+    log.info("collector dataset received", records=len(data), listings=len(summaries))
+    return summaries
+
+
+def listing_summaries():
+    return dict(_summaries)
+
+
 # ── Expose a flat `get_listings()` so that run_scraper.py can call it
 def get_listings():
+    if DISCOVERY_MODE == "collector":
+        try:
+            summaries = collect_inventory()
+        except Exception as e:
+            log.error("collector discovery failed; falling back to the search page", error=str(e))
+        else:
+            if summaries:
+                _summaries.clear()
+                _summaries.update((s["url"], s) for s in summaries)
+                return list(_summaries)
+            log.warning("collector returned no listings; falling back to the search page")
     return get_target_listings()
 
 
@@ -0,0 +1,11 @@
+# tests/conftest.py
+import os
+import sys
+
+# modules read these at import time; tests never reach the real services
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,131 @@
+# tests/test_image_store.py
+import os
+import random
+import time
+
+import pytest
+from PIL import Image
+
+from core import image_store
+
+DAY = 86400
+NOISY = "a5c3" * 4     # 32 bits set: a hash that says something about the photo
+
+
+def record(dhash=NOISY, width=800, height=600):
+    return {"dhash": dhash, "width": width, "height": height}
+
+
+def flip(h, bits):
+    return f"{int(h, 16) ^ ((1 << bits) - 1):016x}"
+
+
+def test_same_photo_within_distance(monkeypatch):
+    monkeypatch.setattr(image_store, "DEDUPE_DISTANCE", 3)
+    assert image_store.same_photo(record(), record(flip(NOISY, 3), 1600, 1200))
+    assert not image_store.same_photo(record(), record(flip(NOISY, 4)))
+
+
+def test_same_photo_needs_matching_aspect_ratio():
+    assert not image_store.same_photo(record(), record(width=800, height=450))
+
+
+def test_flat_or_unknown_hashes_never_match():
+    flat = "0000000000000001"
+    assert not image_store.same_photo(record(flat), record(flat))
+    assert not image_store.same_photo(record(None), record(None))
+    assert not image_store.same_photo(record(width=0), record())
+
+
+def test_dedupe_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(image_store, "DEDUPE_DISTANCE", -1)
+    assert not image_store.same_photo(record(), record())
+
+
+def test_dhash_of_a_resized_copy_is_the_same_photo(tmp_path):
+    rnd = random.Random(0)
+    img = Image.new("RGB", (64, 48))
+    img.putdata([(rnd.randrange(256),) * 3 for _ in range(64 * 48)])
+    img = img.resize((640, 480), Image.NEAREST)
+    img.save(tmp_path / "big.png")
+    img.resize((320, 240)).save(tmp_path / "small.png")
+    Image.new("RGB", (640, 480), "white").save(tmp_path / "other.png")
+
+    recs = {}
+    for name in ("big", "small", "other"):
+        h, (w, ht) = image_store.dhash(str(tmp_path / f"{name}.png"))
+        recs[name] = {"dhash": h, "width": w, "height": ht}
+    assert image_store.same_photo(recs["big"], recs["small"])
+    assert not image_store.same_photo(recs["big"], recs["other"])
+    assert image_store.dhash(str(tmp_path / "missing.png")) == (None, (0, 0))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_store, "STORE_DIR", str(tmp_path / "store"))
+    return tmp_path / "store"
+
+
+def age(path, days):
+    t = time.time() - days * DAY
+    os.utime(path, (t, t))
+
+
+def photo(url, content, stored_days_ago, wm="wm"):
+    sha = image_store.put_blob(content, ".jpg")
+    image_store.save_url({"url": url, "sha": sha, "ext": ".jpg", "stored": time.time() - stored_days_ago * DAY})
+    marked = image_store.marked_path(sha, wm, ".jpg")
+    os.makedirs(os.path.dirname(marked), exist_ok=True)
+    with open(marked, "wb") as f:
+        f.write(content)
+    for path in (image_store.blob_path(sha, ".jpg"), marked, image_store._url_path(url)):
+        age(path, stored_days_ago)
+    return sha
+
+
+def test_put_blob_stores_same_bytes_once(store):
+    a = image_store.put_blob(b"photo", ".jpg")
+    assert image_store.put_blob(b"photo", ".jpg") == a
+    assert len(list((store / "blobs").rglob("*.jpg"))) == 1
+
+
+def test_prune_drops_stale_records_and_only_their_files(store):
+    kept = photo("https://a.example/1.jpg", b"kept", 2)
+    stale = photo("https://a.example/2.jpg", b"stale", 40)
+    # the same bytes as a stale URL, but revalidated recently: that blob stays
+    shared = photo("https://a.example/3.jpg", b"shared", 40)
+    image_store.save_url({"url": "https://b.example/3.jpg", "sha": shared, "ext": ".jpg", "stored": time.time()})
+    leftover = store / "blobs" / "zz" / "zz.jpg.1-1.tmp"
+    leftover.parent.mkdir(parents=True)
+    leftover.write_bytes(b"half")
+    age(leftover, 2)
+
+    removed = image_store.prune(keep_s=30 * DAY)
+    assert removed["urls"] == 2 and removed["blobs"] == 2 and removed["marked"] == 1
+    assert os.path.exists(image_store.blob_path(kept, ".jpg"))
+    assert os.path.exists(image_store.blob_path(shared, ".jpg"))
+    assert not os.path.exists(image_store.blob_path(stale, ".jpg"))
+    assert not os.path.exists(image_store.marked_path(stale, "wm", ".jpg"))
+    assert not leftover.exists()
+    assert image_store.load_url("https://a.example/1.jpg")["sha"] == kept
+    assert image_store.load_url("https://a.example/2.jpg") is None
+
+
+def test_prune_spares_files_written_in_the_last_day(store):
+    # a download in flight has its blob before its URL record
+    sha = image_store.put_blob(b"new", ".jpg")
+    image_store.prune(keep_s=30 * DAY)
+    assert os.path.exists(image_store.blob_path(sha, ".jpg"))
+
+
+def test_relink_rebuilds_recorded_photos(store, tmp_path):
+    sha = image_store.put_blob(b"photo", ".jpg")
+    with image_store.recording() as links:
+        image_store.link(image_store.blob_path(sha, ".jpg"), str(tmp_path / "results" / "S1" / "1.jpg"))
+    photos = {os.path.relpath(dest, tmp_path / "results"): os.path.relpath(src, store) for dest, src in links.items()}
+
+    assert image_store.relink(photos, str(tmp_path / "fresh"))
+    assert (tmp_path / "fresh" / "S1" / "1.jpg").read_bytes() == b"photo"
+    os.remove(image_store.blob_path(sha, ".jpg"))
+    assert not image_store.relink(photos, str(tmp_path / "again"))
+    assert not (tmp_path / "again").exists()
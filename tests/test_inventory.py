@@ -0,0 +1,72 @@
+# tests/test_inventory.py
+from pipeline.inventory import InventorySnapshot, fingerprint
+
+URL = "https://dealer.example/unit/1"
+SUMMARY = {"url": URL, "stock": "S1", "price": "$89,500", "title": "2019 Volvo VNL"}
+ROWS = ({"Stock Number": "S1"}, {"Listing": URL})
+
+
+def test_fingerprint_ignores_url_order_and_whitespace():
+    same = {"title": " 2019 Volvo VNL", "price": "$89,500 ", "stock": "S1", "url": URL + "?ref=search"}
+    assert fingerprint(SUMMARY) == fingerprint(same)
+    assert fingerprint(dict(SUMMARY, note="")) == fingerprint(SUMMARY)   # empty fields do not count
+
+
+def test_fingerprint_changes_with_price_or_stock():
+    assert fingerprint(dict(SUMMARY, price="$85,000")) != fingerprint(SUMMARY)
+    assert fingerprint(dict(SUMMARY, stock="S2")) != fingerprint(SUMMARY)
+
+
+def test_no_fingerprint_without_price_or_stock():
+    assert fingerprint({"url": URL, "title": "2019 Volvo VNL"}) is None
+    assert fingerprint(None) is None
+    assert fingerprint({"stock": "S1"}) is not None
+
+
+def snapshot(tmp_path, summaries):
+    return InventorySnapshot(str(tmp_path / "dealer.json"), summaries)
+
+
+def test_unchanged_unit_reuses_last_runs_rows(tmp_path):
+    first = snapshot(tmp_path, {URL: SUMMARY})
+    assert first.unchanged(URL) is None
+    first.update(URL, *ROWS)
+    first.mark_images(URL, {"S1/1.jpg": "blobs/ab/ab.jpg"})
+    first.save()
+
+    second = snapshot(tmp_path, {URL: dict(SUMMARY)})
+    assert second.unchanged(URL) == ROWS
+    assert second.images_done(URL)
+    assert second.photos(URL) == {"S1/1.jpg": "blobs/ab/ab.jpg"}
+    assert second.skipped == 1
+
+    repriced = snapshot(tmp_path, {URL: dict(SUMMARY, price="$85,000")})
+    assert repriced.unchanged(URL) is None
+    assert not repriced.images_done(URL)
+
+
+def test_save_keeps_unprocessed_units_and_drops_sold_ones(tmp_path):
+    other = "https://dealer.example/unit/2"
+    first = snapshot(tmp_path, {URL: SUMMARY, other: dict(SUMMARY, url=other, stock="S2")})
+    first.update(URL, *ROWS)
+    first.update(other, *ROWS)
+    first.save()
+
+    # this run processed nothing: URL is still listed and keeps its entry, `other` was sold
+    second = snapshot(tmp_path, {URL: SUMMARY})
+    second.save()
+    assert snapshot(tmp_path, {URL: SUMMARY}).unchanged(URL) == ROWS
+    assert snapshot(tmp_path, {other: dict(SUMMARY, url=other, stock="S2")}).unchanged(other) is None
+
+
+def test_empty_summaries_leave_the_snapshot_alone(tmp_path):
+    first = snapshot(tmp_path, {URL: SUMMARY})
+    first.update(URL, *ROWS)
+    first.save()
+    snapshot(tmp_path, {}).save()
+    assert snapshot(tmp_path, {URL: SUMMARY}).unchanged(URL) == ROWS
+
+
+def test_unreadable_snapshot_starts_over(tmp_path):
+    (tmp_path / "dealer.json").write_text("{not json")
+    assert snapshot(tmp_path, {URL: SUMMARY}).unchanged(URL) is None
@@ -0,0 +1,119 @@
+# tests/test_journal.py
+import json
+
+import pytest
+
+from core import cpu
+from pipeline import stages
+from pipeline.journal import RunJournal
+from scrapers import registry
+
+URL = "https://dealer.example/unit/1"
+
+
+def test_resume_replays_latest_status(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    journal = RunJournal(path)
+    journal.record_discovered([URL, URL + "2"])
+    journal.record(URL, "fetched", "page text")
+    journal.record_failure(URL + "2", "fetched", "timeout")
+    journal.record_failure(URL, "images", "boom")
+    journal.record(URL, "images")
+    journal.close()
+
+    resumed = RunJournal(path, resume=True)
+    assert resumed.discovered == [URL, URL + "2"]
+    assert resumed.done(URL, "fetched") and resumed.data(URL, "fetched") == "page text"
+    assert resumed.done(URL, "images")   # the later "ok" wins over the earlier failure
+    assert not resumed.done(URL + "2", "fetched")
+    assert not resumed.done(URL, "written")
+    assert resumed.summary()["fetched"] == {"ok": 1, "failed": 1}
+    resumed.close()
+
+
+def test_half_written_last_line_is_ignored(tmp_path):
+    path = tmp_path / "run.jsonl"
+    journal = RunJournal(str(path))
+    journal.record(URL, "written")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"url": "' + URL + '", "stage": "ima')   # killed mid-write
+
+    resumed = RunJournal(str(path), resume=True)
+    assert resumed.done(URL, "written")
+    assert not resumed.done(URL, "images")
+    resumed.close()
+
+
+def test_fresh_run_starts_empty_and_keeps_previous(tmp_path):
+    path = tmp_path / "run.jsonl"
+    journal = RunJournal(str(path))
+    journal.record(URL, "written")
+    journal.close()
+
+    fresh = RunJournal(str(path))
+    assert not fresh.done(URL, "written")
+    fresh.close()
+    assert path.read_text() == ""
+    assert json.loads((tmp_path / "run.jsonl.prev").read_text())["stage"] == "written"
+
+
+class Dealer:
+    """Stands in for a scraper module; counts the work process_listing asks of it."""
+
+    def __init__(self):
+        self.calls = {"fetch": 0, "extract": 0, "diagram": 0}
+
+    def get_vehicle_page_html(self, url):
+        self.calls["fetch"] += 1
+        return "2019 Volvo VNL, stock S1"
+
+    def extract_vehicle_info(self, text):
+        self.calls["extract"] += 1
+        return {"Engine Model": "D13", "Stock Number": "S1"}
+
+    def make_extracted_info_compliant(self, extracted):
+        return dict(extracted)
+
+    def complete_diagram_info(self, listing, compliant):
+        self.calls["diagram"] += 1
+        return {"R1 Tire Size": "295/75R22.5"}
+
+
+@pytest.fixture
+def dealer(monkeypatch):
+    monkeypatch.setitem(registry.SCRAPERS, "test", {"module": "tests", "listings": "get_listings", "run": "run",
+                                                    "fetch": "http", "images": False})
+    monkeypatch.setattr(cpu, "run", lambda fn, *args: fn(*args))
+    return Dealer()
+
+
+def test_resumed_listing_is_not_fetched_paid_for_or_written_twice(tmp_path, dealer):
+    path = str(tmp_path / "run.jsonl")
+    written = []
+    sink = lambda vehicle, diagram: written.append((vehicle, diagram))
+
+    journal = RunJournal(path)
+    rows = stages.process_listing("test", dealer, URL, str(tmp_path / "images"), journal=journal, sink=sink)
+    journal.close()
+    assert rows[0]["Engine Model"] == "D13" and rows[1]["R1 Tire Size"] == "295/75R22.5"
+    assert rows[1]["Listing"] == URL
+    assert dealer.calls == {"fetch": 1, "extract": 1, "diagram": 1}
+
+    resumed = RunJournal(path, resume=True)
+    assert stages.process_listing("test", dealer, URL, str(tmp_path / "images"), journal=resumed, sink=sink) == rows
+    resumed.close()
+    assert dealer.calls == {"fetch": 1, "extract": 1, "diagram": 1}
+    assert len(written) == 1
+
+
+def test_resume_after_fetch_reuses_page_text(tmp_path, dealer):
+    path = str(tmp_path / "run.jsonl")
+    journal = RunJournal(path)
+    journal.record(URL, "fetched", "2019 Volvo VNL, stock S1")
+    journal.close()
+
+    resumed = RunJournal(path, resume=True)
+    stages.process_listing("test", dealer, URL, str(tmp_path / "images"), journal=resumed)
+    resumed.close()
+    assert dealer.calls == {"fetch": 0, "extract": 1, "diagram": 1}
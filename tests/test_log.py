@@ -0,0 +1,79 @@
+# tests/test_log.py
+import io
+import json
+import logging
+import os
+import re
+import time
+
+from core.log import JsonFormatter, RateLimitFilter, StructLogger
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# log.info(f"...") puts data into the message: it must be a fixed string, data goes in fields
+FORMATTED_MESSAGE = re.compile(r"\blog\.(debug|info|warning|error|exception)\(\s*f[\"']")
+
+
+def test_log_messages_are_fixed_strings():
+    offenders = []
+    for package in ("core", "pipeline", "scrapers", "bench"):
+        for root, _, files in os.walk(os.path.join(ROOT, package)):
+            for name in files:
+                if not name.endswith(".py"):
+                    continue
+                path = os.path.join(root, name)
+                with open(path, encoding="utf-8") as f:
+                    for n, line in enumerate(f, 1):
+                        if FORMATTED_MESSAGE.search(line) and not line.lstrip().startswith("#"):
+                            offenders.append(f"{os.path.relpath(path, ROOT)}:{n}")
+    assert offenders == []
+
+
+def make_record(msg, level=logging.INFO, **fields):
+    record = logging.LogRecord("test", level, __file__, 1, msg, None, None)
+    record.fields = fields
+    return record
+
+
+def test_rate_limit_counts_what_it_dropped(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    limiter = RateLimitFilter(limit=2, window=10)
+    assert [limiter.filter(make_record("tick")) for _ in range(5)] == [True, True, False, False, False]
+    assert limiter.filter(make_record("other message"))
+    assert limiter.filter(make_record("tick", logging.WARNING))   # warnings are never dropped
+
+    clock[0] += 10
+    record = make_record("tick", n=1)
+    assert limiter.filter(record)
+    assert record.fields == {"n": 1, "suppressed": 3}
+
+
+def test_no_limit_passes_everything():
+    limiter = RateLimitFilter(limit=0, window=10)
+    assert all(limiter.filter(make_record("tick")) for _ in range(100))
+
+
+def test_lazy_fields_are_only_built_when_logged():
+    built = []
+    log = StructLogger(logging.getLogger("test.lazy"))
+    logging.getLogger("test.lazy").setLevel(logging.INFO)
+    log.debug("gpt request", messages=lambda: built.append(1))
+    assert built == []
+
+
+def test_json_lines_carry_fields_and_truncate():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter(max_len=10))
+    logger = logging.getLogger("test.json")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        StructLogger(logger).warning("fetched listing", url="https://dealer.example/unit/1",
+                                     bytes=512, rows=lambda: [1, 2])
+    finally:
+        logger.removeHandler(handler)
+    out = json.loads(stream.getvalue())
+    assert out["msg"] == "fetched listing" and out["level"] == "WARNING" and out["logger"] == "test.json"
+    assert out["url"] == "https://de...(+19 chars)"
+    assert out["bytes"] == 512 and out["rows"] == "[1, 2]"
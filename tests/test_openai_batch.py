@@ -0,0 +1,122 @@
+# tests/test_openai_batch.py
+import pytest
+
+from bench.fake_openai import FakeOpenAI
+from bench.replay_server import start_server
+from core import openai_batch, openai_utils
+from core.openai_batch import BatchJob
+from pipeline.journal import RunJournal
+
+LISTINGS = ["https://dealer.example/unit/1", "https://dealer.example/unit/2"]
+
+
+def body(listing):
+    return {"model": "gpt-3.5-turbo", "max_tokens": 100,
+            "messages": [{"role": "system", "content": "Extract the vehicle."},
+                         {"role": "user", "content": f"Listing {listing}: 2019 Volvo VNL"}]}
+
+
+def collected(journal=None):
+    job = BatchJob("test-vehicle", journal=journal)
+    for listing in LISTINGS:
+        job.add(listing, "vehicle", body(listing))
+    return job
+
+
+def answer(job, listing):
+    b = body(listing)
+    return job.answer(listing, b["model"], b["messages"], b["max_tokens"])
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """The bench replay server as the default LLM backend, with no pause between polls."""
+    server, base = start_server({}, llm=FakeOpenAI(latency_ms=0, jitter_ms=0))
+    monkeypatch.setenv("OPENAI_API_BASE", f"{base}/v1")
+    monkeypatch.setattr(openai_utils, "_backends", {})
+    monkeypatch.setattr(openai_batch, "POLL_S", 0)
+    yield server
+    server.shutdown()
+
+
+def test_answers_are_merged_per_listing(api):
+    job = collected()
+    job.run()
+    assert len(api.batches) == 1
+    for listing in LISTINGS:
+        assert answer(job, listing)["choices"][0]["message"]["content"]
+        assert not job.deferred(listing)
+    # a different question from the same listing is not answered from the batch
+    assert job.answer(LISTINGS[0], "gpt-3.5-turbo", body(LISTINGS[0])["messages"], 200) is None
+
+
+def test_failed_and_unknown_lines_are_not_answers():
+    job = collected()
+    ok = {"status_code": 200, "body": {"id": "chatcmpl-1"}}
+    job._merge([
+        {"custom_id": f"{LISTINGS[0]}|vehicle|0", "response": ok},
+        {"custom_id": f"{LISTINGS[1]}|vehicle|0", "response": {"status_code": 500, "body": {}}},
+        {"custom_id": "https://other.example|vehicle|0", "response": ok},
+        {"custom_id": f"{LISTINGS[1]}|vehicle|0", "error": {"code": "server_error"}},
+    ])
+    assert answer(job, LISTINGS[0]) == {"id": "chatcmpl-1"}
+    assert answer(job, LISTINGS[1]) is None
+    assert job.failed == 3
+
+
+def test_poll_error_is_retried_without_resubmitting(api, monkeypatch):
+    job = collected()
+    status = job._status
+    calls = []
+
+    def flaky(batch_id):
+        calls.append(batch_id)
+        if len(calls) == 1:
+            raise openai_batch.requests.ConnectionError("reset by peer")
+        return status(batch_id)
+
+    monkeypatch.setattr(job, "_status", flaky)
+    job.run()
+    assert len(api.batches) == 1
+    assert len(calls) > 2
+    assert all(answer(job, listing) for listing in LISTINGS)
+
+
+def test_unfinished_batch_defers_its_listings(api, monkeypatch):
+    monkeypatch.setattr(openai_batch, "TIMEOUT_S", 0)
+    job = collected()
+    job.run()
+    assert api.batches["batch_1"]["status"] == "in_progress"
+    for listing in LISTINGS:
+        assert job.deferred(listing)
+        assert answer(job, listing) is None
+
+
+def test_resume_polls_the_journaled_batch(api, monkeypatch, tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    monkeypatch.setattr(openai_batch, "TIMEOUT_S", 0)
+    journal = RunJournal(path)
+    collected(journal).run()
+    journal.close()
+
+    monkeypatch.setattr(openai_batch, "TIMEOUT_S", 60)
+    resumed = RunJournal(path, resume=True)
+    job = collected(resumed)
+    job.add("https://dealer.example/unit/3", "vehicle", body("https://dealer.example/unit/3"))
+    job.run()
+    resumed.close()
+    # the old batch is polled again; only the request it did not carry is submitted
+    assert list(api.batches) == ["batch_1", "batch_2"]
+    assert job.batches["batch_2"] == {"https://dealer.example/unit/3|vehicle|0"}
+    assert all(answer(job, listing) for listing in LISTINGS + ["https://dealer.example/unit/3"])
+
+
+def test_submission_failure_leaves_requests_synchronous(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_BASE", "http://127.0.0.1:9/v1")   # nothing listens there
+    monkeypatch.setattr(openai_utils, "_backends", {})
+    job = collected()
+    job.run()
+    assert job.batches == {}
+    for listing in LISTINGS:
+        assert answer(job, listing) is None
+        assert not job.deferred(listing)   # so the caller asks the API itself
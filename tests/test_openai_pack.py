@@ -0,0 +1,85 @@
+# tests/test_openai_pack.py
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core import concurrency, openai_pack
+
+SYSTEM = {"role": "system", "content": "extract the fields"}
+
+
+def messages(text):
+    return [SYSTEM, {"role": "user", "content": text}]
+
+
+@pytest.fixture
+def packing(monkeypatch):
+    monkeypatch.setenv("LLM_PACK", "3")
+    monkeypatch.setattr(openai_pack, "_disabled", None)
+    monkeypatch.setattr(openai_pack, "_packer", None)
+    monkeypatch.setattr(openai_pack, "WAIT_S", 0.2)
+    monkeypatch.setattr(concurrency, "_budget", concurrency.ResourceBudget({"llm": 4}))
+
+
+def test_split_items_by_id_and_isolates_malformed():
+    raw = json.dumps({"items": [{"id": "2", "Make": "Mack"}, "junk", {"id": "x"}, {"id": 1, "Make": "Volvo"},
+                                {"id": "9", "Make": "far"}]})
+    assert openai_pack.split_items(raw, 3) == [{"Make": "Volvo"}, {"Make": "Mack"}, None]
+
+
+def test_split_items_accepts_a_bare_list_and_rejects_garbage():
+    assert openai_pack.split_items('[{"id": "1", "a": 1}]', 2) == [{"a": 1}, None]
+    assert openai_pack.split_items("not json", 2) == [None, None]
+
+
+def test_packed_messages_number_the_listings():
+    msgs = openai_pack.packed_messages("sys", ["one", "two"])
+    assert msgs[0]["content"].startswith("sys") and openai_pack.PACK_INSTRUCTIONS in msgs[0]["content"]
+    assert msgs[1]["content"] == "### id: 1\none\n\n### id: 2\ntwo"
+
+
+def test_concurrent_calls_share_one_request(packing):
+    sent = []
+
+    def send(task, model, msgs, fields, numeric, max_tokens):
+        sent.append(msgs)
+        n = msgs[1]["content"].count("### id:")
+        # item 2 comes back malformed: only that caller goes alone
+        items = [{"id": str(i), "Make": f"m{i}"} if i != 2 else {"id": "2", "Make": ["bad"]} for i in range(1, n + 1)]
+        items[1] = "oops"
+        return json.dumps({"items": items}), "stop", {"prompt_tokens": 30, "completion_tokens": 9}
+
+    def call(text):
+        return openai_pack.pack(send, "vehicle", "m", messages(text), ["Make"], (), 100)
+
+    with ThreadPoolExecutor(3) as pool:
+        results = list(pool.map(call, ["a", "b", "c"]))
+    assert len(sent) == 1
+    assert sum(r is None for r in results) == 1
+    answers = sorted(json.loads(r[0])["Make"] for r in results if r)
+    assert answers == ["m1", "m3"]
+    assert all(r[1] == {"prompt_tokens": 10, "completion_tokens": 3} for r in results if r)
+
+
+def test_failed_group_sends_everyone_alone(packing):
+    def send(*args):
+        raise RuntimeError("500")
+
+    with ThreadPoolExecutor(3) as pool:
+        results = list(pool.map(lambda t: openai_pack.pack(send, "vehicle", "m", messages(t), ["Make"], (), 100),
+                                ["a", "b", "c"]))
+    assert results == [None, None, None]
+
+
+@pytest.mark.parametrize("setup", ["disabled", "budget_1"])
+def test_no_wait_when_a_group_cannot_fill(packing, monkeypatch, setup):
+    if setup == "disabled":
+        openai_pack.disable("serial")
+    else:
+        monkeypatch.setattr(concurrency, "_budget", concurrency.ResourceBudget({"llm": 1}))
+    monkeypatch.setattr(openai_pack, "WAIT_S", 5)
+    started = time.monotonic()
+    assert openai_pack.pack(lambda *a: None, "vehicle", "m", messages("a"), ["Make"], (), 100) is None
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,98 @@
+# tests/test_openai_utils.py
+import json
+
+import openai
+import pytest
+
+from core import openai_utils
+
+FIELDS = ["Make", "Model", "Year"]
+MESSAGES = [{"role": "user", "content": "page text"}]
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Backend "stub" answering with answers[model]; records the models asked."""
+    backend = openai_utils.get_backend("stub")
+    asked, answers = [], {}
+
+    def handler(body):
+        asked.append(body["model"])
+        return answers[body["model"]]
+
+    monkeypatch.setattr(backend, "handler", handler)
+    monkeypatch.setattr(openai_utils, "_escalations", 0)
+    monkeypatch.delenv("LLM_ROUTE", raising=False)
+    monkeypatch.delenv("LLM_ROUTE_VEHICLE", raising=False)
+    return asked, answers
+
+
+def test_default_route_has_no_escalation(monkeypatch):
+    monkeypatch.delenv("LLM_ROUTE", raising=False)
+    monkeypatch.delenv("LLM_ROUTE_VEHICLE", raising=False)
+    assert openai_utils.route("vehicle") == ["gpt-3.5-turbo"]
+
+
+def test_bad_answer_escalates_when_opted_in(stub, monkeypatch):
+    asked, answers = stub
+    answers.update({"cheap": "not json", "strong": json.dumps({"Make": "Volvo", "Model": "VNL", "Year": "2020"})})
+    monkeypatch.setenv("LLM_ROUTE", "cheap@stub,strong@stub")
+    assert openai_utils.complete_json(MESSAGES, FIELDS)["Make"] == "Volvo"
+    assert asked == ["cheap", "strong"]
+
+
+def test_escalations_are_capped_per_process(stub, monkeypatch):
+    asked, answers = stub
+    answers.update({"cheap": "not json", "strong": json.dumps({"Make": "Volvo", "Model": "VNL", "Year": "2020"})})
+    monkeypatch.setenv("LLM_ROUTE", "cheap@stub,strong@stub")
+    monkeypatch.setattr(openai_utils, "ESCALATE_MAX", 1)
+    assert openai_utils.complete_json(MESSAGES, FIELDS) is not None
+    del asked[:]
+    # allowance spent: the second request stays on the cheap model and gives up
+    assert openai_utils.complete_json(MESSAGES, FIELDS) is None
+    assert asked == ["cheap", "cheap"]
+
+
+def test_doubtful_answer_is_not_reasked_once_the_cap_is_spent(stub, monkeypatch):
+    asked, answers = stub
+    answers["cheap"] = json.dumps({"Make": "", "Model": "", "Year": ""})
+    monkeypatch.setenv("LLM_ROUTE", "cheap@stub,strong@stub")
+    monkeypatch.setattr(openai_utils, "ESCALATE_MAX", 1)
+    monkeypatch.setattr(openai_utils, "_escalations", 1)
+    assert openai_utils.complete_json(MESSAGES, FIELDS) == {"Make": "", "Model": "", "Year": ""}
+    assert asked == ["cheap"]
+
+
+def test_response_format_rejection_is_per_model(monkeypatch):
+    backend = openai_utils.Backend("rejecting")
+    sent = []
+
+    def create(body):
+        sent.append(body)
+        if body["model"] == "old-model" and "response_format" in body:
+            raise openai.error.InvalidRequestError("response_format is not supported", "response_format")
+        return {"ok": True}
+
+    monkeypatch.setattr(backend, "create", create)
+    monkeypatch.setitem(openai_utils._backends, "rejecting", backend)
+
+    body = openai_utils._request("old-model@rejecting", MESSAGES, FIELDS, (), 100)
+    assert openai_utils._create(backend, body) == {"ok": True}
+    assert "response_format" not in sent[-1]
+    assert backend.format_rejected == {"old-model"}
+    assert "response_format" not in openai_utils._request("old-model@rejecting", MESSAGES, FIELDS, (), 100)
+    assert openai_utils._request("new-model@rejecting", MESSAGES, FIELDS, (), 100)["response_format"] == \
+        {"type": "json_object"}
+
+
+def test_validate_cleans_and_reports():
+    obj = {"Make": None, "Model": ["a", "b"], "Year": "n/a"}
+    problems = openai_utils.validate(obj, FIELDS + ["Mileage"], numeric=("Year",))
+    assert obj["Make"] == "" and obj["Year"] == ""
+    assert set(problems) == {"Model", "Mileage"}
+
+
+def test_parse_json_object_tolerates_fences_and_chatter():
+    assert openai_utils.parse_json_object('```json\n{"a": 1}\n```') == {"a": 1}
+    assert openai_utils.parse_json_object('Sure! {"a": 1} hope that helps') == {"a": 1}
+    assert openai_utils.parse_json_object("[1, 2]") is None
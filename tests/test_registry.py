@@ -0,0 +1,43 @@
+# tests/test_registry.py
+import os
+import subprocess
+import sys
+
+import pytest
+
+from scrapers import registry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("scrapers.", "selenium", "seleniumwire", "openai", "pandas", "PIL", "cairosvg")
+
+
+def imported_by(*args):
+    """Modules from HEAVY that `run_scraper <args>` imported, run in a fresh interpreter."""
+    code = ("import runpy, sys\n"
+            f"sys.argv = ['run_scraper', *{list(args)!r}]\n"
+            "runpy.run_module('pipeline.run_scraper', run_name='__main__')\n"
+            f"print(sorted(m for m in sys.modules if m.startswith({HEAVY!r}) and m != 'scrapers.registry'))\n")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1]
+
+
+@pytest.mark.parametrize("args", [["--list"], ["--source", "fyda", "--dry-run"]])
+def test_list_and_dry_run_import_no_scraper(args):
+    assert imported_by(*args) == "[]"
+
+
+def test_unknown_dealer_names_the_choices():
+    with pytest.raises(KeyError, match="jasper"):
+        registry.get_spec("nope")
+
+
+@pytest.mark.parametrize("name", registry.names())
+def test_spec_points_at_real_functions(name):
+    spec = registry.get_spec(name)
+    assert registry.is_available(name)
+    assert spec["fetch"] in ("http", "browser")
+    module = registry.load(name)
+    for hook in ("listings", "run", "prefetch", "prefetch_wait", "summaries", "stream"):
+        if hook in spec:
+            assert callable(getattr(module, spec[hook])), f"{name}: {hook}={spec[hook]}"
+    assert registry.get_run_func(name) is getattr(module, spec["run"])
@@ -0,0 +1,147 @@
+# tests/test_s3_upload.py
+import io
+import os
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from pipeline import s3_upload
+from pipeline.s3_upload import S3Uploader, MB
+
+BUCKET = "colton-test"
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def uploader(client, **kwargs):
+    return S3Uploader(BUCKET, chunk_size=5 * MB, max_concurrency=2, client=client, **kwargs)
+
+
+def body(client, key):
+    return client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+def test_small_file_put_with_checksum(s3, tmp_path):
+    path = tmp_path / "rows.csv"
+    path.write_bytes(b"a,b\n1,2\n")
+    checksum = uploader(s3).upload_file(str(path), "x/rows.csv")
+    assert checksum == s3_upload._sha256(b"a,b\n1,2\n")
+    assert body(s3, "x/rows.csv") == b"a,b\n1,2\n"
+
+
+def test_multipart_file_and_composite_checksum(s3, tmp_path):
+    data = os.urandom(11 * MB)
+    path = tmp_path / "big.zip"
+    path.write_bytes(data)
+    checksum = uploader(s3).upload_file(str(path), "big.zip")
+    parts = [data[i:i + 5 * MB] for i in range(0, len(data), 5 * MB)]
+    assert checksum == s3_upload._composite_sha256([s3_upload._sha256(p) for p in parts])
+    assert checksum.endswith("-3")
+    assert body(s3, "big.zip") == data
+
+
+def test_checksum_mismatch_is_reported(s3, monkeypatch):
+    up = uploader(s3)
+    real_put = s3.put_object
+    monkeypatch.setattr(s3, "put_object", lambda **kw: dict(real_put(**kw), ChecksumSHA256="bogus"))
+    with pytest.raises(RuntimeError, match="Checksum mismatch"):
+        up._put("k", b"data")
+
+
+def test_kms_style_etag_is_not_a_mismatch(s3, monkeypatch):
+    # under SSE-KMS the ETag is not the MD5 of the body; that must not fail the upload
+    up = uploader(s3)
+    real_put = s3.put_object
+    monkeypatch.setattr(s3, "put_object", lambda **kw: dict(real_put(**kw), ETag='"not-an-md5"'))
+    assert up._put("k", b"data") == s3_upload._sha256(b"data")
+
+
+def test_resume_sends_only_missing_parts(s3, tmp_path, monkeypatch):
+    data = os.urandom(11 * MB)
+    path = tmp_path / "big.zip"
+    path.write_bytes(data)
+    up = uploader(s3)
+
+    # a first run that dies after part 1
+    upload_id, done = up._open_upload("big.zip")
+    up._send_part("big.zip", upload_id, 1, data[:5 * MB], done)
+
+    sent = []
+    real = s3.upload_part
+    monkeypatch.setattr(s3, "upload_part", lambda **kw: sent.append(kw["PartNumber"]) or real(**kw))
+    up.upload_file(str(path), "big.zip")
+    assert sorted(sent) == [2, 3]
+    assert body(s3, "big.zip") == data
+    assert not s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+
+def test_stream_multipart(s3):
+    data = os.urandom(12 * MB)
+    uploader(s3).upload_stream(io.BytesIO(data), "stream.zip")
+    assert body(s3, "stream.zip") == data
+
+
+@pytest.mark.parametrize("size", [1000, 12 * MB])
+def test_stream_failure_keeps_previous_object(s3, size):
+    s3.put_object(Bucket=BUCKET, Key="stream.zip", Body=b"good")
+
+    def check():
+        raise OSError("producer failed")
+
+    with pytest.raises(OSError):
+        uploader(s3).upload_stream(io.BytesIO(os.urandom(size)), "stream.zip", check=check)
+    assert body(s3, "stream.zip") == b"good"
+    assert not s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+
+def test_sync_folder_skips_unchanged_and_resends_edited(s3, tmp_path):
+    folder = tmp_path / "results"
+    folder.mkdir()
+    (folder / "a.csv").write_text("1,2\n")
+    (folder / "b.jpg").write_bytes(b"jpeg")
+    # files older than the upload
+    old = time.time() - 3600
+    for f in folder.iterdir():
+        os.utime(f, (old, old))
+    up = uploader(s3)
+    assert up.sync_folder(str(folder), "exports/x") == 2
+    assert up.wait() == {}
+    up.close()
+
+    fresh = uploader(s3)
+    assert fresh.sync_folder(str(folder), "exports/x", skip_existing=True) == 0
+
+    # same length, new content, newer than the uploaded object
+    (folder / "a.csv").write_text("3,4\n")
+    later = time.time() + 60
+    os.utime(folder / "a.csv", (later, later))
+    fresh = uploader(s3)
+    assert fresh.sync_folder(str(folder), "exports/x", skip_existing=True) == 1
+    assert fresh.wait() == {}
+    fresh.close()
+    assert body(s3, "exports/x/a.csv") == b"3,4\n"
+
+
+def test_failed_upload_is_reported_and_queued_again(s3, tmp_path, monkeypatch):
+    folder = tmp_path / "results"
+    folder.mkdir()
+    (folder / "a.jpg").write_bytes(b"jpeg")
+    up = uploader(s3)
+    real = up.upload_file
+    monkeypatch.setattr(up, "upload_file", lambda *a: (_ for _ in ()).throw(OSError("boom")))
+    up.sync_folder(str(folder), "exports/x")
+    assert list(up.wait()) == ["exports/x/a.jpg"]
+    monkeypatch.setattr(up, "upload_file", real)
+    assert up.sync_folder(str(folder), "exports/x") == 1
+    assert up.wait() == {}
+    manifest = up.write_manifest("exports/x")
+    assert [o["key"] for o in manifest["objects"]] == ["exports/x/a.jpg"]
+    up.close()
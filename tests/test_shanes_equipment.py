@@ -0,0 +1,112 @@
+# tests/test_shanes_equipment.py
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from scrapers import shanes_equipment as shanes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def taskdef_environment():
+    with open(os.path.join(ROOT, "taskdef.json"), encoding="utf-8") as f:
+        container = json.load(f)["containerDefinitions"][0]
+    return {e["name"]: e["value"] for e in container["environment"]}
+
+
+def test_unlocker_token_comes_from_the_task_definition():
+    env = {k: v for k, v in os.environ.items() if not k.startswith("BRIGHTDATA_")}
+    env.update((k, v) for k, v in taskdef_environment().items() if k.startswith("BRIGHTDATA_"))
+    code = "from scrapers import shanes_equipment as s; print(s.UNLOCKER_API_KEY)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    token = out.stdout.strip().splitlines()[-1]
+    assert token and token == taskdef_environment()["BRIGHTDATA_API_KEY"]
+
+
+class Response:
+
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.headers = {"content-type": "application/json"} if body is not None else {}
+        self._body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise shanes.requests.HTTPError(f"{self.status_code}")
+
+DATASET = [
+    {"listing_url": "/listing/for-sale/1/2019-volvo-vnl", "stock_number": " S1 ", "price": "$89,500"},
+    {"url": "https://www.shanesequipment.com/listing/for-sale/2", "stock": "S2", "retail_price": 75000,
+     "title": "2020 Kenworth T680", "odometer": "410,000"},
+    {"title": "no link"},
+    "not a record",
+]
+
+
+@pytest.fixture
+def collector(monkeypatch):
+    """A collector job that is pending on the first poll, then returns DATASET."""
+    calls = {"trigger": 0, "poll": 0, "search_page": 0}
+
+    def post(url, **kwargs):
+        calls["trigger"] += 1
+        return Response(200, {"collection_id": "j_1"})
+
+    def get(url, **kwargs):
+        calls["poll"] += 1
+        return Response(202) if calls["poll"] == 1 else Response(200, DATASET)
+
+    def search_page():
+        calls["search_page"] += 1
+        return ["https://www.shanesequipment.com/listing/for-sale/9"]
+
+    monkeypatch.setattr(shanes.requests, "post", post)
+    monkeypatch.setattr(shanes.fetch, "get", get)
+    monkeypatch.setattr(shanes, "get_target_listings", search_page)
+    monkeypatch.setattr(shanes, "COLLECTOR_POLL_S", 0)
+    monkeypatch.setattr(shanes, "DISCOVERY_MODE", "collector")
+    monkeypatch.setattr(shanes, "_summaries", {})
+    return calls
+
+
+def test_collector_listings_and_summaries(collector):
+    assert shanes.get_listings() == ["https://www.shanesequipment.com/listing/for-sale/1/2019-volvo-vnl",
+                                     "https://www.shanesequipment.com/listing/for-sale/2"]
+    assert collector == {"trigger": 1, "poll": 2, "search_page": 0}
+    summaries = shanes.listing_summaries()
+    assert summaries["https://www.shanesequipment.com/listing/for-sale/1/2019-volvo-vnl"] == {
+        "url": "https://www.shanesequipment.com/listing/for-sale/1/2019-volvo-vnl", "stock": "S1",
+        "price": "$89,500", "title": "", "mileage": ""}
+    assert summaries["https://www.shanesequipment.com/listing/for-sale/2"]["price"] == "75000"
+    assert summaries["https://www.shanesequipment.com/listing/for-sale/2"]["mileage"] == "410,000"
+
+
+def test_failed_trigger_is_not_retried_and_falls_back(collector, monkeypatch):
+    def post(url, **kwargs):
+        collector["trigger"] += 1
+        return Response(502, {"error": "bad gateway"})
+
+    monkeypatch.setattr(shanes.requests, "post", post)
+    assert shanes.get_listings() == ["https://www.shanesequipment.com/listing/for-sale/9"]
+    assert collector == {"trigger": 1, "poll": 0, "search_page": 1}
+    assert shanes.listing_summaries() == {}
+
+
+def test_unfinished_job_times_out_and_falls_back(collector, monkeypatch):
+    monkeypatch.setattr(shanes.fetch, "get", lambda url, **kwargs: Response(202))
+    monkeypatch.setattr(shanes, "COLLECTOR_TIMEOUT_S", 0.05)
+    assert shanes.get_listings() == ["https://www.shanesequipment.com/listing/for-sale/9"]
+    assert collector["trigger"] == 1
+
+
+def test_search_page_mode_skips_the_collector(collector, monkeypatch):
+    monkeypatch.setattr(shanes, "DISCOVERY_MODE", "page")
+    assert shanes.get_listings() == ["https://www.shanesequipment.com/listing/for-sale/9"]
+    assert collector["trigger"] == 0
@@ -0,0 +1,74 @@
+# tests/test_zip_only.py
+import io
+import os
+import zipfile
+
+import pytest
+
+from pipeline import zip_only
+
+
+@pytest.mark.parametrize("name,expected", [
+    ("a/photo.JPG", zipfile.ZIP_STORED),
+    ("a/photo.webp", zipfile.ZIP_STORED),
+    ("old.zip", zipfile.ZIP_STORED),
+    ("vehicleinfo.csv", zipfile.ZIP_DEFLATED),
+    ("debug.html", zipfile.ZIP_DEFLATED),
+    ("noext", zipfile.ZIP_DEFLATED),
+])
+def test_compression_for(name, expected):
+    assert zip_only.compression_for(name) == expected
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    results = tmp_path / "results"
+    (results / "images" / "S1").mkdir(parents=True)
+    (results / "images" / "S1" / "1.jpg").write_bytes(os.urandom(5000))
+    (results / "vehicleinfo.csv").write_text("Make,Model\n" + "Volvo,VNL\n" * 50000)  # above the read-ahead size
+    (results / "small.csv").write_text("a\n")
+    myresults = tmp_path / "myresults"
+    myresults.mkdir()
+    (myresults / "out.csv").write_text("x,y\n")
+    monkeypatch.setattr(zip_only, "READ_AHEAD_MIN_BYTES", 1024)
+    return [(str(results), "results"), (str(myresults), "myresults")]
+
+
+def read_back(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        return {info.filename: (info.compress_type, zf.read(info)) for info in zf.infolist()}
+
+
+class Pipe(io.RawIOBase):
+    """A write-only, non-seekable stream, like the pipe run_all streams into S3."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_write_results_zip_to_a_pipe(folders, tmp_path, workers):
+    pipe = Pipe()
+    count = zip_only.write_results_zip(pipe, folders, workers=workers)
+    members = read_back(bytes(pipe.data))
+    assert count == len(members) == 4
+    # archive order is the sorted walk order, whatever finished reading first
+    assert list(members) == ["results/small.csv", "results/vehicleinfo.csv", "results/images/S1/1.jpg",
+                             "myresults/out.csv"]
+    assert members["results/images/S1/1.jpg"][0] == zipfile.ZIP_STORED
+    assert members["results/vehicleinfo.csv"][0] == zipfile.ZIP_DEFLATED
+    assert members["results/vehicleinfo.csv"][1] == (tmp_path / "results" / "vehicleinfo.csv").read_bytes()
+
+
+def test_write_results_zip_to_a_path(folders, tmp_path):
+    out = tmp_path / "out.zip"
+    zip_only.write_results_zip(str(out), folders)
+    assert read_back(out.read_bytes())["myresults/out.csv"][1] == b"x,y\n"